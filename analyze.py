@@ -1,3 +1,7 @@
+import heapq
+import numpy as np
+import pandas as pd
+
 def score_stock(info):
     """
     Scores a stock based on QGARP criteria.
@@ -104,27 +108,415 @@ def score_stock(info):
         }
     }
 
-def rank_stocks(stocks_data):
+# --- Columnar scoring engine ---------------------------------------------
+# Same QGARP criteria as score_stock, evaluated as vector operations over a
+# whole universe at once. Defaults mirror the info.get() defaults above.
+
+NUMERIC_FIELDS = {
+    'roe':        ('returnOnEquity', 0),
+    'margin':     ('profitMargins', 0),
+    'rev_growth': ('revenueGrowth', 0),
+    'de':         ('debtToEquity', 1000),
+    'peg_ratio':  ('pegRatio', None),
+    'pe':         ('trailingPE', None),
+    'eps_growth': ('earningsGrowth', None),
+    'fcf':        ('freeCashflow', None),
+    'market_cap': ('marketCap', None),
+    'price':      ('currentPrice', None),
+    'high52':     ('fiftyTwoWeekHigh', None),
+    'low52':      ('fiftyTwoWeekLow', None),
+    'dividend_yield': ('dividendYield', None),
+}
+
+TEXT_FIELDS = {
+    'industry': 'industry',
+    'sector':   'sector',
+}
+
+CRITERIA = ['pass_roe', 'pass_margin', 'pass_growth', 'pass_de', 'pass_peg', 'pass_fcf', 'pass_w52']
+
+# QGARP thresholds: criterion column -> (metric, comparison, threshold).
+# '>' passes above the threshold, '<' below it (PEG must also be positive).
+THRESHOLDS = {
+    'pass_roe':    ('roe', '>', 0.15),
+    'pass_margin': ('margin', '>', 0.10),
+    'pass_growth': ('rev_growth', '>', 0.05),
+    'pass_de':     ('de', '<', 50),
+    'pass_peg':    ('peg', '<', 2.0),
+    'pass_fcf':    ('fcf_yield', '>', 0.03),
+    'pass_w52':    ('w52_position', '<', 0.70),
+}
+
+def passes(values, op, threshold):
+    """Criterion test on an array of metric values (NaN never passes)."""
+    return values > threshold if op == '>' else values < threshold
+
+# Scoring inputs that only move with company reports vs. with the share price
+FUNDAMENTAL_COLUMNS = ['roe', 'margin', 'rev_growth', 'de', 'eps_growth', 'fcf', 'industry', 'sector']
+PRICE_COLUMNS = ['price', 'high52', 'low52', 'market_cap', 'pe', 'peg_ratio', 'dividend_yield']
+
+def input_hashes(frame, columns=None):
+    """
+    64-bit hash of each row's scoring inputs (all inputs by default).
+    Numbers are hashed at the precision snapshots store them (float32 for
+    PRICE_COLUMNS, float64 otherwise), so a fresh frame and a reloaded
+    snapshot hash alike.
+    """
+    columns = columns or FUNDAMENTAL_COLUMNS + PRICE_COLUMNS
+    data = {}
+    for column in columns:
+        values = frame[column]
+        if column in TEXT_FIELDS:
+            data[column] = values.astype(object)
+        else:
+            data[column] = values.astype(np.float32 if column in PRICE_COLUMNS else np.float64)
+    return pd.util.hash_pandas_object(pd.DataFrame(data), index=False).to_numpy()
+
+def to_float_array(values):
+    """Converts a list of raw info values to float64 (None/garbage -> NaN)."""
+    try:
+        return np.array(values, dtype=float)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+
+def build_frame(stocks_data):
+    """
+    Loads the scoring inputs for a universe into a DataFrame.
+    stocks_data: list of (ticker, info) tuples. Failed fetches (empty info)
+    are dropped, like rank_stocks does.
+    """
+    rows = [(ticker, info) for ticker, info in stocks_data if info]
+    infos = [info for _, info in rows]
+    data = {'ticker': [ticker for ticker, _ in rows]}
+    for column, (key, default) in NUMERIC_FIELDS.items():
+        data[column] = to_float_array([info.get(key, default) for info in infos])
+    for column, key in TEXT_FIELDS.items():
+        data[column] = pd.Series([info.get(key) for info in infos], dtype=object)
+    return pd.DataFrame(data)
+
+def derived_metrics(f):
+    """peg, fcf_yield and w52_position arrays of a build_frame() DataFrame (NaN where undefined)."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # PEG, falling back to trailing PE / earnings growth when missing
+        pe, growth = f['pe'].to_numpy(), f['eps_growth'].to_numpy()
+        fallback = np.where(~np.isnan(pe) & (pe != 0) & (growth > 0), pe / (growth * 100), np.nan)
+        peg_ratio = f['peg_ratio'].to_numpy()
+        peg = np.where(np.isnan(peg_ratio), fallback, peg_ratio)
+
+        fcf, mc = f['fcf'].to_numpy(), f['market_cap'].to_numpy()
+        fcf_valid = ~np.isnan(fcf) & (fcf != 0) & (mc > 0)
+        fcf_yield = np.where(fcf_valid, fcf / mc, np.nan)
+
+        price, high, low = f['price'].to_numpy(), f['high52'].to_numpy(), f['low52'].to_numpy()
+        w52_valid = (~np.isnan(price) & (price != 0) & ~np.isnan(high) & (high != 0) &
+                     ~np.isnan(low) & (low != 0) & ((high - low) > 0))
+        w52_position = np.where(w52_valid, (price - low) / (high - low), np.nan)
+
+    return {'peg': peg, 'fcf_yield': fcf_yield, 'w52_position': w52_position}
+
+def score_frame(frame):
+    """
+    Evaluates the seven QGARP criteria for every row of a build_frame()
+    DataFrame. Adds derived metrics (peg, fcf_yield, w52_position), one
+    boolean column per criterion and the integer 'score'.
+    """
+    f = frame.assign(**derived_metrics(frame))
+    for criterion, (metric, op, threshold) in THRESHOLDS.items():
+        f[criterion] = passes(f[metric].to_numpy(), op, threshold)
+    f['pass_peg'] &= f['peg'].to_numpy() > 0
+    f['score'] = f[CRITERIA].sum(axis=1).astype(int)
+    return f
+
+def rank_order(scored):
+    """
+    Row positions sorted by score (desc), then PEG (asc, missing last).
+    The sort is stable, so ties keep their input order.
+    """
+    peg = scored['peg'].to_numpy()
+    peg_key = np.where(np.isnan(peg), np.inf, peg)
+    return np.lexsort((peg_key, -scored['score'].to_numpy()))
+
+def nan_to_none(value):
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+def row_metrics(row):
+    """The 'metrics' dict of score_stock for one scored row."""
+    return {
+        'roe': nan_to_none(row['roe']),
+        'margin': nan_to_none(row['margin']),
+        'rev_growth': nan_to_none(row['rev_growth']),
+        'de': nan_to_none(row['de']),
+        'peg': nan_to_none(row['peg']),
+        'pe': nan_to_none(row['pe']),
+        'dividend_yield': nan_to_none(row['dividend_yield']),
+        'industry': nan_to_none(row['industry']),
+        'sector': nan_to_none(row['sector']),
+        'w52_position': nan_to_none(row['w52_position']),
+        'fcf_yield': nan_to_none(row['fcf_yield']),
+    }
+
+def fmt_pct(value):
+    return f"{value:.2%}" if value is not None else "N/A"
+
+def format_de(de):
+    """
+    D/E as score_stock prints it: the raw value, except that the missing-key
+    default (stored as 1000.0 in the frame) prints as the int score_stock sees.
+    """
+    if de == NUMERIC_FIELDS['de'][1]:
+        return int(de)
+    return de
+
+def format_details(metrics, percentiles=None, group='sector'):
+    """
+    Builds the seven detail strings of score_stock from a metrics dict.
+    In relative mode, `percentiles` maps each RELATIVE_METRICS column to its
+    percentile within the stock's `group` (0-1, 1 = best) and the labels
+    show that percentile against RELATIVE_CUTOFF instead of the absolute
+    thresholds.
+    """
+    if percentiles is not None:
+        return format_relative_details(metrics, percentiles, group)
+    roe, margin, rev_growth = metrics.get('roe'), metrics.get('margin'), metrics.get('rev_growth')
+    de, peg = metrics.get('de'), metrics.get('peg')
+    fcf_yield, w52_position = metrics.get('fcf_yield'), metrics.get('w52_position')
+    de = format_de(de)
+
+    details = []
+    if roe is not None and roe > 0.15:
+        details.append(f"ROE: {fmt_pct(roe)} (>15%)")
+    else:
+        details.append(f"ROE: {fmt_pct(roe)} (<=15%)")
+
+    if margin is not None and margin > 0.10:
+        details.append(f"Margin: {fmt_pct(margin)} (>10%)")
+    else:
+        details.append(f"Margin: {fmt_pct(margin)} (<=10%)")
+
+    if rev_growth is not None and rev_growth > 0.05:
+        details.append(f"Rev Growth: {fmt_pct(rev_growth)} (>5%)")
+    else:
+        details.append(f"Rev Growth: {fmt_pct(rev_growth)} (<=5%)")
+
+    if de is not None and de < 50:
+        details.append(f"D/E: {de} (<50%)")
+    else:
+        details.append(f"D/E: {de} (>=50%)")
+
+    if peg is not None and 0 < peg < 2.0:
+        details.append(f"PEG: {peg:.2f} (<2.0)")
+    else:
+        val = f"{peg:.2f}" if peg is not None else "N/A"
+        details.append(f"PEG: {val} (>=2.0 or invalid)")
+
+    if fcf_yield is not None and fcf_yield > 0.03:
+        details.append(f"FCF Yield: {fcf_yield:.2%} (>3%)")
+    else:
+        details.append(f"FCF Yield: {fmt_pct(fcf_yield)} (<=3% or N/A)")
+
+    if w52_position is not None and w52_position < 0.70:
+        details.append(f"52W Position: {w52_position:.2%} (<70%)")
+    else:
+        details.append(f"52W Position: {fmt_pct(w52_position)} (>=70% or N/A)")
+
+    return details
+
+def format_relative_details(metrics, percentiles, group):
+    """format_details() in relative mode, e.g. 'ROE: 8.10% (pct 84 in sector, >=60)'."""
+    cutoff = round(RELATIVE_CUTOFF * 100)
+    details = []
+    for label, metric in (('ROE', 'roe'), ('Margin', 'margin'), ('Rev Growth', 'rev_growth'), ('D/E', 'de'),
+                          ('PEG', 'peg'), ('FCF Yield', 'fcf_yield'), ('52W Position', 'w52_position')):
+        value = metrics.get(metric)
+        if metric == 'de':
+            value = "N/A" if value is None else format_de(value)
+        elif metric == 'peg':
+            value = f"{value:.2f}" if value is not None else "N/A"
+        else:
+            value = fmt_pct(value)
+        pct = percentiles.get(metric)
+        if pct is None or np.isnan(pct):
+            details.append(f"{label}: {value} (N/A in {group})")
+        else:
+            rank = int(pct * 100 + 1e-9)    # floored, so it agrees with the >= cutoff test
+            details.append(f"{label}: {value} (pct {rank} in {group}, {'>=' if pct >= RELATIVE_CUTOFF else '<'}{cutoff})")
+    return details
+
+# --- Sector-relative scoring ------------------------------------------------
+# The absolute thresholds above penalize structurally low-margin or highly
+# levered sectors (banks, staples). In relative mode each metric is ranked
+# against the stock's peers instead: a criterion passes when the stock is in
+# the top (1 - RELATIVE_CUTOFF) of its group.
+
+# metric -> True if higher is better
+RELATIVE_METRICS = {
+    'roe': True,
+    'margin': True,
+    'rev_growth': True,
+    'de': False,
+    'peg': False,
+    'fcf_yield': True,
+    'w52_position': False,
+}
+
+RELATIVE_CRITERIA = dict(zip(RELATIVE_METRICS, CRITERIA))
+RELATIVE_CUTOFF = 0.6
+MIN_GROUP_SIZE = 5   # smaller groups are ranked against the next wider group
+
+def group_keys(scored, by, groups=None):
+    """
+    Peer-group labels per row: the frame's `by` column ('sector' or
+    'industry'), overridden by a ticker -> label mapping when given (e.g.
+    GICS sectors from the index constituents).
+    """
+    keys = scored[by].astype(object)
+    if groups:
+        keys = scored['ticker'].map(groups).astype(object).where(lambda k: k.notna(), keys)
+    return keys.where(keys != '', None)
+
+def relative_metrics(scored, levels=('sector',), groups=None, min_group_size=MIN_GROUP_SIZE):
+    """
+    Percentile (0-1, 1 = best) and z-score (positive = better) of every
+    RELATIVE_METRICS column within its peer group, as <metric>_pct and
+    <metric>_z columns. `levels` lists the grouping columns from narrowest
+    to widest (e.g. ('industry', 'sector')); rows whose group at one level
+    has fewer than min_group_size valid values use the next level, and the
+    whole universe as a last resort. `groups` maps level -> {ticker: label}
+    overrides. Missing (and non-positive PEG) values get NaN.
+    """
+    groups = groups or {}
+    keys = [group_keys(scored, level, groups.get(level)) for level in levels]
+    out = {}
+    for metric, higher_is_better in RELATIVE_METRICS.items():
+        values = scored[metric].astype(float)
+        if metric == 'peg':
+            values = values.where(values > 0)
+        sign = 1.0 if higher_is_better else -1.0
+
+        # Universe-wide fallback, then narrower levels on top where big enough
+        pct = values.rank(pct=True, ascending=higher_is_better)
+        std = values.std()
+        z = sign * (values - values.mean()) / (std if std else np.nan)
+        for key in reversed(keys):
+            grouped = values.groupby(key)
+            large = grouped.transform('count') >= min_group_size
+            group_std = grouped.transform('std')
+            group_z = sign * (values - grouped.transform('mean')) / group_std.where(group_std > 0)
+            pct = grouped.rank(pct=True, ascending=higher_is_better).where(large, pct)
+            z = group_z.where(large, z)
+        out[f"{metric}_pct"] = pct.to_numpy()
+        out[f"{metric}_z"] = z.to_numpy()
+    return pd.DataFrame(out, index=scored.index)
+
+def score_frame_relative(frame, levels=('sector',), groups=None, cutoff=RELATIVE_CUTOFF):
+    """
+    score_frame() in relative mode: criteria pass on within-group percentile
+    >= cutoff instead of absolute thresholds. The absolute score is kept as
+    'absolute_score'; percentile and z-score columns are added.
+    """
+    scored = score_frame(frame)
+    relative = relative_metrics(scored, levels, groups)
+    scored = pd.concat([scored.rename(columns={'score': 'absolute_score'}), relative], axis=1)
+    for metric, criterion in RELATIVE_CRITERIA.items():
+        scored[criterion] = scored[f"{metric}_pct"].to_numpy() >= cutoff
+    scored['score'] = scored[CRITERIA].sum(axis=1).astype(int)
+    return scored
+
+def rank_stocks(stocks_data, top=None, relative_to=None, groups=None):
     """
     Ranks stocks by score (0-7), then by PEG ratio (ascending).
     stocks_data: list of (ticker, info) tuples
+    top: if given, only the best `top` stocks are returned (and only their
+    detail strings are built).
+    relative_to: None for the absolute QGARP thresholds, or 'sector' /
+    'industry' to score each metric against the stock's peers (industry
+    falls back to sector for small industries). groups optionally maps
+    'sector'/'industry' to {ticker: label} overrides.
+    """
+    frame = build_frame(stocks_data)
+    if relative_to is None:
+        scored = score_frame(frame)
+    else:
+        levels = ('industry', 'sector') if relative_to == 'industry' else ('sector',)
+        scored = score_frame_relative(frame, levels, groups)
+    order = rank_order(scored)
+    if top is not None:
+        order = order[:top]
+
+    ranked = []
+    for row in scored.iloc[order].to_dict('records'):
+        metrics = row_metrics(row)
+        percentiles = None
+        if relative_to is not None:
+            percentiles = {metric: row[f"{metric}_pct"] for metric in RELATIVE_METRICS}
+        ranked.append({
+            'ticker': row['ticker'],
+            'score': int(row['score']),
+            'details': format_details(metrics, percentiles, relative_to),
+            'metrics': metrics
+        })
+    return ranked
+
+
+class TopKRanker:
+    """
+    Streaming version of rank_stocks(stocks_data, top=k).
+
+    Info dicts are scored as they arrive (in small vectorized batches) and
+    only the best k are kept, in a bounded heap, as compact metrics; the
+    raw info dicts are not retained. `seq` is the stock's position in the
+    universe and breaks ties the same way the stable sort in rank_stocks
+    does, so the result does not depend on arrival order.
+
+    on_scored(frame), if given, receives every scored batch (a score_frame()
+    DataFrame), e.g. to snapshot the whole universe.
     """
-    scored_stocks = []
-    for ticker, info in stocks_data:
-        result = score_stock(info)
-        if result['score'] >= 0: # Filter out failed fetches
-            scored_stocks.append({
+
+    def __init__(self, k=5, batch_size=64, on_scored=None):
+        self.k = k
+        self.batch_size = batch_size
+        self.on_scored = on_scored
+        self.heap = []      # (score, -peg, -seq) keys; heap[0] is the weakest pick
+        self.pending = []
+        self.count = 0
+
+    def push(self, ticker, info, seq=None):
+        if seq is None:
+            seq = self.count
+        self.count += 1
+        if info:
+            self.pending.append((seq, ticker, info))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        seqs = [seq for seq, _, _ in self.pending]
+        scored = score_frame(build_frame([(t, info) for _, t, info in self.pending]))
+        self.pending = []
+        if self.on_scored:
+            self.on_scored(scored)
+
+        for seq, row in zip(seqs, scored.to_dict('records')):
+            peg_key = np.inf if np.isnan(row['peg']) else row['peg']
+            item = ((int(row['score']), -peg_key, -seq), row['ticker'], row_metrics(row))
+            if len(self.heap) < self.k:
+                heapq.heappush(self.heap, item)
+            elif item[0] > self.heap[0][0]:
+                heapq.heapreplace(self.heap, item)
+
+    def results(self):
+        """The top k as rank_stocks-style dicts, best first."""
+        self.flush()
+        ranked = []
+        for key, ticker, metrics in sorted(self.heap, key=lambda item: item[0], reverse=True):
+            ranked.append({
                 'ticker': ticker,
-                'score': result['score'],
-                'details': result['details'],
-                'metrics': result['metrics']
+                'score': key[0],
+                'details': format_details(metrics),
+                'metrics': metrics
             })
-    
-    # Sort by Score (desc), then PEG (asc)
-    # We handle None PEG by treating it as infinity for sorting
-    scored_stocks.sort(key=lambda x: (
-        -x['score'], 
-        x['metrics']['peg'] if x['metrics']['peg'] is not None else float('inf')
-    ))
-    
-    return scored_stocks
+        return ranked
@@ -0,0 +1,228 @@
+"""
+backtest.py
+Backtest of the daily QGARP picks stored in stocks.db.
+
+Joins the picks history against the local adjusted price store and
+computes, per universe:
+  - forward returns of every pick over several horizons (in trading days),
+    with hit rates (share of picks that rose / beat the benchmark)
+  - turnover of the top-k portfolio between consecutive pick dates
+  - the equity curve of a portfolio that buys the latest picks in equal
+    weights on every pick date and holds them (weights drift with prices)
+    until the next one, against SPY
+
+Positions are entered at the close of the pick date (or the next trading
+day when the picks were made on a holiday). Everything is computed on
+dense NumPy arrays (dates x tickers), so a year of daily rebalances over
+both universes evaluates in milliseconds once the prices are loaded.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import db
+import fetch_data
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, 'stocks.db')
+
+BENCHMARK = 'SPY'
+HORIZONS = (5, 21, 63)   # one week, one month, one quarter
+TRADING_DAYS = 252
+
+
+def load_picks(conn, universe, start=None, end=None):
+    """Picks of a universe as a DataFrame of date (Timestamp), ticker, score."""
+    query = "SELECT date, ticker, score FROM picks WHERE universe = ?"
+    params = [universe]
+    if start:
+        query += " AND date >= ?"
+        params.append(start)
+    if end:
+        query += " AND date <= ?"
+        params.append(end)
+    picks = pd.read_sql_query(query + " ORDER BY date, score DESC", conn, params=params)
+    picks['date'] = pd.to_datetime(picks['date'])
+    return picks
+
+
+def close_matrix(panel, tickers):
+    """
+    (dates, closes) from a price panel: a datetime64 array and a float
+    matrix of closes with one column per ticker (NaN where missing).
+    """
+    closes = np.full((len(panel.index), len(tickers)), np.nan)
+    available = set(panel.columns.get_level_values(0)) if len(panel.columns) else set()
+    for j, ticker in enumerate(tickers):
+        if ticker in available:
+            closes[:, j] = panel[(ticker, 'Close')].to_numpy(dtype=float)
+    return panel.index.to_numpy(dtype='datetime64[ns]'), closes
+
+
+def entry_rows(dates, pick_dates):
+    """Row of the first trading day on or after each pick date (len(dates) if none)."""
+    return np.searchsorted(dates, pick_dates.to_numpy(dtype='datetime64[ns]'), side='left')
+
+
+def forward_returns(closes, rows, cols, horizon):
+    """Close-to-close return from each (row, col) entry over `horizon` trading days."""
+    n = len(closes)
+    exits = rows + horizon
+    valid = exits < n
+    result = np.full(len(rows), np.nan)
+    entry = closes[rows[valid], cols[valid]]
+    result[valid] = closes[exits[valid], cols[valid]] / entry - 1
+    return result
+
+
+def drawdown(equity):
+    """Maximum drawdown of an equity curve (a negative fraction)."""
+    peaks = np.maximum.accumulate(equity)
+    return float(np.min(equity / peaks - 1)) if len(equity) else np.nan
+
+
+def curve_stats(equity):
+    """Total return, CAGR, annualised volatility, Sharpe (rf = 0) and max drawdown."""
+    if len(equity) < 2:
+        return {'total_return': np.nan, 'cagr': np.nan, 'volatility': np.nan,
+                'sharpe': np.nan, 'max_drawdown': np.nan}
+    daily = equity[1:] / equity[:-1] - 1
+    years = (len(equity) - 1) / TRADING_DAYS
+    volatility = float(np.std(daily) * np.sqrt(TRADING_DAYS))
+    return {
+        'total_return': float(equity[-1] / equity[0] - 1),
+        'cagr': float((equity[-1] / equity[0]) ** (1 / years) - 1),
+        'volatility': volatility,
+        'sharpe': float(np.mean(daily) * TRADING_DAYS / volatility) if volatility else np.nan,
+        'max_drawdown': drawdown(equity),
+    }
+
+
+def backtest(picks, panel, benchmark=BENCHMARK, horizons=HORIZONS):
+    """
+    Evaluates a picks history against a price panel (see load_picks and
+    fetch_data.get_histories). Returns a dict with:
+      'picks'     - the picks with fwd_<h> and excess_<h> columns
+      'hit_rates' - per horizon: mean return, mean excess, share > 0, share > benchmark
+      'turnover'  - Series of one-way turnover per rebalance date
+      'equity'    - DataFrame of portfolio and benchmark equity (start = 1.0)
+      'summary'   - curve_stats() for the portfolio and the benchmark
+    """
+    tickers = list(dict.fromkeys(picks['ticker']))
+    dates, closes = close_matrix(panel, tickers + [benchmark])
+    bench = closes[:, -1]
+    closes = closes[:, :-1]
+    column = {t: j for j, t in enumerate(tickers)}
+
+    rows = entry_rows(dates, picks['date'])
+    cols = picks['ticker'].map(column).to_numpy()
+    in_range = rows < len(dates)
+    picks = picks[in_range].copy()
+    rows, cols = rows[in_range], cols[in_range]
+
+    # Forward returns and hit rates
+    hit_rates = {}
+    for h in horizons:
+        fwd = forward_returns(closes, rows, cols, h)
+        bench_fwd = forward_returns(bench[:, None], rows, np.zeros_like(rows), h)
+        picks[f'fwd_{h}'] = fwd
+        picks[f'excess_{h}'] = fwd - bench_fwd
+        valid = ~np.isnan(fwd) & ~np.isnan(bench_fwd)
+        hit_rates[h] = {
+            'picks': int(valid.sum()),
+            'mean_return': float(np.mean(fwd[valid])) if valid.any() else np.nan,
+            'mean_excess': float(np.mean(fwd[valid] - bench_fwd[valid])) if valid.any() else np.nan,
+            'hit_rate': float(np.mean(fwd[valid] > 0)) if valid.any() else np.nan,
+            'beat_rate': float(np.mean(fwd[valid] > bench_fwd[valid])) if valid.any() else np.nan,
+        }
+
+    # Target weights per rebalance row: equal weight over the picks that have
+    # a price at entry. When several pick dates map to the same trading day
+    # (e.g. a weekend run), the latest one wins.
+    rebalance_rows = np.unique(rows)
+    weights = np.zeros((len(rebalance_rows), len(tickers)))
+    latest = pd.Series(picks['date'].to_numpy()).groupby(rows).transform('max').to_numpy()
+    keep = (picks['date'].to_numpy() == latest) & ~np.isnan(closes[rows, cols])
+    slot = np.searchsorted(rebalance_rows, rows[keep])
+    weights[slot, cols[keep]] = 1.0
+    held = weights.sum(axis=1, keepdims=True)
+    weights = np.divide(weights, held, out=np.zeros_like(weights), where=held > 0)
+
+    # Daily returns (missing prices count as a flat day) and each ticker's
+    # cumulative growth since the first date
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily = np.nan_to_num(closes[1:] / closes[:-1] - 1)
+        bench_daily = np.nan_to_num(bench[1:] / bench[:-1] - 1)
+    growth = np.vstack([np.ones((1, len(tickers))), np.cumprod(1 + daily, axis=0)])
+
+    # Buy and hold between rebalances: the weights bought at the close of a
+    # rebalance day drift with each holding's price until the next one
+    previous = np.zeros_like(weights)
+    if len(rebalance_rows) > 1:
+        drift = weights[:-1] * growth[rebalance_rows[1:]] / growth[rebalance_rows[:-1]]
+        total = drift.sum(axis=1, keepdims=True)
+        previous[1:] = np.divide(drift, total, out=np.zeros_like(drift), where=total > 0)
+    turnover = pd.Series(0.5 * np.abs(weights - previous).sum(axis=1),
+                         index=pd.DatetimeIndex(dates[rebalance_rows]), name='turnover')
+
+    # Daily equity: the holdings of day t (weights drifted since their
+    # rebalance) earn the return from t to t + 1
+    start = rebalance_rows[0] if len(rebalance_rows) else len(dates)
+    span = np.arange(start, len(dates))
+    active = np.searchsorted(rebalance_rows, span[:-1], side='right') - 1
+    holdings = weights[active] * growth[span[:-1]] / growth[rebalance_rows[active]]
+    total = holdings.sum(axis=1)
+    portfolio_daily = np.divide(np.einsum('ij,ij->i', holdings, daily[span[:-1]]), total,
+                                out=np.zeros_like(total), where=total > 0)
+    equity = np.concatenate([[1.0], np.cumprod(1 + portfolio_daily)]) if len(span) else np.array([])
+    bench_equity = np.concatenate([[1.0], np.cumprod(1 + bench_daily[span[:-1]])]) if len(span) else np.array([])
+    equity_frame = pd.DataFrame({'portfolio': equity, benchmark: bench_equity},
+                                index=pd.DatetimeIndex(dates[span]))
+
+    return {
+        'picks': picks,
+        'hit_rates': hit_rates,
+        'turnover': turnover,
+        'equity': equity_frame,
+        'summary': {'portfolio': curve_stats(equity), benchmark: curve_stats(bench_equity)},
+    }
+
+
+def run(universe, conn=None, start=None, end=None, period='2y', benchmark=BENCHMARK, horizons=HORIZONS):
+    """
+    Backtests one universe's stored picks. Prices come from the local price
+    store (refreshed through fetch_data.get_histories).
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = db.connect_readonly(DB_PATH)
+    try:
+        picks = load_picks(conn, universe, start, end)
+    finally:
+        if own_conn:
+            conn.close()
+    if picks.empty:
+        print(f"No picks stored for {universe}.")
+        return None
+    panel = fetch_data.get_histories(list(dict.fromkeys(picks['ticker'])) + [benchmark], period=period)
+    return backtest(picks, panel, benchmark, horizons)
+
+
+def print_report(universe, result, benchmark=BENCHMARK):
+    print(f"\n=== {universe} ===")
+    for h, stats in result['hit_rates'].items():
+        print(f"  {h:>3}d fwd: {stats['picks']:>5} picks, mean {stats['mean_return']:+.2%}, "
+              f"excess {stats['mean_excess']:+.2%}, up {stats['hit_rate']:.0%}, beat {benchmark} {stats['beat_rate']:.0%}")
+    print(f"  Mean turnover per rebalance: {result['turnover'].iloc[1:].mean():.0%}")
+    for name, stats in result['summary'].items():
+        print(f"  {name:<10} total {stats['total_return']:+.2%}, CAGR {stats['cagr']:+.2%}, "
+              f"vol {stats['volatility']:.1%}, Sharpe {stats['sharpe']:.2f}, max DD {stats['max_drawdown']:.1%}")
+
+
+if __name__ == "__main__":
+    for universe in ('SP500', 'NON_SP500'):
+        result = run(universe)
+        if result is not None:
+            print_report(universe, result)
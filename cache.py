@@ -0,0 +1,121 @@
+"""
+cache.py
+On-disk cache for yfinance fundamentals (the `Ticker.info` payload).
+
+Entries live in a SQLite file next to stocks.db and expire after a
+configurable TTL, so one daily run makes at most one network request per
+symbol no matter how many reports ask for it. The same file also keeps
+parsed web pages (e.g. index constituents) with their ETag/Last-Modified
+validators.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.environ.get('STOCK_CACHE_PATH', os.path.join(BASE_DIR, 'cache.db'))
+
+# Fundamentals older than this are refetched. The default is a bit under a day
+# so that the next scheduled run always sees fresh data.
+FUNDAMENTALS_TTL = float(os.environ.get('FUNDAMENTALS_TTL_HOURS', 20)) * 3600
+
+_lock = threading.Lock()
+_conn = None
+
+
+def get_connection():
+    """Returns the shared cache connection, creating the schema on first use."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _conn.execute('''CREATE TABLE IF NOT EXISTS fundamentals
+                         (ticker text PRIMARY KEY, fetched_at real, info text)''')
+        # Parsed web pages kept with their HTTP validators for conditional GETs
+        _conn.execute('''CREATE TABLE IF NOT EXISTS documents
+                         (key text PRIMARY KEY, etag text, last_modified text, fetched_at real, payload text)''')
+        _conn.commit()
+    return _conn
+
+
+def get_fundamentals_entry(ticker):
+    """Returns (fetched_at, info dict) for a cached ticker whatever its age, or None."""
+    with _lock:
+        row = get_connection().execute(
+            "SELECT fetched_at, info FROM fundamentals WHERE ticker = ?", (ticker,)).fetchone()
+    if row is None:
+        return None
+    try:
+        return row[0], json.loads(row[1])
+    except ValueError:
+        return None
+
+
+def get_fundamentals(ticker, ttl=None):
+    """
+    Returns the cached info dict for a ticker, or None if it is missing or
+    older than `ttl` seconds (defaults to FUNDAMENTALS_TTL).
+    """
+    ttl = FUNDAMENTALS_TTL if ttl is None else ttl
+    entry = get_fundamentals_entry(ticker)
+    if entry is None or time.time() - entry[0] > ttl:
+        return None
+    return entry[1]
+
+
+def put_fundamentals(ticker, info):
+    """Stores an info dict for a ticker, stamped with the current time."""
+    fetched_at = time.time()
+    payload = json.dumps(info, default=str)
+    with _lock:
+        conn = get_connection()
+        conn.execute("INSERT OR REPLACE INTO fundamentals VALUES (?, ?, ?)",
+                     (ticker, fetched_at, payload))
+        conn.commit()
+
+
+def get_document(key):
+    """
+    Returns a stored document as a dict with 'etag', 'last_modified',
+    'fetched_at' and the decoded 'payload', or None if it is not stored.
+    """
+    with _lock:
+        row = get_connection().execute(
+            "SELECT etag, last_modified, fetched_at, payload FROM documents WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return None
+    try:
+        payload = json.loads(row[3])
+    except ValueError:
+        return None
+    return {'etag': row[0], 'last_modified': row[1], 'fetched_at': row[2], 'payload': payload}
+
+
+def put_document(key, payload, etag=None, last_modified=None):
+    """Stores a JSON-serialisable document together with its HTTP validators."""
+    with _lock:
+        conn = get_connection()
+        conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                     (key, etag, last_modified, time.time(), json.dumps(payload, default=str)))
+        conn.commit()
+
+
+def clear_expired(ttl=None):
+    """Deletes entries older than `ttl` seconds. Returns the number removed."""
+    ttl = FUNDAMENTALS_TTL if ttl is None else ttl
+    cutoff = time.time() - ttl
+    with _lock:
+        conn = get_connection()
+        cur = conn.execute("DELETE FROM fundamentals WHERE fetched_at < ?", (cutoff,))
+        conn.commit()
+    return cur.rowcount
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    count = conn.execute("SELECT COUNT(*) FROM fundamentals").fetchone()[0]
+    fresh = conn.execute("SELECT COUNT(*) FROM fundamentals WHERE fetched_at >= ?",
+                         (time.time() - FUNDAMENTALS_TTL,)).fetchone()[0]
+    print(f"{CACHE_PATH}: {count} tickers cached, {fresh} fresh (TTL {FUNDAMENTALS_TTL/3600:.0f}h)")
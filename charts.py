@@ -0,0 +1,363 @@
+"""
+charts.py
+Chart rendering for the reports.
+
+Charts are drawn with Matplotlib's object-oriented API on the Agg backend:
+every chart is its own Figure, with no pyplot global state, so charts can
+be drawn in worker processes. A chart job is a (kind, path, data) tuple
+naming one of the chart functions below, the PNG to write and the
+function's keyword arguments (plain NumPy arrays and numbers, cheap to
+send to a worker).
+
+Every job is keyed by a hash of its chart function's source, the shared
+drawing code (new_figure, render_job), STYLE_VERSION, the installed
+Matplotlib version and the job's data. A job whose key matches the one recorded when its PNG was last
+written (and whose PNG still exists) is skipped, so the file is left
+untouched and git sees no change. Keys are kept in the cache database.
+
+render(jobs) draws a list of jobs across a process pool. Inside a
+`with batch():` block jobs are queued instead and rendered together when
+the outermost block exits, so the charts of every report in a run share
+one pool.
+
+With CHART_MODE=svg the price line charts (top picks and commodities)
+are not rendered to PNG at all: svg_line() turns the series into a small
+inline SVG that the report embeds and the browser draws. Matplotlib is
+only imported when a PNG is actually drawn.
+
+Price series are cut to at most CHART_MAX_POINTS points (downsample())
+before they go to either renderer: a 5-year daily history has ~1,260
+closes, several per pixel column of a chart.
+
+PNGs are written to the charts/ directory next to the pages, which
+reference them as charts/<name>.png. collect_garbage() deletes the
+charts that no page references any more.
+"""
+
+import hashlib
+import html
+import importlib.metadata
+import inspect
+import json
+import glob
+import os
+import re
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import cache
+import metrics
+
+MAX_WORKERS = int(os.environ.get('CHART_WORKERS', os.cpu_count() or 1))
+MODE = os.environ.get('CHART_MODE', 'png')     # 'png' or 'svg'
+MAX_POINTS = int(os.environ.get('CHART_MAX_POINTS', 400))
+CHART_DIR = 'charts'    # relative to the pages, so also the URL prefix
+# Bump when the look of the charts changes outside the code job_key hashes
+# (e.g. fonts or rc settings on the runner); every chart is then redrawn
+STYLE_VERSION = 1
+
+IMAGE_SRC = re.compile(r'src="([^"]+\.png)"')
+
+_pending = []           # jobs queued by render() inside batch()
+_depth = 0              # nesting depth of batch() blocks
+_style = None           # style part of every job key, see style_key()
+
+
+def downsample(x, y, max_points=None):
+    """
+    Min/max bucketing of a series: splits the points between the first
+    and the last into max_points/2 - 1 equal buckets and keeps the lowest
+    and highest point of each, in order, so peaks and troughs survive.
+    max_points is at least 4 (one bucket). Returns (x, y) as arrays,
+    unchanged when already short enough.
+
+    Only the price line charts go through here. The performance bar chart
+    (one bar per year) and the cash trend (one point per filing, each
+    drawn with a marker) are short by nature and intentionally drawn in
+    full.
+    """
+    max_points = max(max_points or MAX_POINTS, 4)
+    x, y = np.asarray(x), np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return x, y
+
+    buckets = max_points // 2 - 1
+    inner = y[1:-1]
+    size = -(-len(inner) // buckets)
+    lows = np.full(buckets * size, np.inf)
+    highs = np.full(buckets * size, -np.inf)
+    lows[:len(inner)] = np.where(np.isnan(inner), np.inf, inner)
+    highs[:len(inner)] = np.where(np.isnan(inner), -np.inf, inner)
+    offsets = np.arange(buckets) * size
+    picked = np.concatenate([lows.reshape(buckets, size).argmin(axis=1) + offsets,
+                             highs.reshape(buckets, size).argmax(axis=1) + offsets])
+    picked = picked[picked < len(inner)] + 1
+    keep = np.unique(np.concatenate([[0], picked, [n - 1]]))
+    return x[keep], y[keep]
+
+
+def price_series(hist, max_points=None):
+    """(dates, closes) of a price history, downsampled for plotting."""
+    return downsample(hist.index.to_numpy(), hist['Close'].to_numpy(dtype=float), max_points)
+
+
+def chart_file(name):
+    """Path of a chart PNG relative to the pages (its URL in the page)."""
+    return f"{CHART_DIR}/{name}"
+
+
+def new_figure(figsize):
+    """A Matplotlib Figure drawn with the Agg renderer (imported on first use)."""
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize)
+
+
+def price_chart(ticker, dates, closes):
+    """Five-year close price line of a top pick."""
+    fig = new_figure((10, 5))
+    ax = fig.add_subplot()
+    ax.plot(dates, closes, label='Close Price')
+    ax.set_title(f"{ticker} - 5 Year Price History")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Price (USD)")
+    ax.grid(True)
+    ax.legend()
+    return fig
+
+
+def commodity_chart(name, dates, closes):
+    """One-year sparkline of a commodity future."""
+    fig = new_figure((8, 3))
+    ax = fig.add_subplot()
+    ax.plot(dates, closes, color='#e67e22', linewidth=1.5)
+    ax.set_title(f"{name} – 1 Year")
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Price')
+    ax.grid(True, linestyle='--', alpha=0.5)
+    fig.tight_layout()
+    return fig
+
+
+def allocation_chart(equity, cash):
+    """Equity vs. cash pie of a guru portfolio."""
+    fig = new_figure((8, 6))
+    ax = fig.add_subplot()
+    ax.pie([equity, cash], explode=(0.1, 0), labels=['Equity Portfolio', 'Cash & Equivalents'],
+           colors=['#3498db', '#2ecc71'], autopct='%1.1f%%', shadow=True, startangle=140)
+    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+    ax.set_title("Berkshire Hathaway Asset Allocation")
+    return fig
+
+
+def cash_trend_chart(dates, pcts):
+    """Cash share of total assets over time."""
+    fig = new_figure((10, 6))
+    ax = fig.add_subplot()
+    ax.plot(dates, pcts, marker='o', linestyle='-', color='#2ecc71', linewidth=2)
+    ax.set_title("Berkshire Hathaway Cash Allocation Trend")
+    ax.set_ylabel("Cash % of Total Assets")
+    ax.grid(True, linestyle='--', alpha=0.7)
+    fig.autofmt_xdate()
+    return fig
+
+
+def comparison_chart(years, spy, brk, stats_text):
+    """Grouped bars of yearly SPY vs. BRK-B returns with an averages box."""
+    fig = new_figure((14, 7))
+    ax = fig.add_subplot()
+    x = np.arange(len(years))
+    width = 0.35
+    ax.bar(x - width/2, spy, width, label='S&P 500 (SPY)', color='#3498db')
+    ax.bar(x + width/2, brk, width, label='Berkshire (BRK-B)', color='#2ecc71')
+    ax.set_ylabel('Yearly Return (%)')
+    ax.set_title('Yearly Performance: S&P 500 vs. Berkshire Hathaway (Last 20 Years)')
+    ax.set_xticks(x)
+    ax.set_xticklabels(years)
+    ax.legend()
+    ax.grid(axis='y', linestyle='--', alpha=0.7)
+    props = dict(boxstyle='round', facecolor='white', alpha=0.9)
+    ax.text(0.02, 0.95, stats_text, transform=ax.transAxes, fontsize=10,
+            verticalalignment='top', bbox=props, family='monospace')
+    fig.tight_layout()
+    return fig
+
+
+CHARTS = {
+    'price': price_chart,
+    'commodity': commodity_chart,
+    'allocation': allocation_chart,
+    'cash_trend': cash_trend_chart,
+    'comparison': comparison_chart,
+}
+
+
+def style_key():
+    """
+    What every chart's look depends on besides its own function: the
+    shared drawing code, STYLE_VERSION and the Matplotlib version (read
+    from the package metadata, so Matplotlib is not imported).
+    """
+    global _style
+    if _style is None:
+        try:
+            version = importlib.metadata.version('matplotlib')
+        except importlib.metadata.PackageNotFoundError:
+            version = None
+        _style = json.dumps([STYLE_VERSION, version, inspect.getsource(new_figure), inspect.getsource(render_job)])
+    return _style
+
+
+def job_key(job):
+    """Hash of a job's chart function, the shared style (style_key) and its input data."""
+    kind, _, data = job
+    digest = hashlib.sha256(style_key().encode('utf-8'))
+    digest.update(inspect.getsource(CHARTS[kind]).encode('utf-8'))
+    for name in sorted(data):
+        value = data[name]
+        digest.update(name.encode('utf-8'))
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            digest.update(f"{value.dtype}{value.shape}".encode('ascii'))
+            digest.update(np.ascontiguousarray(value).tobytes())
+        else:
+            if isinstance(value, np.ndarray):
+                value = value.tolist()
+            digest.update(json.dumps(value, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def is_current(path, key):
+    """True if the PNG at path exists and was last rendered from this key."""
+    stored = cache.get_document(f"chart:{os.path.basename(path)}")
+    return stored is not None and stored['payload'] == key and os.path.exists(path)
+
+
+def render_job(job):
+    """Draws one job and writes its PNG. Returns (path, error or None)."""
+    kind, path, data = job
+    try:
+        fig = CHARTS[kind](**data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.png"
+        fig.savefig(tmp_path)
+        os.replace(tmp_path, path)
+        return path, None
+    except Exception as e:
+        return path, str(e)
+
+
+def render_now(jobs, max_workers=None):
+    """
+    Renders jobs immediately, across a process pool when there are
+    several. Jobs whose PNG is already current are skipped.
+    """
+    keys = {job[1]: job_key(job) for job in jobs}
+    todo = [job for job in jobs if not is_current(job[1], keys[job[1]])]
+    metrics.count("charts.unchanged", len(jobs) - len(todo))
+    jobs = todo
+    if not jobs:
+        return
+    max_workers = min(max_workers or MAX_WORKERS, len(jobs))
+    with metrics.span('chart'):
+        if max_workers > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(render_job, jobs))
+        else:
+            results = [render_job(job) for job in jobs]
+    for path, error in results:
+        if error:
+            print(f"Error generating {path}: {error}")
+            metrics.count("charts.errors")
+        else:
+            cache.put_document(f"chart:{os.path.basename(path)}", keys[path])
+            print(f"Generated {path}")
+    metrics.count("charts.rendered", sum(1 for _, error in results if not error))
+
+
+def render(jobs):
+    """Renders chart jobs, or queues them until the enclosing batch() ends."""
+    if _depth:
+        _pending.extend(jobs)
+    else:
+        render_now(jobs)
+
+
+@contextmanager
+def batch():
+    """Defers render() calls in the block and renders them all when the outermost block exits."""
+    global _depth
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        if _depth == 0:
+            jobs = _pending[:]
+            del _pending[:]
+            render_now(jobs)
+
+
+def svg_line(dates, values, title, color='#2980b9', width=640, height=200):
+    """
+    Inline SVG line chart of a price series, with the first/last date and
+    the low/high price as labels. Returns None for an empty series.
+    """
+    dates = np.asarray(dates, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=float)
+    valid = ~np.isnan(values)
+    dates, values = dates[valid], values[valid]
+    if len(values) < 2:
+        return None
+
+    left, right, top, bottom = 52, 8, 24, 20
+    t = dates.astype(np.int64).astype(float)
+    low, high = values.min(), values.max()
+    x = left + (t - t[0]) / max(t[-1] - t[0], 1.0) * (width - left - right)
+    y = top + (high - values) / max(high - low, 1e-9) * (height - top - bottom)
+    points = " ".join(f"{px:.1f},{py:.1f}" for px, py in zip(x, y))
+
+    first, last = (str(d)[:10] for d in (dates[0], dates[-1]))
+    title = html.escape(title)
+    return (
+        f'<svg class="chart-svg" viewBox="0 0 {width} {height}" width="100%" role="img" '
+        f'xmlns="http://www.w3.org/2000/svg" font-family="sans-serif" font-size="11" fill="#7f8c8d">'
+        f'<title>{title}</title>'
+        f'<text x="{left}" y="14" fill="#2c3e50" font-size="12">{title}</text>'
+        f'<line x1="{left}" y1="{height - bottom}" x2="{width - right}" y2="{height - bottom}" stroke="#ddd"/>'
+        f'<polyline points="{points}" fill="none" stroke="{color}" stroke-width="1.5"/>'
+        f'<text x="{left - 4}" y="{top + 4}" text-anchor="end">{high:,.2f}</text>'
+        f'<text x="{left - 4}" y="{height - bottom}" text-anchor="end">{low:,.2f}</text>'
+        f'<text x="{left}" y="{height - 5}">{first}</text>'
+        f'<text x="{width - right}" y="{height - 5}" text-anchor="end">{last}</text>'
+        f'</svg>'
+    )
+
+
+def referenced(base_dir):
+    """Relative paths of every PNG an HTML page in base_dir shows."""
+    paths = set()
+    for page in glob.glob(os.path.join(base_dir, '*.html')):
+        with open(page, encoding='utf-8', errors='replace') as f:
+            paths.update(os.path.normpath(src) for src in IMAGE_SRC.findall(f.read()))
+    return paths
+
+
+def collect_garbage(base_dir):
+    """
+    Deletes chart PNGs (in charts/, and chart*.png files left in base_dir
+    by older runs) that no page in base_dir references. Only call it after
+    every page was rebuilt. Returns the relative paths removed.
+    """
+    live = referenced(base_dir)
+    candidates = glob.glob(os.path.join(base_dir, CHART_DIR, '*.png')) + glob.glob(os.path.join(base_dir, 'chart*.png'))
+    removed = []
+    for path in candidates:
+        relative = os.path.relpath(path, base_dir)
+        if relative in live or path.endswith('.tmp.png'):
+            continue
+        os.remove(path)
+        removed.append(relative)
+    metrics.count("charts.removed", len(removed))
+    return sorted(removed)
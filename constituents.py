@@ -0,0 +1,111 @@
+"""
+constituents.py
+Index constituents (S&P 500 / 400 / 600) parsed from Wikipedia.
+
+Each index page is fetched at most once per run and the parsed table
+(ticker, name, sector, industry) is persisted in the cache together with
+the page's ETag / Last-Modified headers, so later runs only re-download
+the page when Wikipedia reports it has changed.
+"""
+
+import requests
+from bs4 import BeautifulSoup
+import cache
+import metrics
+
+INDEX_PAGES = {
+    'SP500': "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies",
+    'SP400': "https://en.wikipedia.org/wiki/List_of_S%26P_400_companies",
+    'SP600': "https://en.wikipedia.org/wiki/List_of_S%26P_600_companies",
+}
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'}
+
+# Header names used on the Wikipedia tables, with the column index to fall
+# back to when a header cannot be matched.
+COLUMN_NAMES = {
+    'ticker':   (('Symbol', 'Ticker symbol', 'Ticker'), 0),
+    'name':     (('Security', 'Company'), 1),
+    'sector':   (('GICS Sector',), 2),
+    'industry': (('GICS Sub-Industry', 'GICS Sub Industry'), 3),
+}
+
+_parsed = {}  # index -> rows, so each page is requested at most once per run
+
+
+def find_columns(header_cells):
+    """Maps each field to its column index using the table's header row."""
+    names = [c.text.strip() for c in header_cells]
+    columns = {}
+    for field, (candidates, default) in COLUMN_NAMES.items():
+        columns[field] = next((names.index(c) for c in candidates if c in names), default)
+    return columns
+
+
+def parse_constituents(html):
+    """Parses the 'constituents' table of an index page into a list of dicts."""
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', {'id': 'constituents'})
+    rows = table.findAll('tr')
+    columns = find_columns(rows[0].findAll('th'))
+    data = []
+    for row in rows[1:]:
+        cells = row.findAll('td')
+        if not cells:
+            continue
+        entry = {}
+        for field, index in columns.items():
+            entry[field] = cells[index].text.strip() if index < len(cells) else ''
+        data.append(entry)
+    return data
+
+
+def get_constituents(index):
+    """
+    Returns the constituents of an index ('SP500', 'SP400' or 'SP600') as a
+    list of {'ticker', 'name', 'sector', 'industry'} dicts.
+    """
+    if index in _parsed:
+        return _parsed[index]
+    with metrics.span("constituents"):
+        return fetch_constituents(index)
+
+
+def fetch_constituents(index):
+    """Conditional GET of an index page, falling back to the stored table."""
+    key = f"constituents:{index}"
+    stored = cache.get_document(key)
+    headers = dict(HEADERS)
+    if stored:
+        if stored['etag']:
+            headers['If-None-Match'] = stored['etag']
+        if stored['last_modified']:
+            headers['If-Modified-Since'] = stored['last_modified']
+
+    try:
+        metrics.count("network.wikipedia")
+        response = requests.get(INDEX_PAGES[index], headers=headers, timeout=30)
+        if response.status_code == 304 and stored:
+            print(f"{index} constituents unchanged, using stored table.")
+            metrics.count("constituents.not_modified")
+            data = stored['payload']
+            cache.put_document(key, data, stored['etag'], stored['last_modified'])
+        else:
+            response.raise_for_status()
+            data = parse_constituents(response.text)
+            cache.put_document(key, data, response.headers.get('ETag'),
+                               response.headers.get('Last-Modified'))
+    except Exception as e:
+        if not stored:
+            raise
+        print(f"Error refreshing {index} constituents ({e}), using stored table.")
+        data = stored['payload']
+
+    _parsed[index] = data
+    return data
+
+
+if __name__ == "__main__":
+    for index in INDEX_PAGES:
+        rows = get_constituents(index)
+        print(f"{index}: {len(rows)} constituents, e.g. {rows[0] if rows else None}")
@@ -0,0 +1,284 @@
+"""
+db.py
+Schema management for the picks database (stocks.db).
+
+The schema version is kept in SQLite's `PRAGMA user_version`. Each entry of
+MIGRATIONS upgrades the schema by one version and runs in its own
+transaction, so a database is brought up to date step by step on open and
+a migration is never applied twice. To change the schema, append a new
+migration function; never edit one that has already shipped.
+"""
+
+import ast
+import hashlib
+import os
+import sqlite3
+
+# Typed metric columns of picks (fractions, except D/E which yfinance reports in %)
+METRIC_COLUMNS = ('roe', 'margin', 'rev_growth', 'de', 'fcf_yield', 'w52_position')
+
+# Detail-string labels written by analyze.format_details -> metric column
+DETAIL_LABELS = {
+    'ROE': 'roe',
+    'Margin': 'margin',
+    'Rev Growth': 'rev_growth',
+    'D/E': 'de',
+    'PEG': 'peg',
+    'FCF Yield': 'fcf_yield',
+    '52W Position': 'w52_position',
+}
+
+
+def column_names(conn, table):
+    """Names of the columns of a table (empty if the table does not exist)."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def migrate_1_base_schema(conn):
+    """Creates the picks table, adding columns missing from older databases."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS picks
+                    (date text, ticker text, score integer, peg real, details text, description text, pe real, universe text, dividend_yield real)''')
+    existing = column_names(conn, 'picks')
+    for name, sql_type in (('description', 'text'), ('pe', 'real'),
+                           ('universe', 'text'), ('dividend_yield', 'real')):
+        if name not in existing:
+            conn.execute(f"ALTER TABLE picks ADD COLUMN {name} {sql_type}")
+
+
+def migrate_2_history_indexes(conn):
+    """
+    Rows written before the universe column existed are S&P 500 picks; give
+    them their universe so history queries need no `OR universe IS NULL`,
+    then index the two access paths (per universe, per ticker) by date.
+    """
+    conn.execute("UPDATE picks SET universe = 'SP500' WHERE universe IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_picks_universe_date ON picks (universe, date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_picks_ticker_date ON picks (ticker, date)")
+
+
+def migrate_3_unique_picks(conn):
+    """
+    One row per (date, universe, ticker): drop duplicates left by older
+    writers (keeping the latest insert) and enforce the key so picks can be
+    upserted.
+    """
+    conn.execute('''DELETE FROM picks WHERE rowid NOT IN
+                    (SELECT MAX(rowid) FROM picks GROUP BY date, universe, ticker)''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_picks_date_universe_ticker ON picks (date, universe, ticker)")
+
+
+def parse_details(text):
+    """
+    Recovers metric values from a stored str(details) list, e.g.
+    "['ROE: 18.44% (>15%)', 'D/E: 5.943 (<50%)', ...]". Percentages become
+    fractions; N/A and unparsable entries are left out.
+    """
+    try:
+        details = ast.literal_eval(text) if text else []
+    except (ValueError, SyntaxError):
+        return {}
+    values = {}
+    for detail in details:
+        label, _, rest = str(detail).partition(':')
+        column = DETAIL_LABELS.get(label.strip())
+        token = rest.split()[0] if rest.split() else ''
+        if column is None or token == 'N/A':
+            continue
+        try:
+            values[column] = round(float(token[:-1]) / 100, 6) if token.endswith('%') else float(token)
+        except ValueError:
+            continue
+    return values
+
+
+def migrate_4_metric_columns(conn):
+    """
+    Stores each scoring metric in its own REAL column instead of only in the
+    str(details) text, and backfills the new columns by parsing that text
+    (values are as precise as the formatted strings, i.e. 0.01%).
+    """
+    existing = column_names(conn, 'picks')
+    for column in METRIC_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE picks ADD COLUMN {column} real")
+
+    rows = conn.execute("SELECT rowid, details, peg FROM picks WHERE details IS NOT NULL").fetchall()
+    updates = []
+    for rowid, details, peg in rows:
+        values = parse_details(details)
+        if peg is None and 'peg' in values:
+            peg = values['peg']
+        updates.append([values.get(c) for c in METRIC_COLUMNS] + [peg, rowid])
+    assignments = ", ".join(f"{c} = ?" for c in METRIC_COLUMNS)
+    conn.executemany(f"UPDATE picks SET {assignments}, peg = ? WHERE rowid = ?", updates)
+
+
+def description_hash(text):
+    """Content key of a description (first 16 hex digits of its SHA-256)."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def migrate_5_description_store(conn):
+    """
+    Moves business descriptions out of picks into a table keyed by content
+    hash, so a summary repeated every day for the same ticker is stored
+    once. picks.description_hash references it; picks.description is
+    cleared (run `python3 db.py compact` afterwards to reclaim the space).
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS descriptions
+                    (hash text PRIMARY KEY, text text) WITHOUT ROWID''')
+    if 'description_hash' not in column_names(conn, 'picks'):
+        conn.execute("ALTER TABLE picks ADD COLUMN description_hash text")
+
+    rows = conn.execute("SELECT rowid, description FROM picks WHERE description IS NOT NULL").fetchall()
+    hashes = [(description_hash(text), text, rowid) for rowid, text in rows]
+    conn.executemany("INSERT OR IGNORE INTO descriptions VALUES (?, ?)", [(h, t) for h, t, _ in hashes])
+    conn.executemany("UPDATE picks SET description_hash = ?, description = NULL WHERE rowid = ?",
+                     [(h, rowid) for h, _, rowid in hashes])
+    conn.execute('''CREATE VIEW IF NOT EXISTS picks_with_description AS
+                    SELECT p.*, d.text AS description_text FROM picks p
+                    LEFT JOIN descriptions d ON d.hash = p.description_hash''')
+
+
+MIGRATIONS = [
+    migrate_1_base_schema,
+    migrate_2_history_indexes,
+    migrate_3_unique_picks,
+    migrate_4_metric_columns,
+    migrate_5_description_store,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Applies every pending migration. Returns the resulting schema version."""
+    version = get_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION}).")
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        migration = MIGRATIONS[number - 1]
+        print(f"Migrating database to version {number}: {migration.__name__}")
+        # One transaction per migration, so a failure leaves the previous version intact
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return SCHEMA_VERSION
+
+
+PICK_COLUMNS = ('date', 'ticker', 'score', 'peg', 'details', 'description', 'pe', 'universe', 'dividend_yield') \
+    + METRIC_COLUMNS
+
+
+# Columns as stored: the description text lives in the descriptions table
+STORED_COLUMNS = tuple('description_hash' if c == 'description' else c for c in PICK_COLUMNS)
+
+
+def write_picks(conn, date, universe, rows):
+    """
+    Replaces the picks of one (date, universe) in a single transaction.
+    rows are tuples in PICK_COLUMNS order (with the description text).
+    Rows are upserted on (date, universe, ticker), so re-running a day is
+    idempotent, and picks of that day that are not in the new set are
+    removed. Descriptions are stored once per distinct text.
+    """
+    position = PICK_COLUMNS.index('description')
+    descriptions = {}
+    stored_rows = []
+    for row in rows:
+        text = row[position]
+        key = description_hash(text) if text is not None else None
+        if key is not None:
+            descriptions[key] = text
+        stored_rows.append(row[:position] + (key,) + row[position + 1:])
+
+    columns = ", ".join(STORED_COLUMNS)
+    placeholders = ", ".join("?" for _ in STORED_COLUMNS)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in STORED_COLUMNS if c not in ('date', 'universe', 'ticker'))
+    tickers = [row[PICK_COLUMNS.index('ticker')] for row in rows]
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO descriptions VALUES (?, ?)", descriptions.items())
+        conn.executemany(f"""INSERT INTO picks ({columns}) VALUES ({placeholders})
+                             ON CONFLICT (date, universe, ticker) DO UPDATE SET {updates}""", stored_rows)
+        conn.execute(f"DELETE FROM picks WHERE date = ? AND universe = ? AND ticker NOT IN ({', '.join('?' for _ in tickers)})",
+                     [date, universe] + tickers)
+
+
+def connect(path):
+    """
+    Opens the picks database in WAL mode and brings its schema up to date.
+    WAL lets readers (e.g. a dashboard) keep reading while a run writes.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    # Transactions are managed explicitly (migrations, bulk writes)
+    conn.isolation_level = None
+    migrate(conn)
+    conn.isolation_level = ''
+    return conn
+
+
+def connect_readonly(path):
+    """
+    Opens the picks database read-only (for analysis tools): no migrations
+    are applied and the journal mode is left alone.
+    """
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+
+
+def close(conn):
+    """
+    Checkpoints the WAL into the main file and closes the connection.
+    stocks.db is committed to git without its -wal/-shm sidecars, so every
+    write has to be in the main file before the run ends.
+    """
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def get_description(conn, key):
+    """The description text stored under a hash, or None."""
+    row = conn.execute("SELECT text FROM descriptions WHERE hash = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def compact(conn):
+    """
+    One-off maintenance: drops descriptions no pick references any more,
+    then VACUUMs the file and checkpoints the WAL. Returns the number of
+    descriptions removed.
+    """
+    with conn:
+        cur = conn.execute('''DELETE FROM descriptions WHERE hash NOT IN
+                              (SELECT description_hash FROM picks WHERE description_hash IS NOT NULL)''')
+    conn.execute("VACUUM")
+    conn.execute("ANALYZE")
+    # In WAL mode the vacuumed pages land in the WAL; checkpoint to shrink the file
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return cur.rowcount
+
+
+if __name__ == "__main__":
+    import sys
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stocks.db')
+    conn = connect(path)
+    if sys.argv[1:] == ['compact']:
+        before = os.path.getsize(path)
+        removed = compact(conn)
+        print(f"Removed {removed} unused descriptions; {path}: {before / 1024:.0f} KB -> {os.path.getsize(path) / 1024:.0f} KB")
+    count = conn.execute("SELECT COUNT(*) FROM picks").fetchone()[0]
+    print(f"{path}: schema version {get_version(conn)}, {count} picks")
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM picks WHERE universe = ? ORDER BY date DESC LIMIT 30",
+                        ('SP500',)).fetchall()
+    print("History query plan:", "; ".join(row[-1] for row in plan))
+    close(conn)
@@ -0,0 +1,94 @@
+"""
+delta.py
+Change detection between runs.
+
+Most fundamentals only move when a company reports, while prices move
+every day. Scoring and the sector pages build on that:
+
+  - report_changes() logs how many tickers' fundamentals changed since
+    the last snapshot (scoring itself is cheap and always re-evaluates
+    every criterion, so a THRESHOLDS change applies at once).
+  - the fundamentals part of each sector page card (name, description,
+    ROE / margin / growth / D/E cells, peers, subsector) is cached in the
+    cache database (cache.py) together with a fingerprint of what it was
+    built from: those fields of every ticker on the page, its template
+    and the code that renders it. While the fingerprint matches, the
+    cards are reused and only the price cells, the strategy order and the
+    date are rebuilt.
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import analyze
+import cache
+import fundamentals
+import metrics
+import snapshots
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+
+# Code that shapes the report pages; editing it invalidates every fingerprint
+CODE_FILES = ['main.py', 'fetch_competitors.py', 'fundamentals.py']
+
+# Info keys behind the cached card fields: the fundamental scoring inputs
+# plus the name and description shown on the card
+FUNDAMENTAL_KEYS = ([analyze.NUMERIC_FIELDS[c][0] for c in analyze.FUNDAMENTAL_COLUMNS if c in analyze.NUMERIC_FIELDS] +
+                    [analyze.TEXT_FIELDS[c] for c in analyze.FUNDAMENTAL_COLUMNS if c in analyze.TEXT_FIELDS])
+PAGE_KEYS = ['longName', fundamentals.DESCRIPTION_KEY]
+
+
+def record_values(record):
+    """The fundamentals and card fields of a record (no prices)."""
+    if record is None:
+        return None
+    return [record.get(key) for key in FUNDAMENTAL_KEYS + PAGE_KEYS]
+
+
+def fingerprint(template, tickers, infos, *extra):
+    """
+    Fingerprint of the fundamentals part of a report: its template, the
+    code that builds it, the fundamentals and card fields of its tickers
+    and any extra JSON-serialisable state it renders.
+    """
+    digest = hashlib.sha256()
+    for path in [os.path.join(TEMPLATE_DIR, template)] + [os.path.join(BASE_DIR, f) for f in CODE_FILES]:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    records = [[t, record_values(infos.get(t))] for t in tickers]
+    digest.update(json.dumps([records, extra], default=str, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cached_cards(output_path, value):
+    """The cards recorded for a report if they were built from this fingerprint, else None."""
+    stored = cache.get_document(f"report:{os.path.basename(output_path)}")
+    payload = stored['payload'] if stored else None
+    current = isinstance(payload, dict) and payload.get('fingerprint') == value
+    metrics.count("delta.reports_reused" if current else "delta.reports_built")
+    return payload['cards'] if current else None
+
+
+def record(output_path, value, cards):
+    """Records the cards of a report and the fingerprint they were built from."""
+    cache.put_document(f"report:{os.path.basename(output_path)}", {'fingerprint': value, 'cards': cards})
+
+
+def report_changes(universe, scored):
+    """
+    Prints and counts the tickers whose fundamentals changed since the
+    last snapshot of a universe. `scored` is a score_frame() DataFrame or
+    a list of them. Returns the changed tickers.
+    """
+    if isinstance(scored, list):
+        scored = pd.concat(scored, ignore_index=True)
+    tickers, since = snapshots.changed(universe, scored, analyze.FUNDAMENTAL_COLUMNS)
+    metrics.count("delta.fundamentals_changed", len(tickers))
+    metrics.count("delta.fundamentals_unchanged", len(scored) - len(tickers))
+    if since:
+        print(f"{universe}: fundamentals changed for {len(tickers)}/{len(scored)} tickers since {since}.")
+    return tickers
@@ -1,4 +1,4 @@
-import yfinance as yf
+import fetch_data
 
 # Chinese Stock Info Mapping (Name and Description)
 CHINA_STOCK_INFO = {
@@ -60,15 +60,9 @@ def get_china_stock_info(ticker):
 
 def get_stock_data(ticker):
     """
-    Fetches data for a single stock using yfinance.
+    Fetches data for a single stock using yfinance (via the fundamentals cache).
     """
-    try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
-        return info
-    except Exception as e:
-        print(f"Error fetching data for {ticker}: {e}")
-        return None
+    return fetch_data.get_stock_data(ticker)
 
 if __name__ == "__main__":
     # Test
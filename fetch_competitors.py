@@ -1,6 +1,6 @@
 import requests
 from bs4 import BeautifulSoup
-import yfinance as yf
+import fetch_data
 
 def get_competitors_via_search(ticker, industry, max_results=5):
     """
@@ -43,8 +43,9 @@ def compare_stocks(tickers):
     
     for ticker in tickers:
         try:
-            stock = yf.Ticker(ticker)
-            info = stock.info
+            info = fetch_data.get_stock_data(ticker)
+            if not info:
+                continue
             
             comparison.append({
                 'ticker': ticker,
@@ -61,68 +62,81 @@ def compare_stocks(tickers):
     
     return comparison
 
+# Curated peer lists for common sectors (demo only)
+SECTOR_PEERS = {
+    'Technology': {
+        'AAPL': ['MSFT', 'GOOGL', 'META', 'NVDA'],
+        'MSFT': ['AAPL', 'GOOGL', 'AMZN', 'ORCL'],
+        'GOOGL': ['META', 'AAPL', 'MSFT', 'AMZN'],
+        'NVDA': ['AMD', 'INTC', 'QCOM', 'AVGO'],
+        'AMD': ['NVDA', 'INTC', 'QCOM', 'MU'],
+        'AVGO': ['NVDA', 'QCOM', 'TXN', 'ADI'],
+        'INTC': ['AMD', 'NVDA', 'TSM', 'QCOM'],
+        'QCOM': ['NVDA', 'AMD', 'AVGO', 'MRVL'],
+        'TXN': ['ADI', 'NXPI', 'ON', 'MCHP'],
+        'MU': ['NVDA', 'AMD', 'INTC', 'TSM'],
+        'AMAT': ['LRCX', 'KLAC', 'ASML', 'TSM'],
+        'LRCX': ['AMAT', 'KLAC', 'ASML', 'TSM'],
+        'SNPS': ['CDNS', 'ARM', 'MRVL', 'AVGO'],
+        'CDNS': ['SNPS', 'ARM', 'MRVL', 'AVGO'],
+        'CRM': ['NOW', 'PLTR', 'ORCL', 'SAP'],
+        'PLTR': ['CRM', 'AI', 'NOW', 'SNOW'],
+        'NOW': ['CRM', 'PLTR', 'DDOG', 'SNOW'],
+        'CRWD': ['PANW', 'DDOG', 'NOW', 'PLTR'],
+        'PANW': ['CRWD', 'DDOG', 'NOW', 'PLTR'],
+    },
+    'Consumer Cyclical': {
+        'AMZN': ['WMT', 'TGT', 'HD', 'LOW'],
+        'TSLA': ['GM', 'F', 'NIO', 'RIVN'],
+    },
+    'Healthcare': {
+        'JNJ': ['PFE', 'UNH', 'ABBV', 'MRK'],
+        'UNH': ['CVS', 'CI', 'HUM', 'ELV'],
+        'ISRG': ['ABT', 'MDT', 'SYK', 'BSX'],
+    },
+    'Financial Services': {
+        'JPM': ['BAC', 'WFC', 'C', 'GS'],
+        'BAC': ['JPM', 'WFC', 'C', 'USB'],
+        'V': ['MA', 'AXP', 'PYPL', 'XYZ'],       # Block trades as XYZ (was SQ)
+    },
+    'Communication Services': {
+        'META': ['GOOGL', 'SNAP', 'PINS'],       # TWTR was delisted
+    },
+    'Consumer Defensive': {
+        'KO': ['PEP', 'MNST', 'KDP'],            # DPS merged into KDP
+        'PG': ['UL', 'CL', 'KMB', 'CLX'],
+    },
+    'Energy': {
+        'XOM': ['CVX', 'COP', 'SLB', 'EOG'],
+    },
+    'Industrials': {
+        'BA': ['LMT', 'RTX', 'GE', 'HON'],
+        'CAT': ['DE', 'CMI', 'EMR', 'ITW'],
+    }
+}
+
+def peer_tickers(tickers):
+    """
+    Every peer get_industry_peers() can return for any of the given
+    tickers, i.e. the peers of those that have a curated peer list.
+    """
+    wanted = set(tickers)
+    peers = []
+    for groups in SECTOR_PEERS.values():
+        for ticker, group in groups.items():
+            if ticker in wanted:
+                peers.extend(group)
+    return list(dict.fromkeys(peers))
+
 def get_industry_peers(ticker, sector, industry, max_peers=4):
     """
     Get industry peers for a stock.
     This is a demo implementation - returns a curated list based on sector.
     In production, you'd use a financial data API.
     """
-    # Curated peer lists for common sectors (demo only)
-    sector_peers = {
-        'Technology': {
-            'AAPL': ['MSFT', 'GOOGL', 'META', 'NVDA'],
-            'MSFT': ['AAPL', 'GOOGL', 'AMZN', 'ORCL'],
-            'GOOGL': ['META', 'AAPL', 'MSFT', 'AMZN'],
-            'NVDA': ['AMD', 'INTC', 'QCOM', 'AVGO'],
-            'AMD': ['NVDA', 'INTC', 'QCOM', 'MU'],
-            'AVGO': ['NVDA', 'QCOM', 'TXN', 'ADI'],
-            'INTC': ['AMD', 'NVDA', 'TSM', 'QCOM'],
-            'QCOM': ['NVDA', 'AMD', 'AVGO', 'MRVL'],
-            'TXN': ['ADI', 'NXPI', 'ON', 'MCHP'],
-            'MU': ['NVDA', 'AMD', 'INTC', 'TSM'],
-            'AMAT': ['LRCX', 'KLAC', 'ASML', 'TSM'],
-            'LRCX': ['AMAT', 'KLAC', 'ASML', 'TSM'],
-            'SNPS': ['CDNS', 'ARM', 'MRVL', 'AVGO'],
-            'CDNS': ['SNPS', 'ARM', 'MRVL', 'AVGO'],
-            'CRM': ['NOW', 'PLTR', 'ORCL', 'SAP'],
-            'PLTR': ['CRM', 'AI', 'NOW', 'SNOW'],
-            'NOW': ['CRM', 'PLTR', 'DDOG', 'SNOW'],
-            'CRWD': ['PANW', 'DDOG', 'NOW', 'PLTR'],
-            'PANW': ['CRWD', 'DDOG', 'NOW', 'PLTR'],
-        },
-        'Consumer Cyclical': {
-            'AMZN': ['WMT', 'TGT', 'HD', 'LOW'],
-            'TSLA': ['GM', 'F', 'NIO', 'RIVN'],
-        },
-        'Healthcare': {
-            'JNJ': ['PFE', 'UNH', 'ABBV', 'MRK'],
-            'UNH': ['CVS', 'CI', 'HUM', 'ELV'],
-            'ISRG': ['ABT', 'MDT', 'SYK', 'BSX'],
-        },
-        'Financial Services': {
-            'JPM': ['BAC', 'WFC', 'C', 'GS'],
-            'BAC': ['JPM', 'WFC', 'C', 'USB'],
-            'V': ['MA', 'AXP', 'PYPL', 'SQ'],
-        },
-        'Communication Services': {
-            'META': ['GOOGL', 'SNAP', 'PINS', 'TWTR'],
-        },
-        'Consumer Defensive': {
-            'KO': ['PEP', 'MNST', 'DPS', 'KDP'],
-            'PG': ['UL', 'CL', 'KMB', 'CLX'],
-        },
-        'Energy': {
-            'XOM': ['CVX', 'COP', 'SLB', 'EOG'],
-        },
-        'Industrials': {
-            'BA': ['LMT', 'RTX', 'GE', 'HON'],
-            'CAT': ['DE', 'CMI', 'EMR', 'ITW'],
-        }
-    }
-    
     # Try to find ticker in our curated list
-    if sector in sector_peers and ticker in sector_peers[sector]:
-        return sector_peers[sector][ticker][:max_peers]
+    if sector in SECTOR_PEERS and ticker in SECTOR_PEERS[sector]:
+        return SECTOR_PEERS[sector][ticker][:max_peers]
     
     # Fallback: return empty list
     print(f"No curated peers found for {ticker} in {sector}")
@@ -1,82 +1,59 @@
+import time
 import yfinance as yf
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+import cache
+import constituents
+import fetch_engine
+import fundamentals
+import metrics
+import price_store
+
+# ticker -> (fetched_at, Fundamentals record): each cache entry is parsed
+# once per process and only the compact record is kept
+_records = {}
 
 def get_sp500_tickers():
-    """Scrapes the list of S&P 500 tickers from Wikipedia."""
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'}
+    """Returns the list of S&P 500 tickers (Wikipedia constituents table)."""
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        table = soup.find('table', {'id': 'constituents'})
-        tickers = []
-        for row in table.findAll('tr')[1:]:
-            ticker = row.findAll('td')[0].text.strip()
-            tickers.append(ticker)
-        return tickers
+        return [row['ticker'] for row in constituents.get_constituents('SP500')]
     except Exception as e:
         print(f"Error fetching S&P 500 tickers: {e}")
         return []
 
 def get_sp500_tickers_with_sector():
-    """Scrapes S&P 500 tickers and their sectors from Wikipedia."""
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'}
+    """Returns S&P 500 tickers with their name, GICS sector and sub-industry."""
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        table = soup.find('table', {'id': 'constituents'})
-        data = []
-        for row in table.findAll('tr')[1:]:
-            cols = row.findAll('td')
-            if cols:
-                ticker = cols[0].text.strip()
-                sector = cols[2].text.strip()
-                data.append({'ticker': ticker, 'sector': sector})
-        return data
+        return [dict(row) for row in constituents.get_constituents('SP500')]
     except Exception as e:
         print(f"Error fetching S&P 500 tickers with sector: {e}")
         return []
 
+def get_gics_classification(indices=('SP500', 'SP400', 'SP600')):
+    """
+    GICS sector and sub-industry of every constituent of the given indices,
+    as {'sector': {ticker: sector}, 'industry': {ticker: sub_industry}}.
+    Used to group stocks for sector-relative scoring.
+    """
+    sectors, industries = {}, {}
+    for index in indices:
+        try:
+            for row in constituents.get_constituents(index):
+                sectors[row['ticker']] = row['sector'] or None
+                industries[row['ticker']] = row['industry'] or None
+        except Exception as e:
+            print(f"Error fetching {index} classification: {e}")
+    return {'sector': sectors, 'industry': industries}
+
 def get_sp400_tickers():
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_400_companies"
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'}
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        table = soup.find('table', {'id': 'constituents'})
-        tickers = []
-        for row in table.findAll('tr')[1:]:
-            # Ticker is usually in the first column, similar to S&P 500
-            cells = row.findAll('td')
-            if cells:
-                ticker = cells[0].text.strip()
-                tickers.append(ticker)
-        return tickers
+        return [row['ticker'] for row in constituents.get_constituents('SP400')]
     except Exception as e:
         print(f"Error fetching S&P 400 tickers: {e}")
         return []
 
 def get_sp600_tickers():
-    url = "https://en.wikipedia.org/wiki/List_of_S%26P_600_companies"
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'}
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        table = soup.find('table', {'id': 'constituents'})
-        tickers = []
-        for row in table.findAll('tr')[1:]:
-            cells = row.findAll('td')
-            if cells:
-                ticker = cells[0].text.strip()
-                tickers.append(ticker)
-        return tickers
+        return [row['ticker'] for row in constituents.get_constituents('SP600')]
     except Exception as e:
         print(f"Error fetching S&P 600 tickers: {e}")
         return []
@@ -84,24 +61,119 @@ def get_sp600_tickers():
 def get_non_sp500_tickers():
     return get_sp400_tickers() + get_sp600_tickers()
 
-def get_stock_data(ticker):
-    """Fetches financial data for a given ticker using yfinance."""
+def download_stock_data(ticker):
+    """
+    Downloads the yfinance info dict for a ticker and stores it in the cache.
+    Bypasses the cache lookup and raises on failure (used by the fetch engine).
+    """
+    metrics.count("network.yfinance.info")
+    stock = yf.Ticker(ticker)
+    # We need info for valuation and growth metrics
+    info = stock.info
+    if info:
+        cache.put_fundamentals(ticker, info)
+        _records[ticker] = (time.time(), fundamentals.Fundamentals.from_info(ticker, info))
+    return info
+
+def cached_record(ticker, ttl=None):
+    """
+    Returns the Fundamentals record of a ticker from the cache, or None if
+    it is missing or older than `ttl` seconds. The JSON payload is parsed
+    only the first time a ticker is asked for in a process.
+    """
+    ttl = cache.FUNDAMENTALS_TTL if ttl is None else ttl
+    entry = _records.get(ticker)
+    if entry is None:
+        stored = cache.get_fundamentals_entry(ticker)
+        if stored is None:
+            return None
+        entry = (stored[0], fundamentals.Fundamentals.from_info(ticker, stored[1]))
+        _records[ticker] = entry
+    fetched_at, record = entry
+    if record is None or time.time() - fetched_at > ttl:
+        return None
+    return record
+
+def get_stock_data(ticker, ttl=None):
+    """
+    Fetches financial data for a given ticker using yfinance.
+    Served from the on-disk fundamentals cache when a fresh entry exists.
+    Returns a Fundamentals record (answers .get() like the info dict).
+    """
+    record = cached_record(ticker, ttl)
+    if record is not None:
+        metrics.count("cache.fundamentals.hit")
+        return record
+    metrics.count("cache.fundamentals.miss")
     try:
-        stock = yf.Ticker(ticker)
-        # We need info for valuation and growth metrics
-        info = stock.info
-        return info
+        return fundamentals.Fundamentals.from_info(ticker, download_stock_data(ticker))
     except Exception as e:
         print(f"Error fetching data for {ticker}: {e}")
         return None
 
+def stream_stock_data(tickers, on_result, ttl=None, max_workers=None):
+    """
+    Calls on_result(ticker, info) for every ticker as soon as its info is
+    available: cached tickers first (as Fundamentals records), then network
+    fetches (as info dicts) as they complete in the shared fetch engine.
+    Failed fetches are reported, not streamed.
+    """
+    missing = []
+    hits = 0
+    for ticker in dict.fromkeys(tickers):
+        info = cached_record(ticker, ttl)
+        if info is not None:
+            hits += 1
+            on_result(ticker, info)
+        else:
+            missing.append(ticker)
+    metrics.count("cache.fundamentals.hit", hits)
+    metrics.count("cache.fundamentals.miss", len(missing))
+
+    if missing:
+        fetch_engine.fetch_all(missing, download_stock_data, max_workers=max_workers,
+                               label="fundamentals", on_result=on_result)
+
+def get_stock_data_many(tickers, ttl=None, max_workers=None):
+    """
+    Fetches fundamentals for many tickers through the shared fetch engine.
+    Cached tickers are served locally; only misses go to the network.
+    Returns a dict of ticker -> compact Fundamentals record (failed or empty
+    fetches are omitted); the raw info dicts are not kept.
+    """
+    infos = {}
+
+    def collect(ticker, info):
+        # Cached tickers arrive as records, fresh downloads as info dicts
+        record = info if isinstance(info, fundamentals.Fundamentals) else fundamentals.Fundamentals.from_info(ticker, info)
+        if record is not None:
+            infos[ticker] = record
+
+    with metrics.span("fetch"):
+        stream_stock_data(tickers, collect, ttl, max_workers)
+    return infos
+
+def get_histories(tickers, period="5y"):
+    """
+    Fetches daily history for many tickers in batched multi-ticker requests
+    (served from the local price store). Returns an aligned panel indexed by
+    date with (ticker, field) columns; use history_view() to slice it.
+    """
+    with metrics.span("fetch_prices"):
+        try:
+            return price_store.get_histories(tickers, period=period)
+        except Exception as e:
+            print(f"Error fetching histories for {len(tickers)} tickers: {e}")
+            return price_store.load_many(tickers, period=period)
+
+def history_view(panel, ticker):
+    """Returns one ticker's OHLCV DataFrame from a get_histories() panel."""
+    return price_store.view(panel, ticker)
+
 def get_stock_history(ticker, period="5y"):
-    """Fetches historical data for a ticker."""
+    """Fetches historical data for a ticker (served from the local price store)."""
     try:
-        stock = yf.Ticker(ticker)
-        # Fetch history
-        hist = stock.history(period=period)
-        return hist
+        return history_view(get_histories([ticker], period=period), ticker)
     except Exception as e:
         print(f"Error fetching history for {ticker}: {e}")
         return None
@@ -3,8 +3,8 @@ fetch_energy_data.py
 Fetches oil/energy commodity prices, energy ETFs, and energy stock data.
 """
 
-import yfinance as yf
 import pandas as pd
+import fetch_data
 
 # ── Commodity futures traded on yfinance ────────────────────────────────────
 COMMODITIES = {
@@ -81,10 +81,11 @@ def get_commodity_prices():
     Returns a list of dicts with current commodity price snapshot.
     """
     results = []
+    # One batched request; the 1-year window also serves the commodity charts
+    panel = fetch_data.get_histories(list(COMMODITIES.values()), period='1y')
     for name, ticker in COMMODITIES.items():
         try:
-            t = yf.Ticker(ticker)
-            hist = t.history(period='5d')
+            hist = fetch_data.history_view(panel, ticker)
             if hist.empty:
                 results.append({'name': name, 'ticker': ticker, 'price': None,
                                  'change': None, 'change_pct': None})
@@ -112,9 +113,8 @@ def get_commodity_prices():
 def get_commodity_history(ticker, period='1y'):
     """Returns a DataFrame of daily closes for a commodity ticker."""
     try:
-        t = yf.Ticker(ticker)
-        hist = t.history(period=period)
-        return hist[['Close']] if not hist.empty else pd.DataFrame()
+        hist = fetch_data.get_stock_history(ticker, period=period)
+        return hist[['Close']] if hist is not None and not hist.empty else pd.DataFrame()
     except Exception as e:
         print(f"Error fetching commodity history {ticker}: {e}")
         return pd.DataFrame()
@@ -125,11 +125,13 @@ def get_etf_data():
     Returns a list of dicts with ETF performance metrics.
     """
     results = []
+    infos = fetch_data.get_stock_data_many(ENERGY_ETFS)
+    panel = fetch_data.get_histories(list(ENERGY_ETFS), period='1y')
     for ticker, name in ENERGY_ETFS.items():
         try:
-            t = yf.Ticker(ticker)
-            info = t.info
-            hist = t.history(period='1y')
+            # A ticker missing from the batch failed in the fetch engine
+            info = infos.get(ticker) or {}
+            hist = fetch_data.history_view(panel, ticker)
 
             price = info.get('regularMarketPrice') or info.get('previousClose')
             prev_close = info.get('previousClose')
@@ -169,14 +171,16 @@ def get_etf_data():
     return results
 
 
-def get_energy_stock_data(ticker):
+def get_energy_stock_data(ticker, info=None):
     """
     Returns a dict of financial metrics for a single energy stock.
     Uses the same yfinance .info approach as the rest of the project.
+    Pass the record from a get_stock_data_many() batch as `info`; without
+    it the ticker is fetched on its own.
     """
     try:
-        t = yf.Ticker(ticker)
-        info = t.info
+        if info is None:
+            info = fetch_data.get_stock_data(ticker)
         if not info:
             return None
 
@@ -223,10 +227,12 @@ def get_all_energy_stocks():
     Sorted by market cap descending.
     """
     results = []
-    total = len(ENERGY_STOCKS)
-    for i, ticker in enumerate(ENERGY_STOCKS, 1):
-        print(f"[{i}/{total}] Fetching {ticker}...", end='\r')
-        data = get_energy_stock_data(ticker)
+    infos = fetch_data.get_stock_data_many(ENERGY_STOCKS)
+    for ticker in ENERGY_STOCKS:
+        # A ticker missing from the batch failed in the fetch engine
+        if ticker not in infos:
+            continue
+        data = get_energy_stock_data(ticker, infos[ticker])
         if data:
             results.append(data)
 
@@ -238,9 +244,8 @@ def get_all_energy_stocks():
 def get_energy_stock_history(ticker, period='1y'):
     """Returns history DataFrame for an energy stock."""
     try:
-        t = yf.Ticker(ticker)
-        hist = t.history(period=period)
-        return hist if not hist.empty else pd.DataFrame()
+        hist = fetch_data.get_stock_history(ticker, period=period)
+        return hist if hist is not None and not hist.empty else pd.DataFrame()
     except Exception as e:
         print(f"Error fetching history for {ticker}: {e}")
         return pd.DataFrame()
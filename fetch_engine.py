@@ -0,0 +1,170 @@
+"""
+fetch_engine.py
+Shared concurrent fetch engine used by every report.
+
+Runs a fetch function over many tickers with a bounded worker pool, a
+token-bucket rate limiter shared by all workers, exponential backoff on
+HTTP 429 / 5xx responses, and a per-ticker error report.
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import metrics
+
+# Defaults can be tuned from the environment (e.g. in the CI workflow).
+MAX_WORKERS = int(os.environ.get('FETCH_WORKERS', 16))
+RATE_PER_SEC = float(os.environ.get('FETCH_RATE_PER_SEC', 8))
+MAX_RETRIES = int(os.environ.get('FETCH_MAX_RETRIES', 4))
+BACKOFF_BASE = 1.0   # seconds, doubled on every retry
+BACKOFF_MAX = 60.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `rate` tokens are added per second, up to
+    `capacity`; each acquire() takes one token, sleeping until one is free.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def get_status_code(exc):
+    """Best-effort HTTP status code for an exception raised by requests/yfinance."""
+    response = getattr(exc, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is not None:
+        return status
+    # yfinance raises its own exception types for throttling
+    if type(exc).__name__ == 'YFRateLimitError':
+        return 429
+    text = str(exc)
+    if '429' in text or 'Too Many Requests' in text:
+        return 429
+    return None
+
+
+def is_retryable(exc):
+    """True for throttling (429) and server-side (5xx) failures."""
+    status = get_status_code(exc)
+    return status is not None and (status == 429 or 500 <= status < 600)
+
+
+def get_retry_delay(exc, attempt):
+    """Seconds to wait before the next attempt; honours Retry-After if sent."""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = headers.get('Retry-After')
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    delay = BACKOFF_BASE * (2 ** attempt)
+    return min(BACKOFF_MAX, delay + random.uniform(0, delay / 2))
+
+
+def fetch_one(ticker, fetch_fn, bucket, retries, label="tickers"):
+    """
+    Calls fetch_fn(ticker) with rate limiting and backoff. Raises on final failure.
+    The ticker's latency (including retries) is recorded in fetch.latency.<label>.
+    """
+    attempt = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            bucket.acquire()
+            try:
+                return fetch_fn(ticker)
+            except Exception as e:
+                if attempt >= retries or not is_retryable(e):
+                    raise
+                metrics.count(f"fetch.retries.{label}")
+                time.sleep(get_retry_delay(e, attempt))
+                attempt += 1
+    finally:
+        metrics.observe(f"fetch.latency.{label}", time.perf_counter() - start)
+
+
+def fetch_all(tickers, fetch_fn, max_workers=None, rate=None, retries=None,
+              label="tickers", on_result=None):
+    """
+    Runs fetch_fn over tickers concurrently.
+
+    fetch_fn(ticker) should raise on failure so errors can be reported.
+    on_result(ticker, result), if given, is called from the calling thread
+    as each result arrives; results are then streamed to it instead of
+    being collected.
+
+    Returns (results, errors): results maps ticker -> value for successful
+    fetches (empty when streaming), errors maps ticker -> error message.
+    """
+    max_workers = max_workers or MAX_WORKERS
+    rate = RATE_PER_SEC if rate is None else rate
+    retries = MAX_RETRIES if retries is None else retries
+
+    # Preserve order but drop duplicates so each symbol is requested once
+    tickers = list(dict.fromkeys(tickers))
+    results = {}
+    errors = {}
+    if not tickers:
+        return results, errors
+
+    bucket = TokenBucket(rate)
+    total = len(tickers)
+    completed = 0
+    print(f"Fetching {total} {label} ({max_workers} workers, {rate:g} req/s)...")
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, total)) as executor:
+        futures = {executor.submit(fetch_one, t, fetch_fn, bucket, retries, label): t for t in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                result = future.result()
+                if on_result:
+                    on_result(ticker, result)
+                else:
+                    results[ticker] = result
+            except Exception as e:
+                errors[ticker] = f"{type(e).__name__}: {e}"
+
+            completed += 1
+            if completed % 50 == 0 or completed == total:
+                print(f"Progress: {completed}/{total}...", end='\r')
+
+    print()
+    metrics.count(f"fetch.errors.{label}", len(errors))
+    report_errors(errors, total, label)
+    return results, errors
+
+
+def report_errors(errors, total, label="tickers"):
+    """Prints a short per-ticker summary of failed fetches."""
+    if not errors:
+        return
+    print(f"Failed to fetch {len(errors)}/{total} {label}:")
+    for ticker, message in sorted(errors.items())[:20]:
+        print(f"  {ticker}: {message}")
+    if len(errors) > 20:
+        print(f"  ... and {len(errors) - 20} more")
@@ -0,0 +1,89 @@
+"""
+fundamentals.py
+Compact per-ticker fundamentals record.
+
+A yfinance info dict has well over a hundred keys plus long text fields.
+Reports only read a couple of dozen of them, so the run keeps one slotted
+Fundamentals record per ticker instead. Records answer .get() with the
+original yfinance key names, so code written against info dicts keeps
+working; fields that were missing from the info dict stay unset and .get()
+returns the caller's default, exactly like dict.get().
+
+Business descriptions are not kept in memory: they are loaded on demand
+from the fundamentals cache.
+"""
+
+import cache
+
+# yfinance info key -> record attribute
+FIELDS = {
+    'returnOnEquity':           'roe',
+    'profitMargins':            'margin',
+    'revenueGrowth':            'rev_growth',
+    'debtToEquity':             'de',
+    'pegRatio':                 'peg_ratio',
+    'trailingPE':               'pe',
+    'earningsGrowth':           'eps_growth',
+    'freeCashflow':             'fcf',
+    'marketCap':                'market_cap',
+    'currentPrice':             'price',
+    'regularMarketPrice':       'market_price',
+    'previousClose':            'prev_close',
+    'fiftyTwoWeekHigh':         'high52',
+    'fiftyTwoWeekLow':          'low52',
+    '52WeekChange':             'change_52w',
+    'dividendYield':            'dividend_yield',
+    'priceToBook':              'pb',
+    'beta':                     'beta',
+    'totalAssets':              'total_assets',
+    'annualReportExpenseRatio': 'expense_ratio',
+    'sector':                   'sector',
+    'industry':                 'industry',
+    'longName':                 'long_name',
+    'shortName':                'short_name',
+}
+
+DESCRIPTION_KEY = 'longBusinessSummary'
+
+
+class Fundamentals:
+    """Slotted record holding the fields of an info dict that reports read."""
+
+    __slots__ = ('ticker',) + tuple(FIELDS.values())
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+
+    @classmethod
+    def from_info(cls, ticker, info):
+        """Builds a record from a yfinance info dict (None for an empty one)."""
+        if not info:
+            return None
+        record = cls(ticker)
+        for key, attr in FIELDS.items():
+            if key in info:
+                setattr(record, attr, info[key])
+        return record
+
+    def get(self, key, default=None):
+        """dict.get() with yfinance key names."""
+        if key == DESCRIPTION_KEY:
+            description = get_description(self.ticker)
+            return description if description is not None else default
+        attr = FIELDS.get(key)
+        if attr is None:
+            return default
+        return getattr(self, attr, default)
+
+    def keys(self):
+        """dict.keys() with yfinance key names: the fields present in the info dict."""
+        return [key for key, attr in FIELDS.items() if hasattr(self, attr)]
+
+    def __repr__(self):
+        return f"Fundamentals({self.ticker!r})"
+
+
+def get_description(ticker):
+    """Loads a ticker's business description from the fundamentals cache."""
+    info = cache.get_fundamentals(ticker, ttl=float('inf'))
+    return info.get(DESCRIPTION_KEY) if info else None
@@ -69,9 +69,9 @@ def main():
     print("\nTop 5 Candidates:")
     for i, stock in enumerate(ranked_stocks[:5]):
         print(f"{i+1}. {stock['ticker']} (Score: {stock['score']}, PEG: {stock['metrics']['peg']})")
-import sqlite3
 import os
-import matplotlib.pyplot as plt
+import sys
+import traceback
 from datetime import datetime
 from jinja2 import Environment, FileSystemLoader
 import fetch_data
@@ -79,79 +79,55 @@ import fetch_guru
 import fetch_competitors
 import performance
 import analyze
+import planner
+import db
+import snapshots
+import metrics
+import charts
+import delta
+import strategies
 
 # Get the absolute path of the directory where this script is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(BASE_DIR, 'stocks.db')
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+# Score the SP500 / NON_SP500 picks against GICS peers ('sector' or
+# 'industry') instead of the absolute QGARP thresholds; unset = absolute
+RELATIVE_SCORING = os.environ.get('RELATIVE_SCORING') or None
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Add description column if not exists (migration hack for demo)
-    try:
-        c.execute("ALTER TABLE picks ADD COLUMN description text")
-    except sqlite3.OperationalError:
-        pass # Column likely exists
-
-    # Add pe column if not exists (migration hack for demo)
-    try:
-        c.execute("ALTER TABLE picks ADD COLUMN pe real")
-    except sqlite3.OperationalError:
-        pass # Column likely exists
-
-    # Add universe column if not exists (migration hack for demo)
-    try:
-        c.execute("ALTER TABLE picks ADD COLUMN universe text")
-    except sqlite3.OperationalError:
-        pass # Column likely exists
-
-    # Add dividend_yield column if not exists (migration hack for demo)
-    try:
-        c.execute("ALTER TABLE picks ADD COLUMN dividend_yield real")
-    except sqlite3.OperationalError:
-        pass # Column likely exists
-        
-    c.execute('''CREATE TABLE IF NOT EXISTS picks
-                 (date text, ticker text, score integer, peg real, details text, description text, pe real, universe text, dividend_yield real)''')
-    conn.commit()
-    return conn
+    # Opens stocks.db and applies any pending schema migrations (see db.py)
+    return db.connect(DB_PATH)
 
+@metrics.timed('db_write')
 def save_to_db(conn, picks, universe):
-    c = conn.cursor()
     date_str = datetime.now().strftime("%Y-%m-%d")
-    
-    # Clear existing picks for today/universe to avoid duplicates/stale data
-    # We do this once before inserting the new batch
-    c.execute("SELECT * FROM picks WHERE date = ? AND universe = ?", (date_str, universe))
-    if c.fetchone():
-        print(f"Clearing existing picks for today ({universe})...")
-        c.execute("DELETE FROM picks WHERE date = ? AND universe = ?", (date_str, universe))
-    
+
+    rows = []
     for pick in picks:
         # Handle missing description
         desc = pick.get('description', 'No description available.')
         pe = pick['metrics'].get('pe')
         dividend_yield = pick['metrics'].get('dividend_yield')
-        
-        c.execute("INSERT INTO picks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                  (date_str, pick['ticker'], pick['score'], pick['metrics']['peg'], str(pick['details']), desc, pe, universe, dividend_yield))
-    conn.commit()
+        # Metrics go in typed columns; details are rebuilt from them when rendering
+        metric_values = tuple(pick['metrics'].get(column) for column in db.METRIC_COLUMNS)
+        rows.append((date_str, pick['ticker'], pick['score'], pick['metrics']['peg'], None,
+                     desc, pe, universe, dividend_yield) + metric_values)
+
+    # One transaction: upsert today's picks and drop any stale ones for the universe
+    db.write_picks(conn, date_str, universe, rows)
 
 def get_history(conn, universe):
     c = conn.cursor()
-    # Handle backward compatibility where universe might be NULL (assume SP500)
-    if universe == 'SP500':
-        c.execute("SELECT * FROM picks WHERE universe = ? OR universe IS NULL ORDER BY date DESC LIMIT 30", (universe,))
-    else:
-        c.execute("SELECT * FROM picks WHERE universe = ? ORDER BY date DESC LIMIT 30", (universe,))
+    # Served by the (universe, date) index; legacy NULL-universe rows were backfilled as SP500
+    c.execute("SELECT * FROM picks WHERE universe = ? ORDER BY date DESC LIMIT 30", (universe,))
         
     rows = c.fetchall()
     history = []
     for row in rows:
-        # Handle potentially missing description/pe/dividend_yield in old rows if schema changed
-        # Row: date, ticker, score, peg, details, description, pe, universe, dividend_yield
-        desc = row[5] if len(row) > 5 else "N/A"
+        # Handle potentially missing pe/dividend_yield in old rows if schema changed
+        # Row: date, ticker, score, peg, details, description, pe, universe, dividend_yield, <db.METRIC_COLUMNS>, description_hash
+        # (descriptions live in the descriptions table, see db.py)
         pe = row[6] if len(row) > 6 else None
         dividend_yield = row[8] if len(row) > 8 else None
         
@@ -171,18 +147,11 @@ def generate_chart(ticker, history_data, filename):
         return False
     
     chart_path = os.path.join(BASE_DIR, filename)
-    plt.figure(figsize=(10, 5))
-    plt.plot(history_data.index, history_data['Close'], label='Close Price')
-    plt.title(f"{ticker} - 5 Year Price History")
-    plt.xlabel("Date")
-    plt.ylabel("Price (USD)")
-    plt.grid(True)
-    plt.legend()
-    plt.savefig(chart_path)
-    plt.close()
-    print(f"Generated {chart_path}")
+    dates, closes = charts.price_series(history_data)
+    charts.render([('price', chart_path, {'ticker': ticker, 'dates': dates, 'closes': closes})])
     return True
 
+@metrics.timed('render')
 def generate_html(top_stocks, history, filename, title):
     env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
     template = env.get_template('index.html')
@@ -219,9 +188,10 @@ def generate_html(top_stocks, history, filename, title):
                 'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
                 'industry': industry,
                 'sector': sector,
-                'details': stock['details'],
+                'details': stock.get('details') or analyze.format_details(stock['metrics']),
                 'description': stock.get('description', 'No description available.'),
                 'chart_filename': stock.get('chart_filename'),
+                'chart_svg': stock.get('chart_svg'),
                 'competitors': formatted_competitors
             })
 
@@ -237,54 +207,245 @@ def generate_html(top_stocks, history, filename, title):
         f.write(html_content)
     print(f"Generated {output_path}")
 
-def run_analysis(conn, universe_name, tickers, html_filename, title):
+def universe_tickers(tickers, comparison_groups=None):
+    """A report's tickers plus every ticker in its comparison groups."""
+    all_tickers = list(tickers)
+    for peers in (comparison_groups or {}).values():
+        all_tickers.extend(peers)
+    return list(dict.fromkeys(all_tickers))
+
+def prefetch_universe(tickers, comparison_groups=None, infos=None):
+    """
+    Returns a dict-like of ticker -> info for a report. Uses the run-wide
+    view from the planner when given, otherwise fetches the report's
+    tickers and comparison groups through the shared fetch engine.
+    """
+    if infos is not None:
+        return infos
+    return fetch_data.get_stock_data_many(universe_tickers(tickers, comparison_groups))
+
+def comparison_rows(ticker, peers, infos):
+    """The peer comparison table of a sector report card (the ticker first)."""
+    rows = []
+    for comp_ticker in [ticker] + peers:
+        c_info = infos.get(comp_ticker)
+        if c_info:
+            c_mc = c_info.get('marketCap')
+            c_pe = c_info.get('trailingPE')
+            c_roe = c_info.get('returnOnEquity')
+            c_margin = c_info.get('profitMargins')
+            c_growth = c_info.get('revenueGrowth')
+            rows.append({
+                'ticker': comp_ticker,
+                'market_cap': f"${c_mc/1e9:.1f}B" if c_mc else "N/A",
+                'pe': f"{c_pe:.2f}" if c_pe else "N/A",
+                'roe': f"{c_roe:.2%}" if c_roe else "N/A",
+                'margin': f"{c_margin:.2%}" if c_margin else "N/A",
+                'growth': f"{c_growth:.2%}" if c_growth else "N/A",
+                'is_current': comp_ticker == ticker
+            })
+    return rows
+
+def card_fields(ticker, info):
+    """The fundamentals part of a sector report card (cached, see delta.py)."""
+    roe = info.get('returnOnEquity')
+    margin = info.get('profitMargins')
+    rev_growth = info.get('revenueGrowth')
+    de = info.get('debtToEquity')
+    return {
+        'ticker': ticker,
+        'name': info.get('longName', ticker),
+        'roe': f"{roe:.2%}" if roe else "N/A",
+        'roe_val': roe if roe else -999,
+        'margin': f"{margin:.2%}" if margin else "N/A",
+        'margin_val': margin if margin else -999,
+        'growth': f"{rev_growth:.2%}" if rev_growth else "N/A",
+        'growth_val': rev_growth if rev_growth else -999,
+        'de': de if de is not None else "N/A",
+        'de_val': de if de is not None else 9999,
+        'description': info.get('longBusinessSummary', 'No description available.'),
+    }
+
+def price_fields(info, peg, currency='$'):
+    """The price-dependent cells of a sector report card (rebuilt every run)."""
+    pe = info.get('trailingPE')
+    market_cap = info.get('marketCap')
+    dividend_yield = info.get('dividendYield')
+    return {
+        'peg': f"{peg:.2f}" if peg else "N/A",
+        'peg_val': peg if peg else 9999,
+        'pe': f"{pe:.2f}" if pe else "N/A",
+        'pe_val': pe if pe else 9999,
+        'market_cap': f"{currency}{market_cap/1e9:.1f}B" if market_cap else "N/A",
+        'market_cap_val': market_cap if market_cap else 0,
+        'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
+    }
+
+def sector_rows(tickers, infos, strategy, comparison_groups=None, sell_thresholds=None,
+                competitor_sector=None, currency='$', cards=None):
+    """
+    The cards of a sector report, best first under one of the strategies
+    in strategies.STRATEGIES. The report's tickers are scored once and
+    every strategy is evaluated on that frame in one pass; each card lists
+    its score under all of them. `tickers` may map ticker -> extra card
+    fields (subsector). Industry peers are looked up when
+    competitor_sector (the fallback sector) is given.
+
+    `cards` are the fundamentals parts of the cards from an earlier run
+    (see delta.py); only the cards missing from them are rebuilt.
+    Returns (rows, cards).
+    """
+    scored = analyze.score_frame(analyze.build_frame([(t, infos.get(t)) for t in tickers]))
+    if scored.empty:
+        return [], {}
+    ranked = strategies.evaluate(scored)
+    scores = {name: dict(zip(frame['ticker'], frame['score'])) for name, frame in ranked.items()}
+    pegs = dict(zip(scored['ticker'], scored['peg']))
+    cached = cards or {}
+
+    rows, cards = [], {}
+    for ticker in ranked[strategy]['ticker']:
+        try:
+            info = infos.get(ticker)
+            card = cached.get(ticker)
+            if card is None:
+                card = card_fields(ticker, info)
+                if isinstance(tickers, dict):
+                    card.update(tickers[ticker])
+                if competitor_sector:
+                    card['competitors'] = fetch_competitors.get_industry_peers(
+                        ticker, info.get('sector', competitor_sector), info.get('industry', ''))
+                if sell_thresholds:
+                    card['sell_threshold'] = sell_thresholds.get(ticker)
+            cards[ticker] = card
+
+            row = dict(card)
+            row.update(price_fields(info, analyze.nan_to_none(pegs[ticker]), currency))
+            if comparison_groups:
+                peers = comparison_groups.get(ticker)
+                row['comparison_table'] = comparison_rows(ticker, peers, infos) if peers else []
+            row['strategy_scores'] = [
+                f"{strategies.STRATEGIES[name]['label']} {scores[name][ticker]}/{len(strategies.STRATEGIES[name]['criteria'])}"
+                for name in ranked]
+            rows.append(row)
+        except Exception as e:
+            print(f"Error processing {ticker}: {e}")
+    return rows, cards
+
+def render_sector_page(template_name, html_filename, title, rows):
+    """Renders a sector report page and returns its path."""
+    with metrics.span('render'):
+        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+        template = env.get_template(template_name)
+
+        date_str = datetime.now().strftime("%Y-%m-%d")
+        output_path = os.path.join(BASE_DIR, html_filename)
+
+        html_content = template.render(
+            date=date_str,
+            stocks=rows,
+            title=title,
+            current_page=html_filename
+        )
+
+        with open(output_path, 'w') as f:
+            f.write(html_content)
+        print(f"\nGenerated {output_path}")
+    return output_path
+
+def run_sector_report(html_filename, title, template_name, tickers, strategy, infos=None,
+                      comparison_groups=None, **options):
+    """
+    Builds one sector report (see sector_rows for the options). The cards'
+    fundamentals part is reused from the last build while the fundamentals
+    behind it are unchanged; prices, the order and the date are always
+    refreshed.
+    """
+    infos = prefetch_universe(tickers, comparison_groups, infos)
+    output_path = os.path.join(BASE_DIR, html_filename)
+    fingerprint = delta.fingerprint(template_name, list(tickers), infos)
+    cards = delta.cached_cards(output_path, fingerprint)
+    if cards is not None:
+        print(f"Fundamentals unchanged, reusing the cards of {output_path}")
+
+    rows, cards = sector_rows(tickers, infos, strategy, comparison_groups, cards=cards, **options)
+    render_sector_page(template_name, html_filename, title, rows)
+    delta.record(output_path, fingerprint, cards)
+
+def run_analysis(conn, universe_name, tickers, html_filename, title, infos=None):
     print(f"Starting Analysis for {universe_name}...")
     
-    stocks_data = []
-    
-    for ticker in tickers:
-        try:
-            info = fetch_data.get_stock_data(ticker)
-            if info:
-                stocks_data.append((ticker, info))
-        except:
-            pass
-            
-    ranked_stocks = analyze.rank_stocks(stocks_data)
+    # Score each info dict as soon as it is available, keeping only the top 5
+    # (every scored batch is kept for the daily snapshot)
+    scored_batches = []
+    ranker = analyze.TopKRanker(k=5, on_scored=scored_batches.append)
+    if RELATIVE_SCORING:
+        # Percentiles need the whole universe, so it is fetched and scored at once
+        infos = prefetch_universe(tickers, infos=infos)
+        with metrics.span('score'):
+            stocks_data = [(t, infos.get(t)) for t in dict.fromkeys(tickers)]
+            scored_batches.append(analyze.score_frame(analyze.build_frame(stocks_data)))
+            ranked_stocks = analyze.rank_stocks(stocks_data, top=5, relative_to=RELATIVE_SCORING,
+                                                groups=fetch_data.get_gics_classification())
+    elif infos is not None:
+        with metrics.span('score'):
+            for seq, ticker in enumerate(tickers):
+                ranker.push(ticker, infos.get(ticker), seq)
+            ranked_stocks = ranker.results()
+    else:
+        # Fetching and scoring overlap here, so they are timed together
+        positions = {}
+        for seq, ticker in enumerate(tickers):
+            positions.setdefault(ticker, seq)
+        with metrics.span('fetch_score'):
+            fetch_data.stream_stock_data(tickers, lambda t, info: ranker.push(t, info, positions[t]))
+            ranked_stocks = ranker.results()
+
+    if scored_batches:
+        with metrics.span('snapshot'):
+            delta.report_changes(universe_name, scored_batches)
+            snapshots.save(universe_name, scored_batches)
     
     top_stocks = []
     if ranked_stocks:
         # Select Top 5
         top_5 = ranked_stocks[:5]
         print(f"Top 5 Picks ({universe_name}): {[s['ticker'] for s in top_5]}")
+        histories = fetch_data.get_histories([s['ticker'] for s in top_5])
         
-        for stock in top_5:
-            print(f"Processing {stock['ticker']}...")
-            # Fetch additional info
-            hist = fetch_data.get_stock_history(stock['ticker'])
-            chart_filename = f"chart_{universe_name}_{stock['ticker']}.png"
-            generate_chart(stock['ticker'], hist, chart_filename)
-            stock['chart_filename'] = chart_filename
-            
-            # Find info in stocks_data
-            pick_info = next((info for t, info in stocks_data if t == stock['ticker']), None)
-            if pick_info:
-                stock['description'] = pick_info.get('longBusinessSummary', 'No description.')
-            
-            # Get competitors and comparison
-            sector = stock['metrics'].get('sector', '')
-            industry = stock['metrics'].get('industry', '')
-            peer_tickers = fetch_competitors.get_industry_peers(stock['ticker'], sector, industry)
+        # Charts are rendered together, in parallel, once the loop is done
+        with charts.batch():
+            for stock in top_5:
+                print(f"Processing {stock['ticker']}...")
+                # Fetch additional info
+                hist = fetch_data.history_view(histories, stock['ticker'])
+                if charts.MODE == 'svg':
+                    stock['chart_svg'] = charts.svg_line(*charts.price_series(hist), f"{stock['ticker']} - 5 Year Price History") if not hist.empty else None
+                else:
+                    chart_filename = charts.chart_file(f"chart_{universe_name}_{stock['ticker']}.png")
+                    generate_chart(stock['ticker'], hist, chart_filename)
+                    stock['chart_filename'] = chart_filename
             
-            if peer_tickers:
-                # Include the current stock in comparison
-                all_tickers = [stock['ticker']] + peer_tickers
-                comparison = fetch_competitors.compare_stocks(all_tickers)
-                stock['competitors'] = comparison
-            else:
-                stock['competitors'] = []
+                with metrics.span('enrich'):
+                    # Description is loaded on demand for the picks only
+                    pick_info = infos.get(stock['ticker']) if infos is not None else fetch_data.get_stock_data(stock['ticker'])
+                    if pick_info:
+                        stock['description'] = pick_info.get('longBusinessSummary', 'No description.')
+
+                    # Get competitors and comparison
+                    sector = stock['metrics'].get('sector', '')
+                    industry = stock['metrics'].get('industry', '')
+                    peer_tickers = fetch_competitors.get_industry_peers(stock['ticker'], sector, industry)
+
+                    if peer_tickers:
+                        # Include the current stock in comparison
+                        all_tickers = [stock['ticker']] + peer_tickers
+                        comparison = fetch_competitors.compare_stocks(all_tickers)
+                        stock['competitors'] = comparison
+                    else:
+                        stock['competitors'] = []
             
-            top_stocks.append(stock)
+                top_stocks.append(stock)
         
         save_to_db(conn, top_stocks, universe_name)
     else:
@@ -301,40 +462,14 @@ import fetch_china_data
 
 def generate_guru_chart(equity_val, cash_val, filename):
     chart_path = os.path.join(BASE_DIR, filename)
-    
-    labels = ['Equity Portfolio', 'Cash & Equivalents']
-    sizes = [equity_val, cash_val]
-    colors = ['#3498db', '#2ecc71']
-    explode = (0.1, 0)  # explode 1st slice
-    
-    plt.figure(figsize=(8, 6))
-    plt.pie(sizes, explode=explode, labels=labels, colors=colors,
-            autopct='%1.1f%%', shadow=True, startangle=140)
-    plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-    plt.title("Berkshire Hathaway Asset Allocation")
-    plt.savefig(chart_path)
-    plt.close()
-    print(f"Generated {chart_path}")
+    charts.render([('allocation', chart_path, {'equity': equity_val, 'cash': cash_val})])
 
 def generate_cash_trend_chart(history, filename):
     chart_path = os.path.join(BASE_DIR, filename)
     
     dates = [h['date'] for h in history]
     pcts = [h['cash_pct'] for h in history]
-    
-    plt.figure(figsize=(10, 6))
-    plt.plot(dates, pcts, marker='o', linestyle='-', color='#2ecc71', linewidth=2)
-    
-    plt.title("Berkshire Hathaway Cash Allocation Trend")
-    plt.ylabel("Cash % of Total Assets")
-    plt.grid(True, linestyle='--', alpha=0.7)
-    
-    # Format x-axis dates
-    plt.gcf().autofmt_xdate()
-    
-    plt.savefig(chart_path)
-    plt.close()
-    print(f"Generated {chart_path}")
+    charts.render([('cash_trend', chart_path, {'dates': dates, 'pcts': pcts})])
 
 def run_guru_analysis(html_filename):
     print("Starting Guru Analysis...")
@@ -347,361 +482,138 @@ def run_guru_analysis(html_filename):
     
     guru_data = []
     
-    for guru in gurus:
-        print(f"Processing {guru['name']}...")
+    # Charts are rendered together, in parallel, once every guru is processed
+    with charts.batch():
+        for guru in gurus:
+            print(f"Processing {guru['name']}...")
         
-        # 1. Fetch Holdings
-        holdings = fetch_guru.get_dataroma_holdings(guru['code'])
+            # 1. Fetch Holdings
+            holdings = fetch_guru.get_dataroma_holdings(guru['code'])
         
-        # 2. Fetch Cash (if ticker exists)
-        cash = fetch_guru.get_cash_position(guru['ticker'])
+            # 2. Fetch Cash (if ticker exists)
+            cash = fetch_guru.get_cash_position(guru['ticker'])
         
-        # Calculate totals
-        total_equity = sum(h['value'] for h in holdings)
-        total_assets = total_equity + cash
+            # Calculate totals
+            total_equity = sum(h['value'] for h in holdings)
+            total_assets = total_equity + cash
         
-        perf_chart_filename = None
-        cash_trend_filename = None
+            perf_chart_filename = None
+            cash_trend_filename = None
         
-        if guru['code'] == 'BRK':
-            # Generate SPY vs BRK comparison chart
-            print("Generating SPY vs BRK performance chart...")
-            spy_returns = performance.get_yearly_returns('SPY', period="max")
-            brk_returns = performance.get_yearly_returns('BRK-B', period="max")
-            perf_chart_filename = "chart_performance_BRK_vs_SPY.png"
-            performance.generate_comparison_chart(spy_returns, brk_returns, os.path.join(BASE_DIR, perf_chart_filename))
+            if guru['code'] == 'BRK':
+                # Generate SPY vs BRK comparison chart
+                print("Generating SPY vs BRK performance chart...")
+                fetch_data.get_histories(['SPY', 'BRK-B'], period="max")
+                spy_returns = performance.get_yearly_returns('SPY', period="max")
+                brk_returns = performance.get_yearly_returns('BRK-B', period="max")
+                perf_chart_filename = charts.chart_file("chart_performance_BRK_vs_SPY.png")
+                performance.generate_comparison_chart(spy_returns, brk_returns, os.path.join(BASE_DIR, perf_chart_filename))
             
-            # Generate Cash Trend Chart
-            print("Generating Cash Trend chart...")
-            history = fetch_guru.get_cash_history(guru['ticker'])
-            if history:
-                cash_trend_filename = "chart_cash_trend_BRK.png"
-                generate_cash_trend_chart(history, cash_trend_filename)
+                # Generate Cash Trend Chart
+                print("Generating Cash Trend chart...")
+                history = fetch_guru.get_cash_history(guru['ticker'])
+                if history:
+                    cash_trend_filename = charts.chart_file("chart_cash_trend_BRK.png")
+                    generate_cash_trend_chart(history, cash_trend_filename)
         
-        cash_pct = (cash / total_assets * 100) if total_assets > 0 else 0
+            cash_pct = (cash / total_assets * 100) if total_assets > 0 else 0
         
-        # Generate Chart (only if cash > 0)
-        chart_filename = None
-        if cash > 0:
-            chart_filename = f"chart_guru_{guru['code']}.png"
-            generate_guru_chart(total_equity, cash, chart_filename)
+            # Generate Chart (only if cash > 0)
+            chart_filename = None
+            if cash > 0:
+                chart_filename = charts.chart_file(f"chart_guru_{guru['code']}.png")
+                generate_guru_chart(total_equity, cash, chart_filename)
             
-        # Format values
-        formatted_holdings = []
-        for h in holdings:
-            h['formatted_value'] = f"${h['value']:,.0f}"
-            formatted_holdings.append(h)
+            # Format values
+            formatted_holdings = []
+            for h in holdings:
+                h['formatted_value'] = f"${h['value']:,.0f}"
+                formatted_holdings.append(h)
             
-        guru_entry = {
-            'name': guru['name'],
-            'holdings': formatted_holdings,
-            'total_equity': f"{total_equity/1e9:.1f}",
-            'total_cash': f"{cash/1e9:.1f}" if cash > 0 else "N/A",
-            'cash_pct': f"{cash_pct:.1f}" if cash > 0 else "N/A",
-            'chart_filename': chart_filename,
-            'performance_chart': perf_chart_filename,
-            'cash_trend_chart': cash_trend_filename,
-            'has_cash': cash > 0
-        }
-        guru_data.append(guru_entry)
+            guru_entry = {
+                'name': guru['name'],
+                'holdings': formatted_holdings,
+                'total_equity': f"{total_equity/1e9:.1f}",
+                'total_cash': f"{cash/1e9:.1f}" if cash > 0 else "N/A",
+                'cash_pct': f"{cash_pct:.1f}" if cash > 0 else "N/A",
+                'chart_filename': chart_filename,
+                'performance_chart': perf_chart_filename,
+                'cash_trend_chart': cash_trend_filename,
+                'has_cash': cash > 0
+            }
+            guru_data.append(guru_entry)
     
     # Generate HTML
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('guru.html')
-    
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
-        
-    html_content = template.render(
-        date=date_str,
-        gurus=guru_data,
-        current_page=html_filename
-    )
-    
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"Generated {output_path}")
+    with metrics.span('render'):
+        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+        template = env.get_template('guru.html')
 
-def run_consumer_staples_analysis(html_filename, title):
-    print("Starting Consumer Staples Analysis...")
-    
-    # 1. Get S&P 500 tickers with sectors
+        date_str = datetime.now().strftime("%Y-%m-%d")
+        output_path = os.path.join(BASE_DIR, html_filename)
+
+        html_content = template.render(
+            date=date_str,
+            gurus=guru_data,
+            current_page=html_filename
+        )
+
+        with open(output_path, 'w') as f:
+            f.write(html_content)
+        print(f"Generated {output_path}")
+
+def get_staples_tickers():
+    """S&P 500 tickers in the Consumer Staples sector."""
     all_stocks = fetch_data.get_sp500_tickers_with_sector()
-    
-    # 2. Filter for Consumer Staples
-    staples_tickers = [s['ticker'] for s in all_stocks if s['sector'] == 'Consumer Staples']
+    return [s['ticker'] for s in all_stocks if s['sector'] == 'Consumer Staples']
+
+def run_consumer_staples_analysis(html_filename, title, infos=None):
+    print("Starting Consumer Staples Analysis...")
+
+    # S&P 500 tickers filtered for Consumer Staples
+    staples_tickers = get_staples_tickers()
     print(f"Found {len(staples_tickers)} Consumer Staples stocks.")
-    
-    staples_data = []
-    
-    for ticker in staples_tickers:
-        print(f"Fetching data for {ticker}...", end='\r')
-        try:
-            info = fetch_data.get_stock_data(ticker)
-            if info:
-                # Extract metrics
-                roe = info.get('returnOnEquity')
-                margin = info.get('profitMargins')
-                rev_growth = info.get('revenueGrowth')
-                de = info.get('debtToEquity')
-                peg = info.get('pegRatio')
-                
-                # Fallback PEG calculation
-                if peg is None:
-                    pe = info.get('trailingPE')
-                    growth = info.get('earningsGrowth')
-                    if pe and growth and growth > 0:
-                        peg = pe / (growth * 100)
-                
-                # Fetch competitors
-                sector = info.get('sector', 'Consumer Staples')
-                industry = info.get('industry', '')
-                competitors = fetch_competitors.get_industry_peers(ticker, sector, industry)
-                
-                # Get additional info
-                market_cap = info.get('marketCap')
-                dividend_yield = info.get('dividendYield')
-                description = info.get('longBusinessSummary', 'No description available.')
-                
-                staples_data.append({
-                    'ticker': ticker,
-                    'name': info.get('longName', ticker),
-                    'roe': f"{roe:.2%}" if roe else "N/A",
-                    'roe_val': roe if roe else -999,
-                    'margin': f"{margin:.2%}" if margin else "N/A",
-                    'margin_val': margin if margin else -999,
-                    'growth': f"{rev_growth:.2%}" if rev_growth else "N/A",
-                    'growth_val': rev_growth if rev_growth else -999,
-                    'de': de if de is not None else "N/A",
-                    'de_val': de if de is not None else 9999,
-                    'peg': f"{peg:.2f}" if peg else "N/A",
-                    'peg_val': peg if peg else 9999,
-                    'competitors': competitors,
-                    'market_cap': f"${market_cap/1e9:.1f}B" if market_cap else "N/A",
-                    'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
-                    'description': description
-                })
-        except Exception as e:
-            print(f"Error processing {ticker}: {e}")
-            
-    # Sort by ROE descending
-    staples_data.sort(key=lambda x: x['roe_val'], reverse=True)
-    
-    # Generate HTML
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('consumer_staples.html')
-    
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
-    
-    html_content = template.render(
-        date=date_str,
-        stocks=staples_data,
-        title=title,
-        current_page=html_filename
-    )
-    
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"\nGenerated {output_path}")
 
+    run_sector_report(html_filename, title, 'consumer_staples.html', staples_tickers, 'dividend_quality',
+                      infos, competitor_sector='Consumer Staples')
 
-def run_tech_analysis(html_filename, title):
-    print("Starting Technology Sector Analysis...")
-    
-    # 1. Get S&P 500 tickers with sectors
+# Custom comparison groups for the tech report
+TECH_COMPARISON_GROUPS = {
+    'NVDA': ['AMD', 'INTC', 'QCOM', 'AVGO'],
+    'AAPL': ['MSFT', 'GOOGL', 'META', 'NVDA']
+}
+
+def get_tech_tickers():
+    """S&P 500 tickers in the Technology / Information Technology sector."""
     all_stocks = fetch_data.get_sp500_tickers_with_sector()
-    
-    # 2. Filter for Technology / Information Technology
-    tech_tickers = [s['ticker'] for s in all_stocks if 'Technology' in s['sector'] or s['sector'] == 'Information Technology']
+    return [s['ticker'] for s in all_stocks if 'Technology' in s['sector'] or s['sector'] == 'Information Technology']
+
+def run_tech_analysis(html_filename, title, infos=None):
+    print("Starting Technology Sector Analysis...")
+
+    # S&P 500 tickers filtered for Technology / Information Technology
+    tech_tickers = get_tech_tickers()
     print(f"Found {len(tech_tickers)} Technology stocks.")
-    
-    tech_data = []
-    
-    for ticker in tech_tickers:
-        print(f"Fetching data for {ticker}...", end='\r')
-        try:
-            info = fetch_data.get_stock_data(ticker)
-            if info:
-                # Extract metrics
-                roe = info.get('returnOnEquity')
-                margin = info.get('profitMargins')
-                rev_growth = info.get('revenueGrowth')
-                de = info.get('debtToEquity')
-                peg = info.get('pegRatio')
-                pe = info.get('trailingPE')
-                
-                # Fallback PEG calculation
-                if peg is None:
-                    growth = info.get('earningsGrowth')
-                    if pe and growth and growth > 0:
-                        peg = pe / (growth * 100)
-                
-                # Fetch competitors
-                sector = info.get('sector', 'Technology')
-                industry = info.get('industry', '')
-                competitors = fetch_competitors.get_industry_peers(ticker, sector, industry)
-                
-                # Get additional info
-                market_cap = info.get('marketCap')
-                dividend_yield = info.get('dividendYield')
-                description = info.get('longBusinessSummary', 'No description available.')
-                
-                # Custom Comparison Logic
-                comparison_table = []
-                CUSTOM_COMPETITORS = {
-                    'NVDA': ['AMD', 'INTC', 'QCOM', 'AVGO'],
-                    'AAPL': ['MSFT', 'GOOGL', 'META', 'NVDA']
-                }
-                
-                if ticker in CUSTOM_COMPETITORS:
-                    print(f"  Fetching comparison data for {ticker}...")
-                    comp_tickers = [ticker] + CUSTOM_COMPETITORS[ticker]
-                    for comp_ticker in comp_tickers:
-                        try:
-                            # Optimization: If it's self, use already fetched info
-                            if comp_ticker == ticker:
-                                c_info = info
-                            else:
-                                c_info = fetch_data.get_stock_data(comp_ticker)
-                            
-                            if c_info:
-                                c_mc = c_info.get('marketCap')
-                                c_pe = c_info.get('trailingPE')
-                                c_roe = c_info.get('returnOnEquity')
-                                c_margin = c_info.get('profitMargins')
-                                c_growth = c_info.get('revenueGrowth')
-                                
-                                comparison_table.append({
-                                    'ticker': comp_ticker,
-                                    'market_cap': f"${c_mc/1e9:.1f}B" if c_mc else "N/A",
-                                    'pe': f"{c_pe:.2f}" if c_pe else "N/A",
-                                    'roe': f"{c_roe:.2%}" if c_roe else "N/A",
-                                    'margin': f"{c_margin:.2%}" if c_margin else "N/A",
-                                    'growth': f"{c_growth:.2%}" if c_growth else "N/A",
-                                    'is_current': comp_ticker == ticker
-                                })
-                        except Exception as e:
-                            print(f"Error fetching comparison for {comp_ticker}: {e}")
-
-                
-                tech_data.append({
-                    'ticker': ticker,
-                    'name': info.get('longName', ticker),
-                    'roe': f"{roe:.2%}" if roe else "N/A",
-                    'roe_val': roe if roe else -999,
-                    'margin': f"{margin:.2%}" if margin else "N/A",
-                    'margin_val': margin if margin else -999,
-                    'growth': f"{rev_growth:.2%}" if rev_growth else "N/A",
-                    'growth_val': rev_growth if rev_growth else -999,
-                    'de': de if de is not None else "N/A",
-                    'de_val': de if de is not None else 9999,
-                    'peg': f"{peg:.2f}" if peg else "N/A",
-                    'peg_val': peg if peg else 9999,
-                    'pe': f"{pe:.2f}" if pe else "N/A",
-                    'pe_val': pe if pe else 9999,
-                    'competitors': competitors,
-                    'market_cap': f"${market_cap/1e9:.1f}B" if market_cap else "N/A",
-                    'market_cap_val': market_cap if market_cap else 0,
-                    'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
-                    'description': description,
-                    'comparison_table': comparison_table
-                })
-        except Exception as e:
-            print(f"Error processing {ticker}: {e}")
-            
-    # Sort by market cap descending
-    tech_data.sort(key=lambda x: x['market_cap_val'], reverse=True)
-    
-    # Generate HTML
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('tech.html')
-    
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
-    
-    html_content = template.render(
-        date=date_str,
-        stocks=tech_data,
-        title=title,
-        current_page=html_filename
-    )
-    
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"\nGenerated {output_path}")
 
-def run_china_analysis(html_filename, title):
+    run_sector_report(html_filename, title, 'tech.html', tech_tickers, 'qgarp', infos,
+                      TECH_COMPARISON_GROUPS, competitor_sector='Technology')
+
+def run_china_analysis(html_filename, title, infos=None):
     print("Starting China Market Analysis...")
     
     # 1. Get China tickers
     tickers = fetch_china_data.get_china_tickers()
     print(f"Found {len(tickers)} China stocks.")
     
-    china_data = []
-    
-    for ticker in tickers:
-        print(f"Fetching data for {ticker}...", end='\r')
-        try:
-            info = fetch_china_data.get_stock_data(ticker)
-            if info:
-                # Extract metrics
-                roe = info.get('returnOnEquity')
-                margin = info.get('profitMargins')
-                rev_growth = info.get('revenueGrowth')
-                de = info.get('debtToEquity')
-                peg = info.get('pegRatio')
-                pe = info.get('trailingPE')
-                
-                # Market Cap (convert to Billions CNY)
-                market_cap = info.get('marketCap')
-                
-                # Dividend Yield
-                dividend_yield = info.get('dividendYield')
-                
-                # Get Chinese Info
-                cn_info = fetch_china_data.get_china_stock_info(ticker)
-                description = cn_info['desc']
-                name = cn_info['name']
-                
-                china_data.append({
-                    'ticker': ticker,
-                    'name': name,
-                    'roe': f"{roe:.2%}" if roe else "N/A",
-                    'roe_val': roe if roe else -999,
-                    'margin': f"{margin:.2%}" if margin else "N/A",
-                    'growth': f"{rev_growth:.2%}" if rev_growth else "N/A",
-                    'de': de if de is not None else "N/A",
-                    'pe': f"{pe:.2f}" if pe else "N/A",
-                    'market_cap': f"¥{market_cap/1e9:.1f}B" if market_cap else "N/A",
-                    'market_cap_val': market_cap if market_cap else 0,
-                    'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
-                    'description': description
-                })
-        except Exception as e:
-            print(f"Error processing {ticker}: {e}")
-            
-    # Sort by Market Cap descending
-    china_data.sort(key=lambda x: x['market_cap_val'], reverse=True)
-    
-    # Generate HTML
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('china.html')
-    
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
-    
-    html_content = template.render(
-        date=date_str,
-        stocks=china_data,
-        title=title,
-        current_page=html_filename
-    )
-    
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"\nGenerated {output_path}")
+    infos = prefetch_universe(tickers, infos=infos)
+    china_data, _ = sector_rows(tickers, infos, 'qgarp', currency='¥')
 
+    # Chinese names and descriptions
+    for row in china_data:
+        cn_info = fetch_china_data.get_china_stock_info(row['ticker'])
+        row['name'] = cn_info['name']
+        row['description'] = cn_info['desc']
+
+    render_sector_page('china.html', html_filename, title, china_data)
 
 # --- Curated Semiconductor Tickers with subsector classification ---
 SEMICONDUCTOR_TICKERS = {
@@ -742,102 +654,11 @@ SEMI_COMPARISON_GROUPS = {
     'MU':   ['NVDA', 'AMD', 'INTC', 'TSM'],
 }
 
-def run_semiconductor_analysis(html_filename, title):
+def run_semiconductor_analysis(html_filename, title, infos=None):
     print("Starting Semiconductor Sector Analysis...")
 
-    semi_data = []
-
-    for ticker, meta in SEMICONDUCTOR_TICKERS.items():
-        print(f"Fetching data for {ticker}...", end='\r')
-        try:
-            info = fetch_data.get_stock_data(ticker)
-            if info:
-                roe = info.get('returnOnEquity')
-                margin = info.get('profitMargins')
-                rev_growth = info.get('revenueGrowth')
-                de = info.get('debtToEquity')
-                peg = info.get('pegRatio')
-                pe = info.get('trailingPE')
-
-                if peg is None:
-                    growth = info.get('earningsGrowth')
-                    if pe and growth and growth > 0:
-                        peg = pe / (growth * 100)
-
-                market_cap = info.get('marketCap')
-                dividend_yield = info.get('dividendYield')
-                description = info.get('longBusinessSummary', 'No description available.')
-
-                # Build comparison table for key tickers
-                comparison_table = []
-                if ticker in SEMI_COMPARISON_GROUPS:
-                    comp_tickers = [ticker] + SEMI_COMPARISON_GROUPS[ticker]
-                    for comp_ticker in comp_tickers:
-                        try:
-                            c_info = info if comp_ticker == ticker else fetch_data.get_stock_data(comp_ticker)
-                            if c_info:
-                                c_mc = c_info.get('marketCap')
-                                c_pe = c_info.get('trailingPE')
-                                c_roe = c_info.get('returnOnEquity')
-                                c_margin = c_info.get('profitMargins')
-                                c_growth = c_info.get('revenueGrowth')
-                                comparison_table.append({
-                                    'ticker': comp_ticker,
-                                    'market_cap': f"${c_mc/1e9:.1f}B" if c_mc else "N/A",
-                                    'pe': f"{c_pe:.2f}" if c_pe else "N/A",
-                                    'roe': f"{c_roe:.2%}" if c_roe else "N/A",
-                                    'margin': f"{c_margin:.2%}" if c_margin else "N/A",
-                                    'growth': f"{c_growth:.2%}" if c_growth else "N/A",
-                                    'is_current': comp_ticker == ticker
-                                })
-                        except Exception as e:
-                            print(f"Error fetching comparison for {comp_ticker}: {e}")
-
-                semi_data.append({
-                    'ticker': ticker,
-                    'name': info.get('longName', ticker),
-                    'subsector': meta['subsector'],
-                    'subsector_class': meta['subsector_class'],
-                    'roe': f"{roe:.2%}" if roe else "N/A",
-                    'roe_val': roe if roe else -999,
-                    'margin': f"{margin:.2%}" if margin else "N/A",
-                    'margin_val': margin if margin else -999,
-                    'growth': f"{rev_growth:.2%}" if rev_growth else "N/A",
-                    'growth_val': rev_growth if rev_growth else -999,
-                    'de': de if de is not None else "N/A",
-                    'de_val': de if de is not None else 9999,
-                    'peg': f"{peg:.2f}" if peg else "N/A",
-                    'peg_val': peg if peg else 9999,
-                    'pe': f"{pe:.2f}" if pe else "N/A",
-                    'pe_val': pe if pe else 9999,
-                    'market_cap': f"${market_cap/1e9:.1f}B" if market_cap else "N/A",
-                    'market_cap_val': market_cap if market_cap else 0,
-                    'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
-                    'description': description,
-                    'comparison_table': comparison_table
-                })
-        except Exception as e:
-            print(f"Error processing {ticker}: {e}")
-
-    semi_data.sort(key=lambda x: x['market_cap_val'], reverse=True)
-
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('semiconductors.html')
-
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
-
-    html_content = template.render(
-        date=date_str,
-        stocks=semi_data,
-        title=title,
-        current_page=html_filename
-    )
-
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"\nGenerated {output_path}")
-
+    run_sector_report(html_filename, title, 'semiconductors.html', SEMICONDUCTOR_TICKERS, 'qgarp',
+                      infos, SEMI_COMPARISON_GROUPS)
 
 # --- Curated AI / LLM Tickers with subsector classification ---
 AI_TICKERS = {
@@ -909,101 +730,10 @@ AI_COMPARISON_GROUPS = {
     'TSLA':  ['ISRG', 'GOOGL', 'NVDA', 'META'],
 }
 
-def run_ai_analysis(html_filename, title):
+def run_ai_analysis(html_filename, title, infos=None):
     print("Starting AI & LLM Sector Analysis...")
 
-    ai_data = []
-
-    for ticker, meta in AI_TICKERS.items():
-        print(f"Fetching data for {ticker}...", end='\r')
-        try:
-            info = fetch_data.get_stock_data(ticker)
-            if info:
-                roe = info.get('returnOnEquity')
-                margin = info.get('profitMargins')
-                rev_growth = info.get('revenueGrowth')
-                de = info.get('debtToEquity')
-                peg = info.get('pegRatio')
-                pe = info.get('trailingPE')
-
-                if peg is None:
-                    growth = info.get('earningsGrowth')
-                    if pe and growth and growth > 0:
-                        peg = pe / (growth * 100)
-
-                market_cap = info.get('marketCap')
-                dividend_yield = info.get('dividendYield')
-                description = info.get('longBusinessSummary', 'No description available.')
-
-                comparison_table = []
-                if ticker in AI_COMPARISON_GROUPS:
-                    comp_tickers = [ticker] + AI_COMPARISON_GROUPS[ticker]
-                    for comp_ticker in comp_tickers:
-                        try:
-                            c_info = info if comp_ticker == ticker else fetch_data.get_stock_data(comp_ticker)
-                            if c_info:
-                                c_mc = c_info.get('marketCap')
-                                c_pe = c_info.get('trailingPE')
-                                c_roe = c_info.get('returnOnEquity')
-                                c_margin = c_info.get('profitMargins')
-                                c_growth = c_info.get('revenueGrowth')
-                                comparison_table.append({
-                                    'ticker': comp_ticker,
-                                    'market_cap': f"${c_mc/1e9:.1f}B" if c_mc else "N/A",
-                                    'pe': f"{c_pe:.2f}" if c_pe else "N/A",
-                                    'roe': f"{c_roe:.2%}" if c_roe else "N/A",
-                                    'margin': f"{c_margin:.2%}" if c_margin else "N/A",
-                                    'growth': f"{c_growth:.2%}" if c_growth else "N/A",
-                                    'is_current': comp_ticker == ticker
-                                })
-                        except Exception as e:
-                            print(f"Error fetching comparison for {comp_ticker}: {e}")
-
-                ai_data.append({
-                    'ticker': ticker,
-                    'name': info.get('longName', ticker),
-                    'subsector': meta['subsector'],
-                    'subsector_class': meta['subsector_class'],
-                    'roe': f"{roe:.2%}" if roe else "N/A",
-                    'roe_val': roe if roe else -999,
-                    'margin': f"{margin:.2%}" if margin else "N/A",
-                    'margin_val': margin if margin else -999,
-                    'growth': f"{rev_growth:.2%}" if rev_growth else "N/A",
-                    'growth_val': rev_growth if rev_growth else -999,
-                    'de': de if de is not None else "N/A",
-                    'de_val': de if de is not None else 9999,
-                    'peg': f"{peg:.2f}" if peg else "N/A",
-                    'peg_val': peg if peg else 9999,
-                    'pe': f"{pe:.2f}" if pe else "N/A",
-                    'pe_val': pe if pe else 9999,
-                    'market_cap': f"${market_cap/1e9:.1f}B" if market_cap else "N/A",
-                    'market_cap_val': market_cap if market_cap else 0,
-                    'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
-                    'description': description,
-                    'comparison_table': comparison_table
-                })
-        except Exception as e:
-            print(f"Error processing {ticker}: {e}")
-
-    ai_data.sort(key=lambda x: x['market_cap_val'], reverse=True)
-
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('ai.html')
-
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
-
-    html_content = template.render(
-        date=date_str,
-        stocks=ai_data,
-        title=title,
-        current_page=html_filename
-    )
-
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"\nGenerated {output_path}")
-
+    run_sector_report(html_filename, title, 'ai.html', AI_TICKERS, 'qgarp', infos, AI_COMPARISON_GROUPS)
 
 import fetch_energy_data
 
@@ -1062,25 +792,23 @@ def run_energy_analysis(html_filename, title):
 
     # Commodity sparkline charts (1-year history)
     commodity_charts = {}
+    chart_jobs = []
+    histories = fetch_data.get_histories([c['ticker'] for c in commodities if c['price'] is not None], period='1y')
     for c in commodities:
         if c['price'] is None:
             continue
-        hist = fetch_energy_data.get_commodity_history(c['ticker'], period='1y')
+        hist = fetch_data.history_view(histories, c['ticker'])
         if hist.empty:
             continue
-        chart_fn = f"chart_energy_commodity_{c['ticker'].replace('=', '')}.png"
-        chart_path = os.path.join(BASE_DIR, chart_fn)
-        plt.figure(figsize=(8, 3))
-        plt.plot(hist.index, hist['Close'], color='#e67e22', linewidth=1.5)
-        plt.title(f"{c['name']} – 1 Year")
-        plt.xlabel('Date')
-        plt.ylabel('Price')
-        plt.grid(True, linestyle='--', alpha=0.5)
-        plt.tight_layout()
-        plt.savefig(chart_path)
-        plt.close()
+        if charts.MODE == 'svg':
+            c['chart_svg'] = charts.svg_line(*charts.price_series(hist), f"{c['name']} – 1 Year", color='#e67e22')
+            continue
+        chart_fn = charts.chart_file(f"chart_energy_commodity_{c['ticker'].replace('=', '')}.png")
+        dates, closes = charts.price_series(hist)
+        chart_jobs.append(('commodity', os.path.join(BASE_DIR, chart_fn), {'name': c['name'], 'dates': dates, 'closes': closes}))
         commodity_charts[c['ticker']] = chart_fn
         c['chart_filename'] = chart_fn
+    charts.render(chart_jobs)
 
     # ── 2. Energy ETFs ───────────────────────────────────────────────────────
     print("Fetching energy ETF data...")
@@ -1099,6 +827,7 @@ def run_energy_analysis(html_filename, title):
     print(f"\nFetched {len(stocks_raw)} energy stocks.")
 
     # Build comparison tables for key tickers
+    comp_infos = prefetch_universe([], ENERGY_COMPARISON_GROUPS)
     comp_cache = {}  # avoid re-fetching the same ticker twice
 
     energy_data = []
@@ -1123,7 +852,8 @@ def run_energy_analysis(html_filename, title):
             for ct in comp_tickers:
                 try:
                     if ct not in comp_cache:
-                        comp_cache[ct] = fetch_energy_data.get_energy_stock_data(ct)
+                        # Tickers missing from the batch failed; they are not fetched again
+                        comp_cache[ct] = fetch_energy_data.get_energy_stock_data(ct, comp_infos[ct]) if ct in comp_infos else None
                     c_info = comp_cache[ct]
                     if c_info:
                         c_mc   = c_info.get('market_cap')
@@ -1172,24 +902,25 @@ def run_energy_analysis(html_filename, title):
         })
 
     # ── 4. Generate HTML ─────────────────────────────────────────────────────
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('energy.html')
+    with metrics.span('render'):
+        env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
+        template = env.get_template('energy.html')
 
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
+        date_str = datetime.now().strftime("%Y-%m-%d")
+        output_path = os.path.join(BASE_DIR, html_filename)
 
-    html_content = template.render(
-        date=date_str,
-        title=title,
-        current_page=html_filename,
-        commodities=commodities,
-        etfs=etfs,
-        stocks=energy_data,
-    )
+        html_content = template.render(
+            date=date_str,
+            title=title,
+            current_page=html_filename,
+            commodities=commodities,
+            etfs=etfs,
+            stocks=energy_data,
+        )
 
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"\nGenerated {output_path}")
+        with open(output_path, 'w') as f:
+            f.write(html_content)
+        print(f"\nGenerated {output_path}")
 
 
 HEALTHCARE_TICKERS = {
@@ -1241,103 +972,11 @@ HEALTHCARE_SELL_THRESHOLDS = {
 }
 
 
-def run_healthcare_analysis(html_filename, title):
+def run_healthcare_analysis(html_filename, title, infos=None):
     print("Starting Healthcare & Pharma Sector Analysis...")
 
-    healthcare_data = []
-
-    for ticker, meta in HEALTHCARE_TICKERS.items():
-        print(f"Fetching data for {ticker}...", end='\r')
-        try:
-            info = fetch_data.get_stock_data(ticker)
-            if info:
-                roe = info.get('returnOnEquity')
-                margin = info.get('profitMargins')
-                rev_growth = info.get('revenueGrowth')
-                de = info.get('debtToEquity')
-                peg = info.get('pegRatio')
-                pe = info.get('trailingPE')
-
-                if peg is None:
-                    growth = info.get('earningsGrowth')
-                    if pe and growth and growth > 0:
-                        peg = pe / (growth * 100)
-
-                market_cap = info.get('marketCap')
-                dividend_yield = info.get('dividendYield')
-                description = info.get('longBusinessSummary', 'No description available.')
-
-                # Build comparison table for key tickers
-                comparison_table = []
-                if ticker in HEALTHCARE_COMPARISON_GROUPS:
-                    comp_tickers = [ticker] + HEALTHCARE_COMPARISON_GROUPS[ticker]
-                    for comp_ticker in comp_tickers:
-                        try:
-                            c_info = info if comp_ticker == ticker else fetch_data.get_stock_data(comp_ticker)
-                            if c_info:
-                                c_mc = c_info.get('marketCap')
-                                c_pe = c_info.get('trailingPE')
-                                c_roe = c_info.get('returnOnEquity')
-                                c_margin = c_info.get('profitMargins')
-                                c_growth = c_info.get('revenueGrowth')
-                                comparison_table.append({
-                                    'ticker': comp_ticker,
-                                    'market_cap': f"${c_mc/1e9:.1f}B" if c_mc else "N/A",
-                                    'pe': f"{c_pe:.2f}" if c_pe else "N/A",
-                                    'roe': f"{c_roe:.2%}" if c_roe else "N/A",
-                                    'margin': f"{c_margin:.2%}" if c_margin else "N/A",
-                                    'growth': f"{c_growth:.2%}" if c_growth else "N/A",
-                                    'is_current': comp_ticker == ticker
-                                })
-                        except Exception as e:
-                            print(f"Error fetching comparison for {comp_ticker}: {e}")
-
-                healthcare_data.append({
-                    'ticker': ticker,
-                    'name': info.get('longName', ticker),
-                    'subsector': meta['subsector'],
-                    'subsector_class': meta['subsector_class'],
-                    'roe': f"{roe:.2%}" if roe else "N/A",
-                    'roe_val': roe if roe else -999,
-                    'margin': f"{margin:.2%}" if margin else "N/A",
-                    'margin_val': margin if margin else -999,
-                    'growth': f"{rev_growth:.2%}" if rev_growth else "N/A",
-                    'growth_val': rev_growth if rev_growth else -999,
-                    'de': de if de is not None else "N/A",
-                    'de_val': de if de is not None else 9999,
-                    'peg': f"{peg:.2f}" if peg else "N/A",
-                    'peg_val': peg if peg else 9999,
-                    'pe': f"{pe:.2f}" if pe else "N/A",
-                    'pe_val': pe if pe else 9999,
-                    'market_cap': f"${market_cap/1e9:.1f}B" if market_cap else "N/A",
-                    'market_cap_val': market_cap if market_cap else 0,
-                    'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
-                    'description': description,
-                    'comparison_table': comparison_table,
-                    'sell_threshold': HEALTHCARE_SELL_THRESHOLDS.get(ticker),
-                })
-        except Exception as e:
-            print(f"Error processing {ticker}: {e}")
-
-    healthcare_data.sort(key=lambda x: x['market_cap_val'], reverse=True)
-
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('healthcare.html')
-
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
-
-    html_content = template.render(
-        date=date_str,
-        stocks=healthcare_data,
-        title=title,
-        current_page=html_filename
-    )
-
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"\nGenerated {output_path}")
-
+    run_sector_report(html_filename, title, 'healthcare.html', HEALTHCARE_TICKERS, 'qgarp', infos,
+                      HEALTHCARE_COMPARISON_GROUPS, sell_thresholds=HEALTHCARE_SELL_THRESHOLDS)
 
 BANKING_TICKERS = {
     # Money-center banks
@@ -1385,141 +1024,114 @@ BANKING_SELL_THRESHOLDS = {
 }
 
 
-def run_banking_analysis(html_filename, title):
+def run_banking_analysis(html_filename, title, infos=None):
     print("Starting Banking & Financials Sector Analysis...")
 
-    banking_data = []
-
-    for ticker, meta in BANKING_TICKERS.items():
-        print(f"Fetching data for {ticker}...", end='\r')
-        try:
-            info = fetch_data.get_stock_data(ticker)
-            if info:
-                roe = info.get('returnOnEquity')
-                margin = info.get('profitMargins')
-                rev_growth = info.get('revenueGrowth')
-                de = info.get('debtToEquity')
-                peg = info.get('pegRatio')
-                pe = info.get('trailingPE')
-
-                if peg is None:
-                    growth = info.get('earningsGrowth')
-                    if pe and growth and growth > 0:
-                        peg = pe / (growth * 100)
-
-                market_cap = info.get('marketCap')
-                dividend_yield = info.get('dividendYield')
-                description = info.get('longBusinessSummary', 'No description available.')
-
-                # Build comparison table for key tickers
-                comparison_table = []
-                if ticker in BANKING_COMPARISON_GROUPS:
-                    comp_tickers = [ticker] + BANKING_COMPARISON_GROUPS[ticker]
-                    for comp_ticker in comp_tickers:
-                        try:
-                            c_info = info if comp_ticker == ticker else fetch_data.get_stock_data(comp_ticker)
-                            if c_info:
-                                c_mc = c_info.get('marketCap')
-                                c_pe = c_info.get('trailingPE')
-                                c_roe = c_info.get('returnOnEquity')
-                                c_margin = c_info.get('profitMargins')
-                                c_growth = c_info.get('revenueGrowth')
-                                comparison_table.append({
-                                    'ticker': comp_ticker,
-                                    'market_cap': f"${c_mc/1e9:.1f}B" if c_mc else "N/A",
-                                    'pe': f"{c_pe:.2f}" if c_pe else "N/A",
-                                    'roe': f"{c_roe:.2%}" if c_roe else "N/A",
-                                    'margin': f"{c_margin:.2%}" if c_margin else "N/A",
-                                    'growth': f"{c_growth:.2%}" if c_growth else "N/A",
-                                    'is_current': comp_ticker == ticker
-                                })
-                        except Exception as e:
-                            print(f"Error fetching comparison for {comp_ticker}: {e}")
-
-                banking_data.append({
-                    'ticker': ticker,
-                    'name': info.get('longName', ticker),
-                    'subsector': meta['subsector'],
-                    'subsector_class': meta['subsector_class'],
-                    'roe': f"{roe:.2%}" if roe else "N/A",
-                    'roe_val': roe if roe else -999,
-                    'margin': f"{margin:.2%}" if margin else "N/A",
-                    'margin_val': margin if margin else -999,
-                    'growth': f"{rev_growth:.2%}" if rev_growth else "N/A",
-                    'growth_val': rev_growth if rev_growth else -999,
-                    'de': de if de is not None else "N/A",
-                    'de_val': de if de is not None else 9999,
-                    'peg': f"{peg:.2f}" if peg else "N/A",
-                    'peg_val': peg if peg else 9999,
-                    'pe': f"{pe:.2f}" if pe else "N/A",
-                    'pe_val': pe if pe else 9999,
-                    'market_cap': f"${market_cap/1e9:.1f}B" if market_cap else "N/A",
-                    'market_cap_val': market_cap if market_cap else 0,
-                    'dividend_yield': f"{dividend_yield:.2f}%" if dividend_yield else "N/A",
-                    'description': description,
-                    'comparison_table': comparison_table,
-                    'sell_threshold': BANKING_SELL_THRESHOLDS.get(ticker),
-                })
-        except Exception as e:
-            print(f"Error processing {ticker}: {e}")
-
-    banking_data.sort(key=lambda x: x['market_cap_val'], reverse=True)
-
-    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR))
-    template = env.get_template('banking.html')
-
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    output_path = os.path.join(BASE_DIR, html_filename)
-
-    html_content = template.render(
-        date=date_str,
-        stocks=banking_data,
-        title=title,
-        current_page=html_filename
-    )
+    run_sector_report(html_filename, title, 'banking.html', BANKING_TICKERS, 'dividend_quality', infos,
+                      BANKING_COMPARISON_GROUPS, sell_thresholds=BANKING_SELL_THRESHOLDS)
 
-    with open(output_path, 'w') as f:
-        f.write(html_content)
-    print(f"\nGenerated {output_path}")
+def snapshot_universes(universes, infos):
+    """
+    Saves the daily scoring snapshot of the sector universes (run_analysis
+    snapshots SP500 and NON_SP500 itself; peer groups are not a universe).
+    """
+    for name, tickers in universes.items():
+        if name in ('SP500', 'NON_SP500', 'peers'):
+            continue
+        scored = analyze.score_frame(analyze.build_frame([(t, infos.get(t)) for t in tickers]))
+        delta.report_changes(name, scored)
+        snapshots.save(name, scored)
+
+
+def plan_universes(sp500_tickers, non_sp500_tickers):
+    """
+    Every ticker universe the daily run will need, keyed by report.
+    Used by the planner to fetch the union of all of them once.
+    """
+    return {
+        'SP500': sp500_tickers,
+        'NON_SP500': non_sp500_tickers,
+        # Only the peers a pick from either universe could be compared with
+        'peers': fetch_competitors.peer_tickers(sp500_tickers + non_sp500_tickers),
+        'consumer_staples': get_staples_tickers(),
+        'tech': universe_tickers(get_tech_tickers(), TECH_COMPARISON_GROUPS),
+        'semiconductors': universe_tickers(SEMICONDUCTOR_TICKERS, SEMI_COMPARISON_GROUPS),
+        'ai': universe_tickers(AI_TICKERS, AI_COMPARISON_GROUPS),
+        'china': fetch_china_data.get_china_tickers(),
+        'energy': universe_tickers(list(fetch_energy_data.ENERGY_STOCKS) + list(fetch_energy_data.ENERGY_ETFS),
+                                   ENERGY_COMPARISON_GROUPS),
+        'healthcare': universe_tickers(HEALTHCARE_TICKERS, HEALTHCARE_COMPARISON_GROUPS),
+        'banking': universe_tickers(BANKING_TICKERS, BANKING_COMPARISON_GROUPS),
+    }
 
 
 if __name__ == "__main__":
     # Initialize DB
     conn = init_db()
-
-    # 1. S&P 500 Analysis
-    sp500_tickers = fetch_data.get_sp500_tickers()
-    run_analysis(conn, 'SP500', sp500_tickers, 'index.html', 'Daily Stock Picks: S&P 500')
-
-    # 2. Non-S&P 500 Analysis (S&P 400 + 600)
-    non_sp500_tickers = fetch_data.get_non_sp500_tickers()
-    run_analysis(conn, 'NON_SP500', non_sp500_tickers, 'non_spy.html', 'Daily Stock Picks: Non-S&P 500')
-
-    # 3. Guru Analysis
-    run_guru_analysis('guru.html')
-
-    # 4. Consumer Staples Analysis
-    run_consumer_staples_analysis('consumer_staples.html', 'S&P 500 Consumer Staples Report')
-
-    # 5. Technology Analysis
-    run_tech_analysis("tech.html", "S&P 500 Technology Report")
-
-    # 6. Semiconductor / Chips Analysis
-    run_semiconductor_analysis("semiconductors.html", "Semiconductor / Chips Sector Report")
-
-    # 7. AI & LLM Analysis
-    run_ai_analysis("ai.html", "AI & LLM Sector Report")
-
-    # 8. China Analysis
-    run_china_analysis("china.html", "A股精选 (China Picks)")
-
-    # 9. Oil & Energy Analysis
-    run_energy_analysis("energy.html", "Oil & Energy Market Dashboard")
-
-    # 10. Healthcare / Pharma Analysis
-    run_healthcare_analysis("healthcare.html", "Healthcare & Pharma Sector Report")
-
-    # 11. Banking & Financials Analysis
-    run_banking_analysis("banking.html", "Banking & Financials Sector Report")
-
-    conn.close()
+    try:
+        # 0. Plan the run: fetch every ticker any report needs exactly once
+        with metrics.span('plan'):
+            sp500_tickers = fetch_data.get_sp500_tickers()
+            non_sp500_tickers = fetch_data.get_non_sp500_tickers()
+            universes = plan_universes(sp500_tickers, non_sp500_tickers)
+            infos = planner.prefetch(universes)
+
+        # Point-in-time snapshot of every scored ticker (see snapshots.py)
+        with metrics.span('snapshot'):
+            snapshot_universes(universes, infos)
+
+        reports = [
+            # 1. S&P 500 Analysis
+            ('SP500', run_analysis, (conn, 'SP500', sp500_tickers, 'index.html', 'Daily Stock Picks: S&P 500', infos)),
+            # 2. Non-S&P 500 Analysis (S&P 400 + 600)
+            ('NON_SP500', run_analysis, (conn, 'NON_SP500', non_sp500_tickers, 'non_spy.html', 'Daily Stock Picks: Non-S&P 500', infos)),
+            # 3. Guru Analysis
+            ('guru', run_guru_analysis, ('guru.html',)),
+            # 4. Consumer Staples Analysis
+            ('consumer_staples', run_consumer_staples_analysis, ('consumer_staples.html', 'S&P 500 Consumer Staples Report', infos)),
+            # 5. Technology Analysis
+            ('tech', run_tech_analysis, ("tech.html", "S&P 500 Technology Report", infos)),
+            # 6. Semiconductor / Chips Analysis
+            ('semiconductors', run_semiconductor_analysis, ("semiconductors.html", "Semiconductor / Chips Sector Report", infos)),
+            # 7. AI & LLM Analysis
+            ('ai', run_ai_analysis, ("ai.html", "AI & LLM Sector Report", infos)),
+            # 8. China Analysis
+            ('china', run_china_analysis, ("china.html", "A股精选 (China Picks)", infos)),
+            # 9. Oil & Energy Analysis (reads the fundamentals the planner cached)
+            ('energy', run_energy_analysis, ("energy.html", "Oil & Energy Market Dashboard")),
+            # 10. Healthcare / Pharma Analysis
+            ('healthcare', run_healthcare_analysis, ("healthcare.html", "Healthcare & Pharma Sector Report", infos)),
+            # 11. Banking & Financials Analysis
+            ('banking', run_banking_analysis, ("banking.html", "Banking & Financials Sector Report", infos)),
+        ]
+
+        # Charts of every report are queued and rendered together across a
+        # process pool once the last report is built (see charts.py). A
+        # failing report is logged and the others still run.
+        failed = []
+        with charts.batch():
+            for name, run_report, args in reports:
+                with metrics.span(name):
+                    try:
+                        run_report(*args)
+                    except Exception:
+                        traceback.print_exc()
+                        failed.append(name)
+
+        if failed:
+            # A failed report may have left its page missing or out of step with
+            # its charts, so nothing is deleted until a run builds every page
+            print(f"Reports failed: {', '.join(failed)}; keeping all charts.")
+            sys.exit(1)
+
+        # Drop charts no page shows any more
+        removed = charts.collect_garbage(BASE_DIR)
+        if removed:
+            print(f"Removed {len(removed)} orphaned charts.")
+    finally:
+        # Folds the WAL back into stocks.db before the workflow commits it
+        db.close(conn)
+
+        # Per-report / per-stage timings, counters and latencies for this run,
+        # written for failed runs too
+        metrics.write_report()
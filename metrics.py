@@ -0,0 +1,178 @@
+"""
+metrics.py
+Lightweight run instrumentation: timing spans, counters and histograms.
+
+Spans nest, so a stage timed inside a report is recorded under the
+report's path (e.g. "tech/fetch"); each span keeps its total and self
+time (total minus child spans), which makes untimed work such as scoring
+loops visible as the parent's self time. Counters and histograms are
+thread-safe and can be updated from fetch workers.
+
+At the end of a run write_report() stores everything as JSON in
+METRICS_DIR (one file per run) and appends a one-line summary of the
+per-report wall times to history.jsonl, so slow reports can be tracked
+across runs.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(BASE_DIR, 'metrics'))
+
+_lock = threading.Lock()
+_local = threading.local()   # per-thread stack of open span paths
+_spans = {}        # path -> {'count', 'total', 'self'}
+_counters = {}     # name -> int
+_histograms = {}   # name -> list of observed values
+_started = time.time()
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def span(name):
+    """Times the enclosed block under the current span path."""
+    stack = _stack()
+    path = f"{stack[-1][0]}/{name}" if stack else name
+    frame = [path, 0.0]   # path, time spent in child spans
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        with _lock:
+            entry = _spans.setdefault(path, {'count': 0, 'total': 0.0, 'self': 0.0})
+            entry['count'] += 1
+            entry['total'] += elapsed
+            entry['self'] += elapsed - frame[1]
+
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """Adds n to a counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name, value):
+    """Records one value (e.g. a latency in seconds) in a histogram."""
+    with _lock:
+        _histograms.setdefault(name, []).append(value)
+
+
+def summarize(values):
+    """count/min/mean/p50/p95/max of a list of values."""
+    values = sorted(values)
+    n = len(values)
+
+    def pct(p):
+        return values[min(n - 1, int(p * n))]
+
+    return {
+        'count': n,
+        'min': round(values[0], 4),
+        'mean': round(sum(values) / n, 4),
+        'p50': round(pct(0.50), 4),
+        'p95': round(pct(0.95), 4),
+        'max': round(values[-1], 4),
+    }
+
+
+def snapshot():
+    """Returns everything recorded so far as a JSON-serialisable dict."""
+    with _lock:
+        spans = {path: {'count': e['count'], 'total_s': round(e['total'], 3), 'self_s': round(e['self'], 3)}
+                 for path, e in _spans.items()}
+        counters = dict(_counters)
+        histograms = {name: summarize(v) for name, v in _histograms.items() if v}
+    return {
+        'started_at': datetime.fromtimestamp(_started).isoformat(timespec='seconds'),
+        'wall_s': round(time.time() - _started, 3),
+        'spans': spans,
+        'counters': counters,
+        'histograms': histograms,
+    }
+
+
+def reset():
+    """Clears all recorded data (the run start time is reset too)."""
+    global _started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _histograms.clear()
+        _started = time.time()
+
+
+def print_summary(report=None):
+    """Prints the top-level spans, slowest first."""
+    report = report or snapshot()
+    top = [(p, s) for p, s in report['spans'].items() if '/' not in p]
+    print(f"Run took {report['wall_s']:.1f}s:")
+    for path, s in sorted(top, key=lambda x: x[1]['total_s'], reverse=True):
+        print(f"  {path:<20} {s['total_s']:>8.1f}s")
+
+
+def write_report(directory=None):
+    """
+    Writes the run's metrics to <directory>/run_<timestamp>.json and appends
+    the per-report wall times to <directory>/history.jsonl. Returns the path.
+    """
+    directory = directory or METRICS_DIR
+    report = snapshot()
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.fromtimestamp(_started).strftime("%Y%m%d_%H%M%S")
+    path = os.path.join(directory, f"run_{stamp}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    summary = {
+        'started_at': report['started_at'],
+        'wall_s': report['wall_s'],
+        'reports': {p: s['total_s'] for p, s in report['spans'].items() if '/' not in p},
+    }
+    with open(os.path.join(directory, 'history.jsonl'), 'a') as f:
+        f.write(json.dumps(summary, sort_keys=True) + "\n")
+
+    print_summary(report)
+    print(f"Metrics written to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    # Show the per-report wall times of the most recent runs
+    history_path = os.path.join(METRICS_DIR, 'history.jsonl')
+    if not os.path.exists(history_path):
+        print(f"No run history in {METRICS_DIR}")
+    else:
+        with open(history_path) as f:
+            runs = [json.loads(line) for line in f if line.strip()]
+        for run in runs[-10:]:
+            slowest = sorted(run['reports'].items(), key=lambda x: x[1], reverse=True)[:3]
+            print(f"{run['started_at']}  {run['wall_s']:>7.1f}s  "
+                  + ", ".join(f"{name} {secs:.0f}s" for name, secs in slowest))
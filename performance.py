@@ -1,6 +1,5 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
+import charts
 import fetch_data
 
 def get_yearly_returns(ticker, period="max"):
@@ -68,25 +67,6 @@ def generate_comparison_chart(spy_returns, brk_returns, filename):
     spy_data = spy_returns.loc[common_years]
     brk_data = brk_returns.loc[common_years]
     
-    # Setup plot
-    fig, ax = plt.subplots(figsize=(14, 7))
-    
-    x = np.arange(len(common_years))
-    width = 0.35
-    
-    rects1 = ax.bar(x - width/2, spy_data, width, label='S&P 500 (SPY)', color='#3498db')
-    rects2 = ax.bar(x + width/2, brk_data, width, label='Berkshire (BRK-B)', color='#2ecc71')
-    
-    # Add labels
-    ax.set_ylabel('Yearly Return (%)')
-    ax.set_title('Yearly Performance: S&P 500 vs. Berkshire Hathaway (Last 20 Years)')
-    ax.set_xticks(x)
-    ax.set_xticklabels(common_years)
-    ax.legend()
-    
-    # Add grid
-    ax.grid(axis='y', linestyle='--', alpha=0.7)
-    
     # Calculate averages for annotation
     spy_avgs = calculate_averages(spy_returns)
     brk_avgs = calculate_averages(brk_returns)
@@ -100,16 +80,14 @@ def generate_comparison_chart(spy_returns, brk_returns, filename):
         s_val = f"{spy_avgs.get(period, 0):.1f}%" if spy_avgs.get(period) is not None else "N/A"
         b_val = f"{brk_avgs.get(period, 0):.1f}%" if brk_avgs.get(period) is not None else "N/A"
         stats_text += f"{period:<10} {s_val:<10} {b_val:<10}\n"
-        
-    # Add text box
-    props = dict(boxstyle='round', facecolor='white', alpha=0.9)
-    ax.text(0.02, 0.95, stats_text, transform=ax.transAxes, fontsize=10,
-            verticalalignment='top', bbox=props, family='monospace')
-            
-    plt.tight_layout()
-    plt.savefig(filename)
-    plt.close()
-    print(f"Generated {filename}")
+    
+    # Drawn by charts.py (grouped bars plus the averages box)
+    charts.render([('comparison', filename, {
+        'years': list(common_years),
+        'spy': spy_data.to_numpy(dtype=float),
+        'brk': brk_data.to_numpy(dtype=float),
+        'stats_text': stats_text,
+    })])
 
 if __name__ == "__main__":
     # Test
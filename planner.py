@@ -0,0 +1,59 @@
+"""
+planner.py
+Whole-run fetch planning.
+
+The daily run's reports overlap heavily (NVDA is in the semiconductor, AI
+and tech reports and in several peer groups). The planner takes every
+report's ticker universe, fetches the union once through the fetch engine
+and hands each report the same read-only view, so the cost of a run is
+proportional to the number of unique symbols rather than to the number of
+reports.
+"""
+
+from collections.abc import Mapping
+import fetch_data
+
+
+class FundamentalsView(Mapping):
+    """
+    Read-only index of ticker -> Fundamentals record for everything fetched
+    in a run. Tickers whose fetch failed are simply absent, so view.get(t)
+    is None.
+    """
+
+    def __init__(self, infos):
+        self._infos = dict(infos)
+
+    def __getitem__(self, ticker):
+        return self._infos[ticker]
+
+    def __iter__(self):
+        return iter(self._infos)
+
+    def __len__(self):
+        return len(self._infos)
+
+
+def unique_tickers(universes):
+    """Union of all universes in first-seen order."""
+    tickers = {}
+    for universe in universes.values():
+        tickers.update(dict.fromkeys(universe))
+    return list(tickers)
+
+
+def prefetch(universes):
+    """
+    Fetches the union of all report universes once, concurrently.
+    universes: dict of report name -> iterable of tickers.
+    Returns a FundamentalsView shared by every report.
+    """
+    tickers = unique_tickers(universes)
+    requested = sum(len(list(u)) for u in universes.values())
+    print(f"Planned {len(tickers)} unique tickers for {len(universes)} reports "
+          f"({requested} requested before de-duplication).")
+    for name, universe in universes.items():
+        print(f"  {name}: {len(list(universe))}")
+
+    infos = fetch_data.get_stock_data_many(tickers)
+    return FundamentalsView(infos)
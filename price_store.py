@@ -0,0 +1,283 @@
+"""
+price_store.py
+Local OHLCV price-history store, one series per ticker.
+
+The first request for a ticker downloads the full requested period; after
+that only the bars since the last stored one are requested. Requests for
+many tickers are batched into multi-ticker yf.download calls. Because
+yfinance returns split/dividend-adjusted prices, the store re-downloads a
+series from scratch whenever a new split or dividend shows up or an
+overlapping bar no longer matches what is stored.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PRICES_PATH = os.environ.get('PRICE_STORE_PATH', os.path.join(BASE_DIR, 'prices.db'))
+
+# A series updated more recently than this is served without a network call.
+PRICE_TTL = float(os.environ.get('PRICE_TTL_HOURS', 12)) * 3600
+
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+PERIOD_DAYS = {
+    '1d': 1, '5d': 5, '1mo': 31, '3mo': 92, '6mo': 183,
+    '1y': 366, '2y': 731, '5y': 1827, '10y': 3653,
+}
+
+_lock = threading.Lock()
+_conn = None
+
+
+def get_connection():
+    """Returns the shared store connection, creating the schema on first use."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(PRICES_PATH, check_same_thread=False)
+        _conn.execute('''CREATE TABLE IF NOT EXISTS prices
+                         (ticker text, date text, open real, high real, low real, close real, volume real,
+                          PRIMARY KEY (ticker, date)) WITHOUT ROWID''')
+        # start: earliest date the stored series is known to cover ('' = full history)
+        _conn.execute('''CREATE TABLE IF NOT EXISTS series
+                         (ticker text PRIMARY KEY, start text, last_date text, updated_at real)''')
+        _conn.commit()
+    return _conn
+
+
+def period_start(period):
+    """Returns the first date (YYYY-MM-DD) a yfinance period covers, or None for 'max'."""
+    today = datetime.now().date()
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return today.replace(month=1, day=1).isoformat()
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unsupported period: {period}")
+    return (today - timedelta(days=PERIOD_DAYS[period])).isoformat()
+
+
+def covers(stored_start, start):
+    """True if a series stored from `stored_start` covers a request from `start`."""
+    if stored_start == '':
+        return True
+    return start is not None and stored_start <= start
+
+
+def to_rows(ticker, hist):
+    """Converts a yfinance history frame to rows for the prices table."""
+    dates = pd.DatetimeIndex(hist.index)
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    dates = dates.strftime('%Y-%m-%d')
+    values = hist.reindex(columns=COLUMNS)
+    return [(ticker, d, *[None if pd.isna(v) else float(v) for v in row])
+            for d, row in zip(dates, values.itertuples(index=False))]
+
+
+def has_corporate_action(hist):
+    """True if the frame contains a dividend or split (adjusted history changes)."""
+    for col in ('Dividends', 'Stock Splits'):
+        if col in hist.columns and (hist[col].fillna(0) != 0).any():
+            return True
+    return False
+
+
+def split_frames(data, tickers):
+    """Splits a yf.download result into one frame per ticker (empty rows dropped)."""
+    frames = {}
+    if data is None or data.empty:
+        return frames
+    if not isinstance(data.columns, pd.MultiIndex):
+        data = pd.concat({tickers[0]: data}, axis=1)
+    for ticker in tickers:
+        if ticker in data.columns.get_level_values(0):
+            frame = data[ticker].dropna(how='all')
+            if not frame.empty:
+                frames[ticker] = frame
+    return frames
+
+
+def download(tickers, period=None, start=None):
+    """
+    Downloads adjusted daily history for many tickers in one yf.download call.
+    Returns a dict of ticker -> DataFrame (tickers without data are omitted).
+    """
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    kwargs = {'start': start} if start is not None else {'period': period}
+    metrics.count("network.yfinance.download")
+    metrics.count("network.yfinance.download_tickers", len(tickers))
+    began = time.perf_counter()
+    data = yf.download(tickers, group_by='ticker', auto_adjust=True, actions=True,
+                       threads=True, progress=False, **kwargs)
+    metrics.observe("fetch.latency.prices_batch", time.perf_counter() - began)
+    return split_frames(data, tickers)
+
+
+def replace_series(conn, ticker, hist, start):
+    """Replaces everything stored for a ticker with a freshly downloaded frame."""
+    rows = to_rows(ticker, hist)
+    conn.execute("DELETE FROM prices WHERE ticker = ?", (ticker,))
+    conn.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    last_date = rows[-1][1] if rows else None
+    conn.execute("INSERT OR REPLACE INTO series VALUES (?, ?, ?, ?)",
+                 (ticker, start if start is not None else '', last_date, time.time()))
+
+
+def append_bars(conn, ticker, hist, meta, anchor):
+    """
+    Appends the bars of an incremental download. Returns False, without
+    writing anything, if the adjusted history changed and the series has
+    to be downloaded again from scratch.
+    """
+    anchor_date, anchor_close = anchor
+    if hist is None or hist.empty:
+        conn.execute("UPDATE series SET updated_at = ? WHERE ticker = ?", (time.time(), ticker))
+        return True
+
+    new_rows = [r for r in to_rows(ticker, hist) if r[1] >= anchor_date]
+    overlap = [r for r in new_rows if r[1] == anchor_date]
+    mismatch = bool(overlap) and bool(anchor_close) and overlap[0][5] is not None and \
+        abs(overlap[0][5] - anchor_close) > 1e-6 * abs(anchor_close)
+    dates = pd.DatetimeIndex(hist.index)
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    if mismatch or has_corporate_action(hist[dates > pd.Timestamp(anchor_date)]):
+        return False
+
+    conn.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)", new_rows)
+    last_date = max(new_rows[-1][1], meta[1]) if new_rows else meta[1]
+    conn.execute("UPDATE series SET last_date = ?, updated_at = ? WHERE ticker = ?",
+                 (last_date, time.time(), ticker))
+    return True
+
+
+def update_many(tickers, period='5y'):
+    """
+    Brings the stored series for many tickers up to date for the given period.
+    Tickers seen for the first time get the full period in one batch request;
+    the rest only fetch the new bars, batched from the oldest anchor date.
+    """
+    start = period_start(period)
+    full = []
+    incremental = {}  # ticker -> (meta, (anchor_date, anchor_close))
+
+    with _lock:
+        conn = get_connection()
+        for ticker in dict.fromkeys(tickers):
+            meta = conn.execute("SELECT start, last_date, updated_at FROM series WHERE ticker = ?",
+                                (ticker,)).fetchone()
+            if meta is not None and covers(meta[0], start) and time.time() - meta[2] < PRICE_TTL:
+                metrics.count("cache.prices.hit")
+                continue
+            if meta is None or not covers(meta[0], start) or meta[1] is None:
+                metrics.count("cache.prices.miss")
+                full.append(ticker)
+                continue
+            # Re-request from the second-to-last stored bar so the (final) close
+            # of that bar can be checked and the last, possibly partial, bar
+            # gets replaced.
+            tail = conn.execute("SELECT date, close FROM prices WHERE ticker = ? ORDER BY date DESC LIMIT 2",
+                                (ticker,)).fetchall()
+            incremental[ticker] = (meta, tail[-1])
+            metrics.count("cache.prices.incremental")
+
+    if full:
+        frames = download(full, period=period)
+        with _lock:
+            for ticker in full:
+                replace_series(conn, ticker, frames.get(ticker, pd.DataFrame()), start)
+            conn.commit()
+
+    if incremental:
+        anchor_start = min(anchor[0] for _, anchor in incremental.values())
+        frames = download(list(incremental), start=anchor_start)
+        stale = []
+        with _lock:
+            for ticker, (meta, anchor) in incremental.items():
+                if not append_bars(conn, ticker, frames.get(ticker), meta, anchor):
+                    stale.append((ticker, meta[0]))
+            conn.commit()
+
+        # Adjusted history changed (new split/dividend): download these again
+        for ticker, stored_start in stale:
+            print(f"Adjusted history changed for {ticker}, re-downloading...")
+            metrics.count("cache.prices.redownload")
+            if stored_start == '':
+                frames = download([ticker], period='max')
+            else:
+                frames = download([ticker], start=stored_start)
+            with _lock:
+                replace_series(conn, ticker, frames.get(ticker, pd.DataFrame()), stored_start)
+                conn.commit()
+
+
+def update(ticker, period='5y'):
+    """Brings the stored series for one ticker up to date for the given period."""
+    update_many([ticker], period)
+
+
+def load_many(tickers, period='5y'):
+    """
+    Reads stored series for many tickers (no network) as an aligned panel:
+    a DataFrame indexed by date with (ticker, field) columns.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        return pd.DataFrame(columns=pd.MultiIndex.from_tuples([], names=['Ticker', 'Price']))
+    start = period_start(period) or ''
+    placeholders = ','.join('?' * len(tickers))
+    with _lock:
+        rows = get_connection().execute(
+            f"SELECT ticker, date, open, high, low, close, volume FROM prices "
+            f"WHERE ticker IN ({placeholders}) AND date >= ? ORDER BY date",
+            (*tickers, start)).fetchall()
+    if not rows:
+        return pd.DataFrame(columns=pd.MultiIndex.from_tuples([], names=['Ticker', 'Price']))
+    df = pd.DataFrame(rows, columns=['Ticker', 'Date'] + COLUMNS)
+    df['Date'] = pd.to_datetime(df['Date'])
+    panel = df.pivot(index='Date', columns='Ticker', values=COLUMNS)
+    panel.columns.names = ['Price', 'Ticker']
+    panel = panel.swaplevel(axis=1)
+    order = [t for t in tickers if t in panel.columns.get_level_values(0)]
+    return panel.reindex(columns=pd.MultiIndex.from_product([order, COLUMNS], names=['Ticker', 'Price']))
+
+
+def view(panel, ticker):
+    """Returns one ticker's OHLCV frame from a panel (dates without data dropped)."""
+    if ticker not in panel.columns.get_level_values(0):
+        return pd.DataFrame(columns=COLUMNS)
+    return panel[ticker].dropna(how='all')
+
+
+def load(ticker, period='5y'):
+    """Reads the stored series for a ticker (no network). Returns a DataFrame."""
+    return view(load_many([ticker], period), ticker)
+
+
+def get_histories(tickers, period='5y'):
+    """Returns an aligned OHLCV panel for many tickers, updating the store first."""
+    update_many(tickers, period)
+    return load_many(tickers, period)
+
+
+def get_history(ticker, period='5y'):
+    """Returns daily OHLCV history for a ticker, updating the store first."""
+    return view(get_histories([ticker], period), ticker)
+
+
+if __name__ == "__main__":
+    conn = get_connection()
+    n_series = conn.execute("SELECT COUNT(*) FROM series").fetchone()[0]
+    n_rows = conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0]
+    print(f"{PRICES_PATH}: {n_series} series, {n_rows} bars")
@@ -1,11 +1,11 @@
 import akshare as ak
-import yfinance as yf
+import fetch_data
+import metrics
 import pandas as pd
 from jinja2 import Environment, FileSystemLoader
 import os
 import time
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configuration
 TEMPLATE_DIR = 'templates'
@@ -45,11 +45,17 @@ def get_csi_tickers():
 
 from fetch_china_data import CHINA_STOCK_INFO
 
-def fetch_stock_data(ticker):
-    """Fetch data for a single stock using yfinance."""
+def fetch_stock_data(ticker, info=None):
+    """
+    Extracts the report fields for one stock. Pass the record from a
+    get_stock_data_many() batch as `info`; without it the ticker is
+    fetched on its own.
+    """
     try:
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        if info is None:
+            info = fetch_data.get_stock_data(ticker)
+        if not info:
+            return None
         
         # Extract metrics
         price = info.get('currentPrice') or info.get('previousClose')
@@ -87,25 +93,19 @@ def run_china_full_analysis():
         print("No tickers found. Aborting.")
         return
 
-    # 2. Fetch Data in Parallel
-    print(f"Fetching data for {len(tickers)} stocks using yfinance (multithreaded)...")
+    # 2. Fetch Data in Parallel (shared fetch engine, results land in the cache)
+    print(f"Fetching data for {len(tickers)} stocks using yfinance...")
     stocks_data = []
     
     start_time = time.time()
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        future_to_ticker = {executor.submit(fetch_stock_data, ticker): ticker for ticker in tickers}
-        
-        completed = 0
-        total = len(tickers)
-        
-        for future in as_completed(future_to_ticker):
-            data = future.result()
-            if data:
-                stocks_data.append(data)
-            
-            completed += 1
-            if completed % 50 == 0:
-                print(f"Progress: {completed}/{total}...", end='\r')
+    infos = fetch_data.get_stock_data_many(tickers)
+    for ticker in tickers:
+        # A ticker missing from the batch failed in the fetch engine
+        if ticker not in infos:
+            continue
+        data = fetch_stock_data(ticker, infos[ticker])
+        if data:
+            stocks_data.append(data)
                 
     end_time = time.time()
     print(f"\nFetched data for {len(stocks_data)} stocks in {end_time - start_time:.2f} seconds.")
@@ -153,4 +153,6 @@ def run_china_full_analysis():
     print(f"\nGenerated {output_path}")
 
 if __name__ == "__main__":
-    run_china_full_analysis()
+    with metrics.span('china_full'):
+        run_china_full_analysis()
+    metrics.write_report()
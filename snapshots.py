@@ -0,0 +1,184 @@
+"""
+snapshots.py
+Daily point-in-time snapshots of the scoring inputs and scores.
+
+run_analysis only keeps the top five picks per universe in stocks.db; the
+snapshot keeps every scored ticker so later analysis (backtests, diffs,
+threshold sweeps) can replay any day. Each (universe, day) is one
+compressed columnar file, snapshots/<universe>/<YYYY-MM-DD>.npz:
+fundamentals as float64 (free cash flows exceed the exact integer range
+of float32), the columns that move with the share price every day
+(analyze.PRICE_COLUMNS) as float32 (~7 significant digits, plenty for
+ratios), the score as int8 and text columns dictionary-encoded. The derived metrics (peg, fcf_yield,
+w52_position) are not stored; load() recomputes them from the inputs.
+
+All universes together take roughly 120 KB per weekday, about 30 MB per
+year kept, so the default SNAPSHOT_RETENTION_DAYS of one year stays in
+the tens of MB; older files are deleted.
+
+Snapshots are not committed: the workflow keeps the directory in its
+actions/cache entry together with the price store.
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import analyze
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshots'))
+RETENTION_DAYS = int(os.environ.get('SNAPSHOT_RETENTION_DAYS', 365))
+
+# Scoring inputs (see analyze.NUMERIC_FIELDS), stored, plus the derived metrics, recomputed
+STORED_COLUMNS = list(analyze.NUMERIC_FIELDS)
+NUMERIC_COLUMNS = STORED_COLUMNS + ['peg', 'fcf_yield', 'w52_position']
+TEXT_COLUMNS = list(analyze.TEXT_FIELDS)
+
+
+def snapshot_path(universe, date):
+    return os.path.join(SNAPSHOT_DIR, universe, f"{date}.npz")
+
+
+def encode(scored):
+    """Converts a score_frame() result into the arrays stored in a snapshot."""
+    arrays = {'ticker': scored['ticker'].to_numpy(dtype=str)}
+    for column in STORED_COLUMNS:
+        dtype = np.float32 if column in analyze.PRICE_COLUMNS else np.float64
+        arrays[column] = scored[column].to_numpy(dtype=dtype)
+    arrays['score'] = scored['score'].to_numpy(dtype=np.int8)
+    for column in TEXT_COLUMNS:
+        codes, categories = pd.factorize(scored[column].fillna(''))
+        arrays[f"{column}_codes"] = codes.astype(np.int16)
+        arrays[f"{column}_categories"] = np.asarray(categories, dtype=str)
+    return arrays
+
+
+def decode(arrays):
+    """Rebuilds a DataFrame from the arrays of a snapshot file."""
+    data = {'ticker': arrays['ticker'].astype(object)}
+    for column in STORED_COLUMNS:
+        data[column] = arrays[column].astype(float)
+    data['score'] = arrays['score'].astype(int)
+    for column in TEXT_COLUMNS:
+        categories = arrays[f"{column}_categories"].astype(object)
+        values = categories[arrays[f"{column}_codes"]] if len(categories) else np.array([], dtype=object)
+        data[column] = pd.Series(values, dtype=object).replace('', None)
+    frame = pd.DataFrame(data)
+    # Recomputed rather than stored (older snapshots stored them too)
+    return frame.assign(**analyze.derived_metrics(frame))
+
+
+def save(universe, scored, date=None):
+    """
+    Writes the snapshot of one universe for a day (today by default),
+    replacing an earlier one for the same day. `scored` is a score_frame()
+    DataFrame or a list of them (e.g. TopKRanker batches). Returns the path.
+    """
+    if isinstance(scored, list):
+        scored = pd.concat(scored, ignore_index=True)
+    date = date or datetime.now().strftime("%Y-%m-%d")
+    path = snapshot_path(universe, date)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez_compressed(tmp_path, **encode(scored))
+    os.replace(tmp_path, path)
+    prune()
+    return path
+
+
+def load(universe, date):
+    """The snapshot of a universe for a day as a DataFrame, or None if missing."""
+    path = snapshot_path(universe, date)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as arrays:
+        return decode(arrays)
+
+
+def dates(universe):
+    """Days with a snapshot for a universe, oldest first."""
+    directory = os.path.join(SNAPSHOT_DIR, universe)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-4] for name in os.listdir(directory)
+                  if name.endswith('.npz') and not name.endswith('.tmp.npz'))
+
+
+def load_range(universe, start=None, end=None):
+    """
+    All snapshots of a universe between start and end (inclusive,
+    'YYYY-MM-DD' strings) stacked into one DataFrame with a 'date' column.
+    """
+    frames = []
+    for date in dates(universe):
+        if (start and date < start) or (end and date > end):
+            continue
+        frame = load(universe, date)
+        frames.append(frame.assign(date=date))
+    if not frames:
+        return pd.DataFrame(columns=['date', 'ticker'] + NUMERIC_COLUMNS + ['score'] + TEXT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def previous(universe, before=None):
+    """
+    (date, frame) of the latest snapshot of a universe taken before
+    `before` (today by default), or (None, None) without one.
+    """
+    before = before or datetime.now().strftime("%Y-%m-%d")
+    earlier = [d for d in dates(universe) if d < before]
+    if not earlier:
+        return None, None
+    return earlier[-1], load(universe, earlier[-1])
+
+
+def changed(universe, scored, columns=None, before=None):
+    """
+    Compares a frame's scoring inputs with the latest snapshot of a
+    universe taken before `before` (today by default). Returns
+    (tickers whose inputs changed or are new, date of that snapshot); the
+    date is None, and every ticker counts as changed, without a snapshot.
+    """
+    since, frame = previous(universe, before)
+    if frame is None:
+        return list(scored['ticker']), None
+    old = dict(zip(frame['ticker'], analyze.input_hashes(frame, columns)))
+    new = analyze.input_hashes(scored, columns)
+    tickers = [t for t, h in zip(scored['ticker'], new) if old.get(t) != h]
+    return tickers, since
+
+
+def universes():
+    """Universes that have at least one snapshot."""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    return sorted(name for name in os.listdir(SNAPSHOT_DIR)
+                  if os.path.isdir(os.path.join(SNAPSHOT_DIR, name)))
+
+
+def prune(retention_days=None):
+    """Deletes snapshots older than the retention period. Returns the number removed."""
+    retention_days = RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = (datetime.now() - timedelta(days=retention_days)).strftime("%Y-%m-%d")
+    removed = 0
+    for universe in universes():
+        for date in dates(universe):
+            if date < cutoff:
+                os.remove(snapshot_path(universe, date))
+                removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    total = 0
+    for universe in universes():
+        days = dates(universe)
+        if not days:
+            continue
+        size = sum(os.path.getsize(snapshot_path(universe, d)) for d in days)
+        total += size
+        print(f"{universe}: {len(days)} days ({days[0]} .. {days[-1]}), {size / 1024:.0f} KB")
+    print(f"Total: {total / 1024 / 1024:.1f} MB in {SNAPSHOT_DIR}")
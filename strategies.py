@@ -0,0 +1,145 @@
+"""
+strategies.py
+Registry of stock-selection strategies evaluated together on one snapshot.
+
+Each strategy is declarative: a list of criteria, each a
+(metric, comparison, threshold) test on a column of a scored frame
+(analyze.score_frame or a snapshots.load() result), and sort keys that
+order stocks with the same number of passed criteria. evaluate() tests
+every distinct criterion once over the whole frame and derives all the
+strategies' scores and rankings from that single pass.
+
+Comparisons: '>' and '<' against a number, 'between' against an
+exclusive (low, high) pair. NaN never passes.
+"""
+
+import numpy as np
+import pandas as pd
+
+import analyze
+
+
+def qgarp_criteria():
+    """The QGARP criteria of analyze.THRESHOLDS (PEG must also be positive)."""
+    criteria = []
+    for criterion, (metric, op, threshold) in analyze.THRESHOLDS.items():
+        if criterion == 'pass_peg':
+            criteria.append((metric, 'between', (0, threshold)))
+        else:
+            criteria.append((metric, op, threshold))
+    return criteria
+
+
+# name -> display label, criteria and sort keys ((column, ascending), ...)
+# applied after score
+STRATEGIES = {
+    'qgarp': {
+        'label': "QGARP",
+        'description': "Quality + growth at a reasonable price (the daily picks)",
+        'criteria': qgarp_criteria(),
+        'sort': [('peg', True)],
+    },
+    'dividend_quality': {
+        'label': "Dividend quality",
+        'description': "Well-covered dividends from profitable, moderately levered companies",
+        'criteria': [
+            ('dividend_yield', '>', 2.0),     # yfinance reports the yield in percent
+            ('roe', '>', 0.12),
+            ('margin', '>', 0.08),
+            ('de', '<', 100),
+            ('fcf_yield', '>', 0.04),
+        ],
+        'sort': [('dividend_yield', False)],
+    },
+    'value': {
+        'label': "Value",
+        'description': "Cheap on earnings and free cash flow",
+        'criteria': [
+            ('pe', 'between', (0, 15)),
+            ('fcf_yield', '>', 0.06),
+            ('de', '<', 100),
+            ('roe', '>', 0.08),
+        ],
+        'sort': [('fcf_yield', False), ('pe', True)],
+    },
+    'momentum': {
+        'label': "Momentum",
+        'description': "Trading near 52-week highs with growing revenue and earnings",
+        'criteria': [
+            ('w52_position', '>', 0.80),
+            ('rev_growth', '>', 0.10),
+            ('eps_growth', '>', 0.0),
+            ('margin', '>', 0.0),
+        ],
+        'sort': [('w52_position', False), ('rev_growth', False)],
+    },
+}
+
+
+def test(values, op, threshold):
+    """Vectorized criterion test (NaN never passes)."""
+    if op == 'between':
+        low, high = threshold
+        return (values > low) & (values < high)
+    return analyze.passes(values, op, threshold)
+
+
+def ranking(scores, frame, sort):
+    """Row order by score (desc), then the strategy's sort keys (missing last)."""
+    keys = []
+    for column, ascending in reversed(sort):
+        values = frame[column].to_numpy(dtype=float)
+        values = values if ascending else -values
+        keys.append(np.where(np.isnan(values), np.inf, values))
+    keys.append(-scores)
+    return np.lexsort(keys)
+
+
+def evaluate(frame, strategies=None, top=None):
+    """
+    Scores and ranks a frame under every strategy at once. Returns a dict
+    of strategy name -> DataFrame (ticker, score, the sort columns and one
+    boolean column per criterion), best first, cut to `top` rows if given.
+    """
+    strategies = strategies or STRATEGIES
+
+    # Each distinct criterion is tested once, whichever strategies share it
+    tests = {}
+    for strategy in strategies.values():
+        for criterion in strategy['criteria']:
+            if criterion not in tests:
+                metric, op, threshold = criterion
+                tests[criterion] = test(frame[metric].to_numpy(dtype=float), op, threshold)
+
+    results = {}
+    for name, strategy in strategies.items():
+        passed = np.column_stack([tests[c] for c in strategy['criteria']])
+        scores = passed.sum(axis=1)
+        order = ranking(scores, frame, strategy['sort'])
+        if top is not None:
+            order = order[:top]
+        columns = {'ticker': frame['ticker'].to_numpy()[order], 'score': scores[order]}
+        for column, _ in strategy['sort']:
+            columns[column] = frame[column].to_numpy()[order]
+        for criterion, values in zip(strategy['criteria'], passed.T):
+            metric, op, threshold = criterion
+            label = f"{metric} {op} {threshold}" if op != 'between' else f"{threshold[0]} < {metric} < {threshold[1]}"
+            columns[label] = values[order]
+        results[name] = pd.DataFrame(columns)
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+    import snapshots
+
+    universe = sys.argv[1] if len(sys.argv) > 1 else 'SP500'
+    days = snapshots.dates(universe)
+    if not days:
+        print(f"No snapshots for {universe} yet.")
+    else:
+        frame = snapshots.load(universe, days[-1])
+        print(f"{universe} snapshot of {days[-1]}: {len(frame)} tickers")
+        for name, ranked in evaluate(frame, top=5).items():
+            print(f"\n{name}: {STRATEGIES[name]['description']}")
+            print(ranked[['ticker', 'score'] + [c for c, _ in STRATEGIES[name]['sort']]].to_string(index=False))
@@ -0,0 +1,217 @@
+"""
+sweep.py
+Parameter sweep over the QGARP thresholds.
+
+Replays the daily snapshots (snapshots.py) of a universe with every
+combination of a grid of thresholds (see analyze.THRESHOLDS), picks the
+top k of each day under each variant and ranks the variants by the mean
+forward return of their picks, using prices from the local price store.
+Every snapshot row takes part in the daily ranking, whether or not it has
+a forward return yet (a ticker that later stopped trading was still a
+candidate that day); picks without a return are left out of the means and
+counted separately.
+
+Scoring is done as matrix operations: each criterion is evaluated once
+per grid value for all snapshot rows (a rows x values boolean matrix), so
+the score of a batch of variants is a sum of gathered columns. Batches of
+variants are spread over a process pool.
+"""
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import analyze
+import backtest
+import fetch_data
+import snapshots
+
+# Threshold values to try per criterion (the current threshold is included)
+GRID = {
+    'pass_roe':    [0.10, 0.15, 0.20],
+    'pass_margin': [0.05, 0.10, 0.15],
+    'pass_growth': [0.00, 0.05, 0.10],
+    'pass_de':     [50, 100, 150],
+    'pass_peg':    [1.0, 1.5, 2.0],
+    'pass_fcf':    [0.02, 0.03, 0.05],
+    'pass_w52':    [0.50, 0.70, 0.90],
+}
+
+TOP_K = 5
+HORIZON = 21            # trading days
+BATCH_SIZE = 128        # variants scored per matrix batch
+MAX_WORKERS = os.cpu_count() or 1
+
+_shared = None          # per-process sweep data, set by init_worker()
+
+
+def pass_matrices(frame, grid):
+    """criterion -> (rows x grid values) boolean matrix of criterion passes."""
+    matrices = []
+    for criterion, values in grid.items():
+        metric, op, _ = analyze.THRESHOLDS[criterion]
+        column = frame[metric].to_numpy(dtype=float)[:, None]
+        passed = analyze.passes(column, op, np.asarray(values, dtype=float)[None, :])
+        if criterion == 'pass_peg':
+            passed &= column > 0
+        matrices.append(passed.astype(np.int8))
+    return matrices
+
+
+def tie_break(frame, day_bounds):
+    """
+    Fraction in [0, 1) per row that orders rows with equal scores by PEG
+    (ascending, missing last) within each day, like analyze.rank_order.
+    """
+    peg = frame['peg'].to_numpy(dtype=float)
+    penalty = np.empty(len(frame))
+    for start, end in day_bounds:
+        key = np.where(np.isnan(peg[start:end]), np.inf, peg[start:end])
+        ranks = np.empty(end - start)
+        ranks[np.argsort(key, kind='stable')] = np.arange(end - start)
+        penalty[start:end] = ranks / (end - start)
+    return penalty
+
+
+def init_worker(shared):
+    global _shared
+    _shared = shared
+
+
+def evaluate(combos):
+    """
+    Scores a batch of variants (rows of grid indices, one column per
+    criterion) and returns per-variant sums over the daily top-k picks:
+    (picks with a return, sum of returns, sum of excess returns, number of
+    positive returns, picks without a return).
+    """
+    s = _shared
+    scores = np.zeros((len(s['penalty']), len(combos)), dtype=np.int16)
+    for c, matrix in enumerate(s['passes']):
+        scores += matrix[:, combos[:, c]]
+    keys = scores - s['penalty'][:, None]
+
+    k = s['k']
+    count = np.zeros(len(combos))
+    total = np.zeros(len(combos))
+    excess = np.zeros(len(combos))
+    hits = np.zeros(len(combos))
+    missing = np.zeros(len(combos))
+    for start, end in s['day_bounds']:
+        day = keys[start:end]
+        if end - start > k:
+            top = np.argpartition(-day, k - 1, axis=0)[:k]
+        else:
+            top = np.broadcast_to(np.arange(end - start)[:, None], (end - start, len(combos)))
+        fwd = s['fwd'][start:end][top]
+        exc = s['excess'][start:end][top]
+        valid = ~np.isnan(fwd) & ~np.isnan(exc)
+        count += valid.sum(axis=0)
+        missing += (~valid).sum(axis=0)
+        total += np.where(valid, fwd, 0).sum(axis=0)
+        excess += np.where(valid, exc, 0).sum(axis=0)
+        hits += (valid & (fwd > 0)).sum(axis=0)
+    return count, total, excess, hits, missing
+
+
+def prepare(universe, horizon=HORIZON, start=None, end=None, period='2y'):
+    """
+    Loads a universe's snapshots and attaches forward returns (NaN where a
+    ticker has no price data for the horizon). Every row of a day is kept
+    so the ranking sees the full universe; only days that are too recent
+    for any forward return are dropped. Returns the frame sorted by date
+    and the (start, end) row bounds of each day.
+    """
+    frame = snapshots.load_range(universe, start, end)
+    if frame.empty:
+        return frame, []
+    tickers = list(dict.fromkeys(frame['ticker']))
+    panel = fetch_data.get_histories(tickers + [backtest.BENCHMARK], period=period)
+    dates, closes = backtest.close_matrix(panel, tickers + [backtest.BENCHMARK])
+    bench, closes = closes[:, -1], closes[:, :-1]
+
+    column = {t: j for j, t in enumerate(tickers)}
+    rows = backtest.entry_rows(dates, pd.to_datetime(frame['date']))
+    in_range = rows < len(dates)
+    frame, rows = frame[in_range].copy(), rows[in_range]
+    cols = frame['ticker'].map(column).to_numpy()
+    fwd = backtest.forward_returns(closes, rows, cols, horizon)
+    bench_fwd = backtest.forward_returns(bench[:, None], rows, np.zeros_like(rows), horizon)
+    frame['fwd'] = fwd
+    frame['excess'] = fwd - bench_fwd
+    evaluable = frame.groupby('date')['excess'].transform(lambda e: e.notna().any()).to_numpy(dtype=bool)
+    frame = frame[evaluable].sort_values('date', kind='stable').reset_index(drop=True)
+
+    boundaries = np.flatnonzero(frame['date'].to_numpy()[1:] != frame['date'].to_numpy()[:-1]) + 1
+    edges = np.concatenate([[0], boundaries, [len(frame)]])
+    return frame, list(zip(edges[:-1], edges[1:]))
+
+
+def run(frame, day_bounds, grid=None, k=TOP_K, max_workers=None, batch_size=BATCH_SIZE):
+    """
+    Evaluates every combination of the grid on a prepared frame. Returns a
+    DataFrame with one row per variant (its thresholds, the mean return,
+    mean excess return and hit rate of its picks with a forward return, and
+    the number of picks with and without one), best mean excess first.
+    """
+    grid = grid or GRID
+    combos = np.array(list(itertools.product(*[range(len(v)) for v in grid.values()])), dtype=np.intp)
+    shared = {
+        'passes': pass_matrices(frame, grid),
+        'penalty': tie_break(frame, day_bounds),
+        'fwd': frame['fwd'].to_numpy(dtype=float),
+        'excess': frame['excess'].to_numpy(dtype=float),
+        'day_bounds': day_bounds,
+        'k': k,
+    }
+    batches = [combos[i:i + batch_size] for i in range(0, len(combos), batch_size)]
+    max_workers = max_workers or MAX_WORKERS
+    print(f"Evaluating {len(combos)} variants on {len(frame)} rows / {len(day_bounds)} days "
+          f"({len(batches)} batches, {max_workers} workers)...")
+
+    if max_workers > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                 initargs=(shared,)) as executor:
+            results = list(executor.map(evaluate, batches))
+    else:
+        init_worker(shared)
+        results = [evaluate(batch) for batch in batches]
+
+    count, total, excess, hits, missing = (np.concatenate(parts) for parts in zip(*results))
+    table = pd.DataFrame({criterion: np.asarray(values)[combos[:, c]]
+                          for c, (criterion, values) in enumerate(grid.items())})
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table['mean_return'] = total / count
+        table['mean_excess'] = excess / count
+        table['hit_rate'] = hits / count
+    table['picks'] = count.astype(int)
+    table['missing'] = missing.astype(int)
+    return table.sort_values('mean_excess', ascending=False, kind='stable').reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep QGARP thresholds over stored snapshots.")
+    parser.add_argument('universe', nargs='?', default='SP500')
+    parser.add_argument('--horizon', type=int, default=HORIZON, help="forward return horizon in trading days")
+    parser.add_argument('--top', type=int, default=TOP_K, help="picks per day")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', help="write the full table to this CSV file")
+    args = parser.parse_args()
+
+    frame, day_bounds = prepare(args.universe, args.horizon)
+    if frame.empty:
+        print(f"No snapshots with {args.horizon}-day forward returns for {args.universe} yet.")
+    else:
+        table = run(frame, day_bounds, k=args.top, max_workers=args.workers)
+        current = np.logical_and.reduce([table[c] == analyze.THRESHOLDS[c][2] for c in GRID])
+        pd.set_option('display.width', 200)
+        print(table.head(20).to_string(float_format=lambda x: f"{x:.4f}"))
+        print("\nCurrent thresholds:")
+        print(table[current].to_string(float_format=lambda x: f"{x:.4f}"))
+        if args.out:
+            table.to_csv(args.out, index=False)
+            print(f"Wrote {args.out}")
@@ -0,0 +1,18 @@
+"""
+Shared test setup: the repo root is importable and every on-disk store
+(fundamentals cache, price store, metrics, snapshots) points at a
+throwaway directory, so tests never touch the real cache.db or prices.db.
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_scratch = tempfile.mkdtemp(prefix="stock-tests-")
+os.environ.setdefault('STOCK_CACHE_PATH', os.path.join(_scratch, 'cache.db'))
+os.environ.setdefault('PRICE_STORE_PATH', os.path.join(_scratch, 'prices.db'))
+os.environ.setdefault('METRICS_DIR', os.path.join(_scratch, 'metrics'))
+os.environ.setdefault('SNAPSHOT_DIR', os.path.join(_scratch, 'snapshots'))
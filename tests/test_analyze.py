@@ -0,0 +1,67 @@
+import analyze
+
+
+def info(sector, roe, margin):
+    return {'returnOnEquity': roe, 'profitMargins': margin, 'revenueGrowth': 0.08, 'debtToEquity': 40.0,
+            'trailingPE': 12.0, 'earningsGrowth': 0.10, 'freeCashflow': 5e8, 'marketCap': 1e10,
+            'currentPrice': 50.0, 'fiftyTwoWeekHigh': 60.0, 'fiftyTwoWeekLow': 30.0, 'sector': sector}
+
+
+def mixed_universe():
+    """Missing keys, None values, negative PEG, PEG fallback and an integer-valued D/E."""
+    base = info('Tech', 0.20, 0.12)
+    variants = [
+        {},
+        {'debtToEquity': 80.0},
+        {'debtToEquity': None, 'pegRatio': -1.5},
+        {'pegRatio': 1.2},
+        {'pegRatio': None, 'earningsGrowth': -0.2},
+        {'freeCashflow': None, 'marketCap': None},
+        {'currentPrice': 59.0, 'fiftyTwoWeekLow': None},
+        {'returnOnEquity': 0.10, 'pegRatio': 2.5},
+        {'profitMargins': 0.05, 'revenueGrowth': 0.02, 'debtToEquity': 25.5},
+    ]
+    stocks = [(f"T{i}", {**base, **changes}) for i, changes in enumerate(variants)]
+    sparse = dict(base)
+    for key in ('debtToEquity', 'earningsGrowth', 'freeCashflow', 'fiftyTwoWeekHigh'):
+        del sparse[key]
+    stocks.append(('SPARSE', sparse))
+    stocks.append(('EMPTY', {}))
+    return stocks
+
+
+def reference_ranking(stocks):
+    scored = [(ticker, analyze.score_stock(data)) for ticker, data in stocks if data]
+    peg_key = lambda peg: peg if peg is not None else float('inf')
+    scored.sort(key=lambda item: (-item[1]['score'], peg_key(item[1]['metrics']['peg'])))
+    return [(ticker, result['score'], result['details']) for ticker, result in scored]
+
+
+def test_rank_stocks_and_top_k_match_score_stock():
+    stocks = mixed_universe()
+    expected = reference_ranking(stocks)
+    assert "D/E: 80.0 (>=50%)" in dict((t, d) for t, _, d in expected)['T1']
+    assert "D/E: 1000 (>=50%)" in dict((t, d) for t, _, d in expected)['SPARSE']
+
+    ranked = [(s['ticker'], s['score'], s['details']) for s in analyze.rank_stocks(stocks)]
+    assert ranked == expected
+
+    ranker = analyze.TopKRanker(k=4, batch_size=3)
+    for ticker, data in stocks:
+        ranker.push(ticker, data)
+    assert [(s['ticker'], s['score'], s['details']) for s in ranker.results()] == expected[:4]
+
+
+def test_relative_details_show_percentiles_within_the_group():
+    # Five low-margin banks: the best of them fails the absolute 10% margin cutoff
+    banks = [(f"B{i}", info('Financial Services', 0.05 + 0.01 * i, 0.02 + 0.01 * i)) for i in range(5)]
+
+    ranked = {s['ticker']: s for s in analyze.rank_stocks(banks, relative_to='sector')}
+    assert ranked['B4']['details'][0] == "ROE: 9.00% (pct 100 in sector, >=60)"
+    assert ranked['B4']['details'][1] == "Margin: 6.00% (pct 100 in sector, >=60)"
+    assert ranked['B1']['details'][0] == "ROE: 6.00% (pct 40 in sector, <60)"
+    assert ranked['B4']['score'] == 7 and ranked['B1']['score'] == 5
+
+    absolute = {s['ticker']: s for s in analyze.rank_stocks(banks)}
+    assert absolute['B4']['details'][1] == "Margin: 6.00% (<=10%)"
+
@@ -0,0 +1,58 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import backtest
+import db
+
+
+def price_panel(closes, dates):
+    """A fetch_data.get_histories()-shaped panel from {ticker: closes}."""
+    return pd.concat({t: pd.DataFrame({'Close': c}, index=dates) for t, c in closes.items()}, axis=1)
+
+
+def test_weights_drift_between_rebalances():
+    dates = pd.date_range('2025-01-06', periods=4, freq='B')
+    panel = price_panel({'AAA': [100.0, 110.0, 121.0, 121.0],
+                         'BBB': [100.0, 100.0, 50.0, 50.0],
+                         'SPY': [100.0, 100.0, 100.0, 100.0]}, dates)
+    picks = pd.DataFrame({'date': [dates[0], dates[0], dates[2]],
+                          'ticker': ['AAA', 'BBB', 'AAA'],
+                          'score': [5, 5, 5]})
+
+    result = backtest.backtest(picks, panel, horizons=(1,))
+
+    # Buy and hold from day 0: 0.5 * 1.1 + 0.5 * 1.0, then 0.5 * 1.21 + 0.5 * 0.5.
+    # A daily re-equal-weighted portfolio would show 1.05 * 0.8 = 0.84 on day 2.
+    assert result['equity']['portfolio'].to_numpy() == pytest.approx([1.0, 1.05, 0.855, 0.855])
+    assert result['equity']['SPY'].to_numpy() == pytest.approx([1.0] * 4)
+    # Turnover on day 2 is measured against the drifted weights (0.605 / 0.855 in AAA)
+    assert result['turnover'].to_numpy() == pytest.approx([0.5, 0.25 / 0.855])
+    assert result['hit_rates'][1]['picks'] == 3
+    assert result['summary']['portfolio']['max_drawdown'] == pytest.approx(0.855 / 1.05 - 1)
+
+
+def test_run_opens_picks_database_read_only(tmp_path, monkeypatch):
+    path = str(tmp_path / 'stocks.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE picks (date text, ticker text, score integer, universe text)")
+    conn.execute("INSERT INTO picks VALUES ('2025-01-06', 'AAA', 5, 'SP500')")
+    conn.commit()
+    conn.close()
+
+    dates = pd.date_range('2025-01-06', periods=3, freq='B')
+    panel = price_panel({'AAA': [100.0, 101.0, 102.0], 'SPY': [100.0, 100.0, 100.0]}, dates)
+    monkeypatch.setattr(backtest, 'DB_PATH', path)
+    monkeypatch.setattr(backtest.fetch_data, 'get_histories', lambda tickers, period: panel)
+
+    result = backtest.run('SP500', horizons=(1,))
+    assert result['equity']['portfolio'].iloc[-1] == pytest.approx(1.02)
+
+    # Neither migrated nor switched to WAL
+    conn = sqlite3.connect(path)
+    assert db.get_version(conn) == 0
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+    conn.close()
+    with pytest.raises(sqlite3.OperationalError):
+        db.connect_readonly(path).execute("DELETE FROM picks")
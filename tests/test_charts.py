@@ -0,0 +1,58 @@
+import numpy as np
+
+import charts
+
+
+def price_job():
+    dates = np.arange('2025-01-01', '2025-02-01', dtype='datetime64[D]')
+    return ('price', 'charts/chart_X.png', {'ticker': 'X', 'dates': dates, 'closes': np.linspace(1, 2, len(dates))})
+
+
+def test_job_key_covers_style_version_and_matplotlib(monkeypatch):
+    monkeypatch.setattr(charts, '_style', None)
+    key = charts.job_key(price_job())
+    assert charts.job_key(price_job()) == key
+
+    monkeypatch.setattr(charts, '_style', None)
+    monkeypatch.setattr(charts, 'STYLE_VERSION', charts.STYLE_VERSION + 1)
+    bumped = charts.job_key(price_job())
+    assert bumped != key
+
+    monkeypatch.setattr(charts, '_style', None)
+    monkeypatch.setattr(charts.importlib.metadata, 'version', lambda name: '0.0.1')
+    assert charts.job_key(price_job()) not in (key, bumped)
+
+
+def test_downsample_keeps_endpoints_and_extremes():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[123], y[777] = 5.0, -5.0
+    dx, dy = charts.downsample(x, y, 100)
+    assert len(dx) <= 100
+    assert dx[0] == 0 and dx[-1] == 999 and np.all(np.diff(dx) > 0)
+    assert 123 in dx and 777 in dx
+    np.testing.assert_array_equal(dy, y[dx])
+
+
+def test_downsample_clamps_tiny_limits():
+    x, y = np.arange(10), np.arange(10.0)
+    for max_points in (1, 2, 3, 4):
+        dx, dy = charts.downsample(x, y, max_points)
+        assert dx[0] == 0 and dx[-1] == 9 and len(dx) <= 4
+    short_x, short_y = charts.downsample(x[:4], y[:4], 2)
+    assert list(short_x) == [0, 1, 2, 3]
+
+
+def test_collect_garbage_removes_only_unreferenced_charts(tmp_path):
+    (tmp_path / 'charts').mkdir()
+    for name in ('charts/chart_SP500_AAA.png', 'charts/chart_SP500_OLD.png', 'charts/guru.png',
+                 'charts/chart_SP500_BBB.png.tmp.png', 'chart_legacy.png', 'logo.png'):
+        (tmp_path / name).write_bytes(b'png')
+    (tmp_path / 'index.html').write_text('<img src="charts/chart_SP500_AAA.png"><img src="./charts/guru.png">')
+
+    removed = charts.collect_garbage(str(tmp_path))
+
+    assert removed == ['chart_legacy.png', 'charts/chart_SP500_OLD.png']
+    assert sorted(p.name for p in (tmp_path / 'charts').iterdir()) == [
+        'chart_SP500_AAA.png', 'chart_SP500_BBB.png.tmp.png', 'guru.png']
+    assert (tmp_path / 'logo.png').exists()
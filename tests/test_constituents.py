@@ -0,0 +1,61 @@
+import pytest
+import requests
+
+import cache
+import constituents
+
+PAGE = """<table id="constituents">
+<tr><th>Symbol</th><th>Security</th><th>GICS Sector</th><th>GICS Sub-Industry</th></tr>
+<tr><td>AAA</td><td>Alpha Inc.</td><td>Energy</td><td>Oil &amp; Gas Drilling</td></tr>
+<tr><td>BBB</td><td>Beta Corp.</td><td>Utilities</td><td>Electric Utilities</td></tr>
+</table>"""
+
+
+def page_response(status, text='', headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = text.encode()
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.fixture
+def wikipedia(tmp_path, monkeypatch):
+    """Queue of responses for requests.get, recording the headers sent."""
+    monkeypatch.setattr(cache, 'CACHE_PATH', str(tmp_path / 'cache.db'))
+    monkeypatch.setattr(cache, '_conn', None)
+    monkeypatch.setattr(constituents, '_parsed', {})
+    responses, sent = [], []
+
+    def get(url, headers=None, timeout=None):
+        sent.append(headers)
+        return responses.pop(0)
+
+    monkeypatch.setattr(constituents.requests, 'get', get)
+    yield responses, sent
+    cache.get_connection().close()
+
+
+def test_not_modified_serves_stored_table(wikipedia):
+    responses, sent = wikipedia
+    responses.append(page_response(200, PAGE, {'ETag': '"v1"', 'Last-Modified': 'Mon, 05 Oct 2026 10:00:00 GMT'}))
+    first = constituents.get_constituents('SP500')
+    assert [row['ticker'] for row in first] == ['AAA', 'BBB']
+    assert 'If-None-Match' not in sent[0]
+
+    # Next run: the page is only revalidated and the stored table reused
+    constituents._parsed.clear()
+    responses.append(page_response(304))
+    assert constituents.get_constituents('SP500') == first
+    assert sent[1]['If-None-Match'] == '"v1"'
+    assert sent[1]['If-Modified-Since'] == 'Mon, 05 Oct 2026 10:00:00 GMT'
+
+
+def test_error_falls_back_to_stored_table(wikipedia):
+    responses, sent = wikipedia
+    responses.append(page_response(200, PAGE, {'ETag': '"v1"'}))
+    first = constituents.get_constituents('SP400')
+
+    constituents._parsed.clear()
+    responses.append(page_response(503))
+    assert constituents.get_constituents('SP400') == first
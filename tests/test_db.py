@@ -0,0 +1,71 @@
+import sqlite3
+
+import pytest
+
+import db
+
+
+def legacy_db(path):
+    """A picks table as the first versions of main.py created it."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE picks (date text, ticker text, score integer, peg real, details text, description text)")
+    details = str(['ROE: 18.44% (>15%)', 'Margin: 21.00% (>10%)', 'D/E: 5.943 (<50%)', 'PEG: N/A', '52W Position: 80.00% (>70%)'])
+    conn.executemany("INSERT INTO picks VALUES (?, ?, ?, ?, ?, ?)", [
+        ('2025-01-02', 'AAPL', 5, 1.2, details, 'Makes phones.'),
+        ('2025-01-02', 'AAPL', 4, 1.3, details, 'Makes phones.'),   # duplicate, the later row wins
+        ('2025-01-03', 'AAPL', 5, None, details, 'Makes phones.'),
+        ('2025-01-03', 'MSFT', 4, 1.9, None, None),
+    ])
+    conn.commit()
+    conn.close()
+
+
+def test_migrations_upgrade_legacy_schema(tmp_path):
+    path = str(tmp_path / 'stocks.db')
+    legacy_db(path)
+    conn = db.connect(path)
+
+    assert db.get_version(conn) == db.SCHEMA_VERSION
+    assert set(db.STORED_COLUMNS) <= set(db.column_names(conn, 'picks'))
+    rows = conn.execute("SELECT date, ticker, score, universe, roe, de, w52_position, description, description_hash "
+                        "FROM picks ORDER BY date, ticker").fetchall()
+    assert [r[:4] for r in rows] == [('2025-01-02', 'AAPL', 4, 'SP500'),
+                                    ('2025-01-03', 'AAPL', 5, 'SP500'),
+                                    ('2025-01-03', 'MSFT', 4, 'SP500')]
+    assert rows[0][4] == pytest.approx(0.1844)
+    assert rows[0][5] == pytest.approx(5.943)
+    assert rows[0][6] == pytest.approx(0.8)
+    # Descriptions moved to their own table, stored once
+    assert rows[0][7] is None and rows[0][8] == rows[1][8] == db.description_hash('Makes phones.')
+    assert conn.execute("SELECT COUNT(*) FROM descriptions").fetchone()[0] == 1
+    assert db.get_description(conn, rows[0][8]) == 'Makes phones.'
+    db.close(conn)
+
+    # Reopening applies nothing twice
+    conn = db.connect(path)
+    assert conn.execute("SELECT COUNT(*) FROM picks").fetchone()[0] == 3
+    db.close(conn)
+
+
+def test_migrate_refuses_newer_schema(tmp_path):
+    path = str(tmp_path / 'stocks.db')
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA user_version = {db.SCHEMA_VERSION + 1}")
+    conn.close()
+    with pytest.raises(RuntimeError):
+        db.connect(path)
+
+
+def test_write_picks_is_idempotent_and_drops_stale_rows(tmp_path):
+    conn = db.connect(str(tmp_path / 'stocks.db'))
+
+    def row(ticker, score):
+        values = dict.fromkeys(db.PICK_COLUMNS)
+        values.update(date='2025-02-03', ticker=ticker, score=score, universe='SP500', description=f"{ticker} text")
+        return tuple(values[c] for c in db.PICK_COLUMNS)
+
+    db.write_picks(conn, '2025-02-03', 'SP500', [row('A', 5), row('B', 4)])
+    db.write_picks(conn, '2025-02-03', 'SP500', [row('A', 3), row('C', 4)])
+    rows = conn.execute("SELECT ticker, score FROM picks ORDER BY ticker").fetchall()
+    assert rows == [('A', 3), ('C', 4)]
+    db.close(conn)
@@ -0,0 +1,65 @@
+import pytest
+import requests
+
+import fetch_engine
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(f"{status} Error", response=response)
+
+
+def flaky(failures):
+    """A fetch function raising each of `failures` in turn, then succeeding."""
+    calls = []
+
+    def fetch(ticker):
+        calls.append(ticker)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return {'ticker': ticker}
+    return fetch, calls
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(fetch_engine.time, 'sleep', delays.append)
+    return delays
+
+
+def test_fetch_one_retries_throttling_and_server_errors(sleeps):
+    fetch, calls = flaky([http_error(429, {'Retry-After': '7'}), http_error(503)])
+    result = fetch_engine.fetch_one('AAPL', fetch, fetch_engine.TokenBucket(0), retries=4)
+    assert result == {'ticker': 'AAPL'}
+    assert len(calls) == 3
+    # Retry-After is honoured, then exponential backoff (base 2s plus up to 50% jitter)
+    assert sleeps[0] == 7.0
+    assert 2.0 <= sleeps[1] <= 3.0
+
+
+def test_fetch_one_does_not_retry_client_errors(sleeps):
+    fetch, calls = flaky([http_error(404)])
+    with pytest.raises(requests.HTTPError):
+        fetch_engine.fetch_one('GONE', fetch, fetch_engine.TokenBucket(0), retries=4)
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_fetch_one_gives_up_after_max_retries(sleeps):
+    fetch, calls = flaky([http_error(500)] * 3)
+    with pytest.raises(requests.HTTPError):
+        fetch_engine.fetch_one('DOWN', fetch, fetch_engine.TokenBucket(0), retries=2)
+    assert len(calls) == 3 and len(sleeps) == 2
+
+
+def test_fetch_all_reports_failures_per_ticker(sleeps):
+    def fetch(ticker):
+        if ticker == 'GONE':
+            raise http_error(404)
+        return ticker.lower()
+
+    results, errors = fetch_engine.fetch_all(['AAPL', 'GONE', 'AAPL', 'MSFT'], fetch, max_workers=2, rate=0)
+    assert results == {'AAPL': 'aapl', 'MSFT': 'msft'}
+    assert list(errors) == ['GONE'] and errors['GONE'].startswith('HTTPError')
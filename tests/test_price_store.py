@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import price_store
+
+
+class FakeMarket:
+    """Stands in for yf.download: serves adjusted bars from a per-ticker table."""
+
+    def __init__(self, dates):
+        self.dates = dates
+        self.bars = {}
+        self.calls = []
+
+    def set(self, ticker, closes, dividends=None):
+        n = len(closes)
+        self.bars[ticker] = pd.DataFrame({
+            'Open': closes, 'High': closes, 'Low': closes, 'Close': closes, 'Volume': np.full(n, 1e6),
+            'Dividends': dividends if dividends is not None else np.zeros(n), 'Stock Splits': np.zeros(n),
+        }, index=self.dates[:n])
+
+    def download(self, tickers, start=None, period=None, **kwargs):
+        self.calls.append((list(tickers), start, period))
+        frames = {}
+        for ticker in tickers:
+            bars = self.bars.get(ticker)
+            if bars is not None:
+                frames[ticker] = bars[bars.index >= pd.Timestamp(start)] if start else bars
+        return pd.concat(frames, axis=1) if frames else pd.DataFrame()
+
+
+@pytest.fixture
+def market(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, 'PRICES_PATH', str(tmp_path / 'prices.db'))
+    monkeypatch.setattr(price_store, '_conn', None)
+    monkeypatch.setattr(price_store, 'PRICE_TTL', 0)     # every call goes to the (fake) network
+    fake = FakeMarket(pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=8))
+    monkeypatch.setattr(price_store.yf, 'download', fake.download)
+    yield fake
+    price_store.get_connection().close()
+
+
+def stored_closes(ticker):
+    return list(price_store.load(ticker, '1y')['Close'])
+
+
+def test_incremental_update_appends_only_new_bars(market):
+    market.set('AAA', [10.0, 11.0, 12.0, 13.0, 14.0])
+    market.set('BBB', [20.0, 21.0, 22.0, 23.0, 24.0])
+    price_store.update_many(['AAA', 'BBB'], '1y')
+    assert market.calls == [(['AAA', 'BBB'], None, '1y')]
+
+    market.set('AAA', [10.0, 11.0, 12.0, 13.0, 14.0, 15.0, 16.0])
+    market.set('BBB', [20.0, 21.0, 22.0, 23.0, 24.0, 25.0])
+    price_store.update_many(['AAA', 'BBB'], '1y')
+
+    # One batch from the second-to-last stored bar, which is checked, not rewritten
+    anchor = market.dates[3].strftime('%Y-%m-%d')
+    assert market.calls[1] == (['AAA', 'BBB'], anchor, None)
+    assert len(market.calls) == 2
+    assert stored_closes('AAA') == [10.0, 11.0, 12.0, 13.0, 14.0, 15.0, 16.0]
+    assert stored_closes('BBB') == [20.0, 21.0, 22.0, 23.0, 24.0, 25.0]
+
+
+def test_dividend_triggers_full_redownload(market):
+    market.set('AAA', [10.0, 11.0, 12.0, 13.0, 14.0])
+    price_store.update_many(['AAA'], '1y')
+
+    # A dividend on the new bar: yfinance scales every earlier close down
+    market.set('AAA', [9.8, 10.78, 11.76, 12.74, 13.72, 15.0], dividends=[0, 0, 0, 0, 0, 0.3])
+    price_store.update_many(['AAA'], '1y')
+
+    assert len(market.calls) == 3
+    assert market.calls[2][0] == ['AAA']
+    assert stored_closes('AAA') == pytest.approx([9.8, 10.78, 11.76, 12.74, 13.72, 15.0])
+
+
+def test_changed_anchor_close_triggers_full_redownload(market):
+    market.set('AAA', [10.0, 11.0, 12.0, 13.0, 14.0])
+    price_store.update_many(['AAA'], '1y')
+
+    # A 2:1 split outside the new bars: only the overlapping close reveals it
+    market.set('AAA', [5.0, 5.5, 6.0, 6.5, 7.0, 7.5])
+    price_store.update_many(['AAA'], '1y')
+
+    assert len(market.calls) == 3
+    assert stored_closes('AAA') == [5.0, 5.5, 6.0, 6.5, 7.0, 7.5]
@@ -0,0 +1,50 @@
+import main
+
+
+def info(roe, dividend_yield, market_cap):
+    return {'longName': 'Co', 'returnOnEquity': roe, 'profitMargins': 0.12, 'revenueGrowth': 0.08,
+            'debtToEquity': 40.0, 'trailingPE': 12.0, 'earningsGrowth': 0.10, 'freeCashflow': 8e8,
+            'marketCap': market_cap, 'currentPrice': 50.0, 'fiftyTwoWeekHigh': 60.0,
+            'fiftyTwoWeekLow': 30.0, 'dividendYield': dividend_yield}
+
+
+def test_sector_rows_rank_by_strategy_and_score_every_strategy():
+    infos = {'AAA': info(0.05, 1.0, 5e11), 'BBB': info(0.20, 3.5, 1e10), 'CCC': info(0.18, 2.5, 2e10)}
+    tickers = {'AAA': {'subsector': 'A'}, 'BBB': {'subsector': 'B'}, 'CCC': {'subsector': 'C'}, 'DDD': {'subsector': 'D'}}
+    groups = {'BBB': ['CCC', 'DDD']}
+
+    rows, cards = main.sector_rows(tickers, infos, 'dividend_quality', groups, sell_thresholds={'BBB': 1.5})
+
+    # DDD has no data; the rest are ordered by dividend-quality score, then yield
+    assert [r['ticker'] for r in rows] == ['BBB', 'CCC', 'AAA']
+    assert rows[0]['subsector'] == 'B' and rows[0]['sell_threshold'] == 1.5
+    assert [c['ticker'] for c in rows[0]['comparison_table']] == ['BBB', 'CCC']
+    assert rows[1]['comparison_table'] == []
+    assert rows[0]['peg'] == "1.20"     # PE / (earnings growth * 100)
+    assert rows[0]['strategy_scores'][1] == "Dividend quality 5/5"
+    assert rows[2]['strategy_scores'][1] == "Dividend quality 2/5"
+    assert len(rows[0]['strategy_scores']) == len(main.strategies.STRATEGIES)
+    assert set(cards) == {'AAA', 'BBB', 'CCC'} and 'market_cap' not in cards['BBB']
+
+
+def test_sector_report_reuses_cards_and_refreshes_prices(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, 'BASE_DIR', str(tmp_path))
+    tickers = {'AAA': {'subsector': 'A', 'subsector_class': 'a'}, 'BBB': {'subsector': 'B', 'subsector_class': 'b'}}
+    infos = {'AAA': info(0.05, 1.0, 5e11), 'BBB': info(0.20, 3.5, 1e10)}
+    infos['AAA']['longBusinessSummary'] = 'First description.'
+    main.run_sector_report('sector.html', 'Sector', 'semiconductors.html', tickers, 'qgarp', infos)
+
+    # A price move: the cached cards are reused, the price cells are rebuilt
+    infos['AAA'] = dict(infos['AAA'], marketCap=7e11)
+    calls = []
+    monkeypatch.setattr(main, 'card_fields', lambda *args: calls.append(args))
+    main.run_sector_report('sector.html', 'Sector', 'semiconductors.html', tickers, 'qgarp', infos)
+    page = (tmp_path / 'sector.html').read_text()
+    assert calls == [] and '$700.0B' in page and 'First description.' in page
+
+    # A new quarterly report rebuilds the cards
+    monkeypatch.undo()
+    monkeypatch.setattr(main, 'BASE_DIR', str(tmp_path))
+    infos['AAA'] = dict(infos['AAA'], returnOnEquity=0.07, longBusinessSummary='Second description.')
+    main.run_sector_report('sector.html', 'Sector', 'semiconductors.html', tickers, 'qgarp', infos)
+    assert 'Second description.' in (tmp_path / 'sector.html').read_text()
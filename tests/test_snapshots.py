@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+import analyze
+import snapshots
+
+
+def scored_frame(rng, n=50):
+    infos = []
+    for i in range(n):
+        infos.append((f"T{i}", {
+            'returnOnEquity': rng.uniform(-0.2, 0.4), 'profitMargins': rng.uniform(-0.1, 0.3),
+            'revenueGrowth': rng.uniform(-0.1, 0.3), 'debtToEquity': rng.uniform(0, 200),
+            'trailingPE': rng.uniform(5, 40), 'earningsGrowth': rng.uniform(-0.2, 0.4),
+            'freeCashflow': int(rng.integers(1e6, 5e10)), 'marketCap': int(rng.integers(1e8, 3e12)),
+            'currentPrice': rng.uniform(5, 500), 'fiftyTwoWeekHigh': 600.0, 'fiftyTwoWeekLow': 4.0,
+            'sector': ['Technology', 'Energy', None][i % 3], 'industry': 'Other',
+        }))
+    return analyze.score_frame(analyze.build_frame(infos))
+
+
+def test_round_trip_precision(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_DIR', str(tmp_path))
+    scored = scored_frame(np.random.default_rng(0))
+    snapshots.save('TEST', scored, date='2026-01-05')
+    loaded = snapshots.load('TEST', '2026-01-05')
+
+    # Fundamentals are exact, daily price columns float32, derived metrics recomputed from both
+    for column in snapshots.NUMERIC_COLUMNS:
+        expected = scored[column].to_numpy(dtype=float)
+        if column in analyze.FUNDAMENTAL_COLUMNS:
+            np.testing.assert_array_equal(loaded[column].to_numpy(), expected)
+        elif column in analyze.PRICE_COLUMNS:
+            np.testing.assert_array_equal(loaded[column].to_numpy(), expected.astype(np.float32))
+        else:
+            np.testing.assert_allclose(loaded[column].to_numpy(), expected, rtol=1e-6)
+    assert list(loaded['score']) == list(scored['score'])
+    assert list(loaded['sector']) == list(scored['sector'])
+    # Integer-valued free cash flows beyond float32's exact range survive exactly
+    assert (loaded['fcf'] == scored['fcf']).all()
+    assert (analyze.input_hashes(loaded) == analyze.input_hashes(scored)).all()
+
+
+def test_changed_reports_only_fundamental_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, 'SNAPSHOT_DIR', str(tmp_path))
+    scored = scored_frame(np.random.default_rng(1))
+    snapshots.save('TEST', scored, date='2026-01-05')
+
+    today = scored.copy()
+    today.loc[3, 'roe'] += 0.01        # a new quarterly report
+    today.loc[4, 'price'] *= 1.02      # a price move only
+    today = pd.concat([today, today.iloc[[0]].assign(ticker='NEW')], ignore_index=True)
+    tickers, since = snapshots.changed('TEST', today, analyze.FUNDAMENTAL_COLUMNS, before='2026-01-06')
+    assert since == '2026-01-05'
+    assert tickers == ['T3', 'NEW']
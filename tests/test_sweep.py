@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import sweep
+from test_backtest import price_panel
+
+
+def test_ranking_keeps_tickers_without_forward_returns(monkeypatch):
+    # AAA has the best ROE on the first day but stops trading right after it
+    snapshot = pd.DataFrame({
+        'date': ['2025-01-06'] * 3 + ['2025-01-07'] * 2 + ['2025-01-08'] * 2,
+        'ticker': ['AAA', 'BBB', 'CCC', 'BBB', 'CCC', 'BBB', 'CCC'],
+        'roe': [0.30, 0.20, 0.05, 0.20, 0.05, 0.20, 0.05],
+        'peg': [1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0],
+    })
+    dates = pd.date_range('2025-01-06', periods=3, freq='B')
+    panel = price_panel({'AAA': [100.0, np.nan, np.nan],
+                         'BBB': [100.0, 110.0, 121.0],
+                         'CCC': [100.0, 90.0, 81.0],
+                         'SPY': [100.0, 100.0, 100.0]}, dates)
+    monkeypatch.setattr(sweep.snapshots, 'load_range', lambda universe, start, end: snapshot.copy())
+    monkeypatch.setattr(sweep.fetch_data, 'get_histories', lambda tickers, period: panel)
+
+    frame, day_bounds = sweep.prepare('TEST', horizon=1)
+    # The last day has no forward returns yet; AAA stays in the first day's ranking
+    assert day_bounds == [(0, 3), (3, 5)]
+    assert list(frame['ticker']) == ['AAA', 'BBB', 'CCC', 'BBB', 'CCC']
+    assert np.isnan(frame['fwd'].iloc[0])
+
+    table = sweep.run(frame, day_bounds, grid={'pass_roe': [0.10, 0.25]}, k=1, max_workers=1)
+    table = table.set_index('pass_roe')
+    # AAA tops day one under both variants (at 10% it ties BBB on score and PEG and
+    # comes first); it counts as a pick without a return instead of handing its slot to BBB
+    assert list(table['picks']) == [1, 1]
+    assert list(table['missing']) == [1, 1]
+    assert table.loc[0.10, 'mean_return'] == pytest.approx(0.10)
+    assert table.loc[0.10, 'hit_rate'] == pytest.approx(1.0)